@@ -1,6 +1,8 @@
 import logging
-from database import save_build, save_stages, get_job_statistics, init_db
+from database import save_analysis, get_job_statistics, get_stage_baselines, init_db
+from log_store import get_log_store
 from log_parser import LogIntelligenceEngine
+from timeline import TimelineEngine
 
 # Initialize DB
 init_db()
@@ -8,27 +10,48 @@ init_db()
 class RegressionEngine:
     """
     Engine 3: Mathematical Regression Detection
+    Once a job has enough history, the baseline is the median of its duration sketch (recent successful builds)
+    and a build only regresses when it is above p90 *and* far from the median in robust
+    (IQR-based) sigmas, so a single slow outlier can't drag the baseline around.
     """
+    MIN_HISTORY = 5 # Successful builds needed before the sketch baseline is trusted
+    NOISE_FLOOR = 0.05 # Robust sigma is never taken below 5% of the median
+
     def detect(self, current_duration, stats):
         avg = stats['avg_duration']
         std_dev = stats['std_dev']
         
         if avg == 0:
             return None # No baseline
-            
-        # 1. Z-Score Calculation (How many sigmas away?)
-        deviation = current_duration - avg
-        z_score = deviation / std_dev if std_dev > 0 else 0
-        
-        # Threshold: > 1.3 Sigma is suspicious, > 2 Sigma is a definite regression
-        is_regression = z_score > 1.3
+
+        median = stats.get('history_p50', 0)
+        if stats.get('history_count', 0) >= self.MIN_HISTORY and median > 0:
+            # 1. Robust Z-Score (median / IQR sigma), gated on the p90 of all history
+            baseline = median
+            deviation = current_duration - median
+            sigma = max(stats['robust_sigma'], median * self.NOISE_FLOOR)
+            z_score = deviation / sigma
+            is_regression = current_duration > stats['history_p90'] and z_score > 1.3
+            method = "quantile"
+        else:
+            # 1. Z-Score Calculation (How many sigmas away?)
+            baseline = avg
+            deviation = current_duration - avg
+            z_score = deviation / std_dev if std_dev > 0 else 0
+
+            # Threshold: > 1.3 Sigma is suspicious, > 2 Sigma is a definite regression
+            is_regression = z_score > 1.3
+            method = "mean"
         
         return {
             "is_regression": is_regression,
+            "method": method,
+            "baseline": round(baseline, 2),
             "baseline_avg": round(avg, 2),
+            "baseline_p90": round(stats.get('history_p90', 0), 2),
             "current_duration": round(current_duration, 2),
             "deviation_seconds": round(deviation, 2),
-            "increase_percent": round((deviation / avg) * 100, 1),
+            "increase_percent": round((deviation / baseline) * 100, 1),
             "z_score": round(z_score, 2)
         }
 
@@ -116,56 +139,62 @@ class StageAnalysisEngine:
     """
     Engine 1 & 2: Stage Level Regression & Impact Analysis
     """
-    def analyze(self, current_stages, job_name):
-        from database import get_stage_history
-        
-        # 1. Fetch History
-        history_map = get_stage_history(job_name, limit=10)
-        
-        # 2. Calculate Baselines per Stage Name
-        baselines = {}
-        for b_num, stages in history_map.items():
-            for s in stages:
-                name = s['name']
-                if name not in baselines:
-                    baselines[name] = []
-                baselines[name].append(s['duration'])
+    def analyze(self, current_stages, job_name, timeline=None):
+        # 1. Materialized Baselines per Stage Name (maintained by database.save_analysis)
+        baselines = get_stage_baselines(job_name)
                 
         stage_metrics = []
-        total_duration = sum(s['durationMillis'] for s in current_stages) / 1000.0 or 1.0 # Avoid div/0
+        # Impact is the stage's share of wall-clock time (see TimelineEngine), not of summed durations
+        timeline = timeline or TimelineEngine().build(current_stages)
         
-        for s in current_stages:
+        for i, s in enumerate(current_stages):
             name = s['name']
             curr_duration = s['durationMillis'] / 1000.0
             
             # Baseline Stats
-            history_vals = baselines.get(name, [])
-            avg = sum(history_vals) / len(history_vals) if history_vals else 0
+            baseline = baselines.get(name)
+            if baseline and baseline['history_count'] >= RegressionEngine.MIN_HISTORY:
+                # Median of the stage's duration sketch; must also beat its p90
+                reference = baseline['history_p50']
+                p90 = baseline['history_p90']
+                threshold = max(p90, reference * 1.3)
+            else:
+                # Short history: the plain 30% over the window mean
+                reference = baseline['mean'] if baseline else 0
+                p90 = baseline['p90'] if baseline else 0
+                threshold = reference * 1.3
             
             # Regression Logic
             is_regression = False
             regression_pct = 0
-            if avg > 1.0 and curr_duration > (avg * 1.3): # 30% threshold
+            if reference > 1.0 and curr_duration > threshold: # 30% threshold
                 is_regression = True
-                regression_pct = int(((curr_duration - avg) / avg) * 100)
+                regression_pct = int(((curr_duration - reference) / reference) * 100)
                 
             # Impact Logic
-            impact_pct = int((curr_duration / total_duration) * 100)
+            placement = timeline['stages'][i]
+            impact_pct = int(placement['wall_share_pct'])
             
             stage_metrics.append({
                 "name": name,
                 "duration": round(curr_duration, 2),
-                "baseline": round(avg, 2),
+                "baseline": round(reference, 2),
+                "p90": round(p90, 2),
                 "regression_pct": regression_pct if is_regression else 0,
                 "impact_pct": impact_pct,
-                "status": "REGRESSION" if is_regression else "HEALTHY"
+                "critical": placement['critical'],
+                "slack_seconds": placement['slack_seconds'],
+                "status": "REGRESSION" if is_regression else "HEALTHY",
+                # Findings from this stage's own log (jenkins_fetch.fetch_stage_logs), when fetched
+                "issues": s.get('log_issues', [])
             })
             
         return stage_metrics
 
-def analyze_pipeline_v2(data):
+def analyze_pipeline_v2(data, persist=True):
     """
     Orchestrator for v3 Analyzer Engines.
+    persist=False skips the DB write so a batch writer can save results itself (see bulk_ingest).
     """
     if not data: return None
 
@@ -182,16 +211,34 @@ def analyze_pipeline_v2(data):
     stats = get_job_statistics(job_name)
     
     # 2. Log Intelligence
-    log_engine = LogIntelligenceEngine()
-    detected_issues = log_engine.analyze_log(data.get('console_log', ''))
+    # Streamed fetches arrive pre-analyzed (see jenkins_fetch.fetch_jenkins_data)
+    # `ruleset` records which rule set produced the findings; None when no log was scanned.
+    # `failures` are the fingerprinted failing lines; None means "not known, keep what is stored"
+    ruleset = LogIntelligenceEngine.RULESET_VERSION
+    if 'log_issues' in data:
+        detected_issues = data['log_issues']
+        failures = data.get('log_failures')
+    else:
+        scanner = LogIntelligenceEngine().stream()
+        if data.get('console_log'):
+            scanner.feed(data['console_log'])
+            detected_issues = scanner.finish()
+        else:
+            # No log in hand: re-scan the archived copy, if this build has one (no network I/O)
+            detected_issues = get_log_store().scan(job_name, build_num, scanner=scanner)
+        if detected_issues is None:
+            detected_issues, ruleset, failures = [], None, None
+        else:
+            failures = scanner.failures
     
     # 3. Regression Detection (Job Level)
     reg_engine = RegressionEngine()
     regression_data = reg_engine.detect(duration, stats)
     
-    # 4. Stage Level Analysis (NEW)
+    # 4. Stage Level Analysis (NEW), on the wall-clock timeline
+    timeline = TimelineEngine().build(stages_raw)
     stage_engine = StageAnalysisEngine()
-    stage_breakdown = stage_engine.analyze(stages_raw, job_name)
+    stage_breakdown = stage_engine.analyze(stages_raw, job_name, timeline)
     
     # 5. Efficiency Scoring
     eff_engine = EfficiencyEngine()
@@ -202,9 +249,10 @@ def analyze_pipeline_v2(data):
     risk_data = risk_engine.predict(stats, regression_data, detected_issues)
     
     # --- PERSISTENCE ---
-    build_id = save_build(job_name, build_num, status, duration, score_data['total_score'])
-    if build_id:
-        save_stages(build_id, stages_raw)
+    # Build, stages and log findings go to disk in one transaction
+    if persist:
+        save_analysis(job_name, build_num, status, duration, score_data['total_score'],
+                      stages=stages_raw, issues=detected_issues, ruleset=ruleset, failures=failures)
 
     # --- FINAL PAYLOAD ---
     return {
@@ -214,12 +262,15 @@ def analyze_pipeline_v2(data):
         'total_duration': duration,
         'stages': stages_raw,
         'stage_analysis': stage_breakdown, # NEW
+        'timeline': timeline,
         
         # New Engine Outputs
         'efficiency': score_data,
         'regression': regression_data,
         'risk': risk_data,
         'issues': detected_issues,
+        'ruleset_version': ruleset,
+        'failures': failures,
         'stats': stats
     }
 
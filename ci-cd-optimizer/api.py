@@ -0,0 +1,119 @@
+import os
+import gzip
+from flask import Blueprint, request, jsonify, url_for
+from database import get_builds_page, get_jobs_summary, get_job_statistics, get_stage_baselines
+
+# Page size for history endpoints: default and hard cap
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 50))
+API_PAGE_MAX = int(os.environ.get('API_PAGE_MAX', 500))
+# Responses smaller than this are sent uncompressed (gzip overhead outweighs the saving)
+API_GZIP_MIN_BYTES = int(os.environ.get('API_GZIP_MIN_BYTES', 1024))
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+class BadRequest(Exception):
+    pass
+
+@api.errorhandler(BadRequest)
+def _bad_request(e):
+    return jsonify({'error': str(e)}), 400
+
+def _int_arg(name, default=None, minimum=0):
+    value = request.args.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise BadRequest(f"{name} must be an integer")
+    if value < minimum:
+        raise BadRequest(f"{name} must be >= {minimum}")
+    return value
+
+def _cacheable(payload):
+    """
+    JSON response with a content ETag: a matching If-None-Match gets an empty 304.
+    The ETag is weak because the same content may go out gzipped or not.
+    """
+    resp = jsonify(payload)
+    resp.add_etag(weak=True)
+    resp.headers['Cache-Control'] = 'no-cache' # Clients may keep it, but must revalidate
+    resp.headers['Vary'] = 'Accept-Encoding'
+    return resp.make_conditional(request)
+
+@api.after_request
+def _compress(resp):
+    if (resp.status_code != 200 or resp.direct_passthrough or 'Content-Encoding' in resp.headers
+            or 'gzip' not in request.headers.get('Accept-Encoding', '')):
+        return resp
+    body = resp.get_data()
+    if len(body) < API_GZIP_MIN_BYTES:
+        return resp
+    resp.set_data(gzip.compress(body, compresslevel=6))
+    resp.headers['Content-Encoding'] = 'gzip'
+    return resp
+
+def _page(job_name, include=()):
+    """
+    Keyset-paginated builds of a job. ?before=N walks back from build N (newest first, the default);
+    ?after=N walks forward from build N (oldest first), e.g. to pick up builds added since.
+    """
+    before = _int_arg('before', minimum=1)
+    after = _int_arg('after')
+    if before is not None and after is not None:
+        raise BadRequest("Use either before or after, not both")
+    limit = min(_int_arg('limit', API_PAGE_SIZE, minimum=1), API_PAGE_MAX)
+
+    builds, has_more = get_builds_page(job_name, before=before, after=after, limit=limit, include=include)
+    cursor = {}
+    if has_more:
+        cursor = {'after': builds[-1]['build_number']} if after is not None else {'before': builds[-1]['build_number']}
+    return _cacheable({
+        'job_name': job_name,
+        'builds': builds,
+        'next': url_for(request.endpoint, job_name=job_name, limit=limit, **cursor) if cursor else None
+    })
+
+@api.route('/jobs')
+def jobs():
+    return _cacheable({'jobs': get_jobs_summary()})
+
+@api.route('/jobs/<path:job_name>/builds')
+def builds(job_name):
+    """
+    Builds, newest first. ?include=stages,issues attaches those to each build.
+    """
+    include = tuple(sorted({part for part in request.args.get('include', '').split(',') if part}))
+    if set(include) - {'stages', 'issues'}:
+        raise BadRequest("include accepts: stages, issues")
+    return _page(job_name, include)
+
+@api.route('/jobs/<path:job_name>/stages')
+def stages(job_name):
+    return _page(job_name, ('stages',))
+
+@api.route('/jobs/<path:job_name>/issues')
+def issues(job_name):
+    return _page(job_name, ('issues',))
+
+@api.route('/jobs/<path:job_name>/stats')
+def stats(job_name):
+    return _cacheable({
+        'job_name': job_name,
+        'statistics': get_job_statistics(job_name),
+        'stage_baselines': get_stage_baselines(job_name)
+    })
+
+@api.route('/jobs/<path:job_name>/chart')
+def chart(job_name):
+    """
+    Duration and efficiency series for the trend chart, oldest first (the dashboard's `history`).
+    Builds that were backfilled but never analyzed have a null score, which the chart leaves as a gap.
+    """
+    limit = min(_int_arg('limit', 20, minimum=1), API_PAGE_MAX)
+    history = list(reversed(get_builds_page(job_name, limit=limit)[0]))
+    return _cacheable({
+        'labels': [f"#{b['build_number']}" for b in history],
+        'durations': [b['total_duration'] for b in history],
+        'scores': [b['efficiency_score'] for b in history]
+    })
@@ -1,11 +1,21 @@
 import os
 import json
-from flask import Flask, render_template, request, redirect, url_for, flash
+import time
+import uuid
+import threading
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 from analyzer import analyze_pipeline_v2
 from optimizer import optimize_pipeline_v2
-from jenkins_fetch import fetch_jenkins_data
-from database import get_job_history
+from simulator import PipelineSimulator
+from jenkins_fetch import fetch_jenkins_data, fetch_options_from_env, get_client, get_last_build_number
+from backfill import backfill_job
+from database import get_job_history, get_cache_stats, get_top_failures, get_stage_log_scans
+from upload_stream import parse_stream, parse_multipart_stream
+from job_queue import get_analysis_queue, QueueFull
+from webhook import get_webhook_batcher, parse_notification, verify_secret
+from api import api
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -13,19 +23,45 @@ load_dotenv()
 
 app = Flask(__name__)
 app.secret_key = 'supersecretkey'  # Required for flash messages
+app.register_blueprint(api) # Read-only JSON history API under /api
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'json'}
 
+# Uploads are parsed straight from the request stream; keeping a raw copy is opt-in
+SAVE_UPLOADS = os.environ.get('SAVE_UPLOADS', 'false').lower() == 'true'
+MAX_UPLOAD_MB = int(os.environ.get('MAX_UPLOAD_MB', 1024))
+# Queued Jenkins analyses estimate suggestion impact with the what-if simulator (history read + Monte Carlo)
+SIMULATE_IMPACT = os.environ.get('SIMULATE_IMPACT', 'true').lower() == 'true'
+# Most builds one /backfill request fetches (larger counts are clamped)
+BACKFILL_MAX_BUILDS = int(os.environ.get('BACKFILL_MAX_BUILDS', 1000))
+# Most fingerprints /failures returns in one response
+FAILURES_MAX_LIMIT = int(os.environ.get('FAILURES_MAX_LIMIT', 100))
+
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_MB * 1024 * 1024
 
 # Ensure upload directory exists
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+if SAVE_UPLOADS:
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def _archive_upload(filename):
+    """
+    Opens a new file in UPLOAD_FOLDER for the raw upload. The name is prefixed with the time
+    and a random suffix, since the job and build are only known once the stream is parsed.
+    """
+    unique = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}-{secure_filename(filename)}"
+    return open(os.path.join(app.config['UPLOAD_FOLDER'], unique), 'xb')
+
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    flash(f'Upload exceeds the {MAX_UPLOAD_MB} MB limit.', 'error')
+    return redirect(url_for('index'))
+
 @app.route('/')
 def index():
     return render_template('index.html', metrics=None, suggestions=None)
@@ -33,27 +69,27 @@ def index():
 @app.route('/upload', methods=['GET', 'POST'])
 def upload_file():
     if request.method == 'POST':
-        # Check if the post request has the file part
-        if 'file' not in request.files:
-            flash('No file part', 'error')
-            return redirect(request.url)
-        
-        file = request.files['file']
-        
-        if file.filename == '':
-            flash('No selected file', 'error')
-            return redirect(request.url)
-        
-        if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
-            
-            # Process the file
-            try:
-                with open(filepath, 'r') as f:
-                    data = json.load(f)
-                
+        tee_factory = _archive_upload if SAVE_UPLOADS else None
+
+        # Process the upload as it streams in (console_log goes straight to the log engine)
+        try:
+            if request.mimetype == 'application/json':
+                data = parse_stream(request.stream.read,
+                                    tee=tee_factory('upload.json') if tee_factory else None)
+            else:
+                if request.mimetype != 'multipart/form-data':
+                    flash('No file part', 'error')
+                    return redirect(request.url)
+                data, filename = parse_multipart_stream(request.stream.read, request.content_type,
+                                                        tee_factory=tee_factory, accept=allowed_file)
+                if filename is None:
+                    flash('No file part', 'error')
+                    return redirect(request.url)
+                if filename == '':
+                    flash('No selected file', 'error')
+                    return redirect(request.url)
+
+            if data is not None:
                 # Analyze using v2 logic
                 metrics = analyze_pipeline_v2(data)
                 suggestions = optimize_pipeline_v2(metrics)
@@ -64,64 +100,213 @@ def upload_file():
 
                 return render_template('index.html', metrics=metrics, suggestions=suggestions)
             
-            except json.JSONDecodeError:
-                flash('Invalid JSON file.', 'error')
-                return redirect(request.url)
-            except Exception as e:
-                flash(f'An error occurred: {str(e)}', 'error')
-                return redirect(request.url)
+        except json.JSONDecodeError:
+            flash('Invalid JSON file.', 'error')
+            return redirect(request.url)
+        except RequestEntityTooLarge:
+            raise
+        except Exception as e:
+            flash(f'An error occurred: {str(e)}', 'error')
+            return redirect(request.url)
 
     return render_template('index.html', metrics=None, suggestions=None)
 
-@app.route('/fetch_jenkins', methods=['POST'])
-def fetch_jenkins():
-    try:
-        JENKINS_URL = os.environ.get('JENKINS_URL', 'http://localhost:8080')
-        JOB_NAME = os.environ.get('JENKINS_JOB_NAME', 'test-job')
-        JENKINS_USER = os.environ.get('JENKINS_USER', 'admin')
-        JENKINS_TOKEN = os.environ.get('JENKINS_TOKEN', '')
-
-        # 1. Fetch Data (v2)
-        data, error_msg = fetch_jenkins_data(JENKINS_URL, JOB_NAME, JENKINS_USER, JENKINS_TOKEN)
-        
+def _jenkins_client():
+    return get_client(os.environ.get('JENKINS_URL', 'http://localhost:8080'),
+                      os.environ.get('JENKINS_USER', 'admin'),
+                      os.environ.get('JENKINS_TOKEN', ''))
+
+def _analyze_jenkins_build(job_name, build_number=None):
+    """
+    Fetch + analyze + optimize one Jenkins build (None = the job's last build, resolved here).
+    Runs on the analysis queue, off the request thread.
+    Returns: {'metrics', 'suggestions', 'history', 'top_failures'}
+    Raises: RuntimeError with a user-facing message when the build cannot be fetched or analyzed
+    """
+    client = _jenkins_client()
+    fetch_options = fetch_options_from_env()
+    if build_number is None:
+        build_number, error_msg = get_last_build_number(client, job_name)
         if error_msg:
-            flash(f"Failed to fetch data: {error_msg}", 'error')
-            return redirect(url_for('index'))
-            
-        if not data:
-            flash("No data returned from Jenkins analysis.", 'error')
-            return redirect(url_for('index'))
-
-        # 2. Analyze (v2 - DB Save, RCA, Regression)
-        metrics = analyze_pipeline_v2(data)
-        
-        # 3. Optimize (v2 - Snippets)
-        suggestions = optimize_pipeline_v2(metrics)
-        
-        # Save logs for debugging 
-        with open('pipeline_log.json', 'w') as f:
-           json.dump(data, f, indent=4)
-
-        if metrics is None:
-             flash('Error analyzing Jenkins data.', 'error')
-             return redirect(url_for('index'))
-
-        # Fetch history for charts
-        history = get_job_history(JOB_NAME, limit=20)
-        history_data = {
+            raise RuntimeError(f"Failed to fetch data: {error_msg}")
+
+    # 1. Fetch Data (v2)
+    data, error_msg = fetch_jenkins_data(client.base_url, job_name, None, None, client=client,
+                                         build_number=build_number,
+                                         previous_stage_logs=get_stage_log_scans(job_name, build_number)
+                                         if fetch_options['stage_logs'] else None,
+                                         **fetch_options)
+    if error_msg:
+        raise RuntimeError(f"Failed to fetch data: {error_msg}")
+    if not data:
+        raise RuntimeError("No data returned from Jenkins analysis.")
+
+    # 2. Analyze (v2 - DB Save, RCA, Regression)
+    metrics = analyze_pipeline_v2(data)
+
+    # 3. Optimize (v2 - Snippets), with simulated savings since this runs on a queue worker
+    simulator = None
+    if SIMULATE_IMPACT and metrics and metrics.get('stages'):
+        simulator = PipelineSimulator.for_job(job_name, metrics['stages'])
+    suggestions = optimize_pipeline_v2(metrics, simulator)
+
+    # Save the parsed build for debugging (the console itself is archived per build in log_store).
+    # Written aside and renamed, since several workers may finish at once
+    tmp_path = f"pipeline_log.json.{threading.get_ident()}"
+    with open(tmp_path, 'w') as f:
+        json.dump({k: v for k, v in data.items() if k != 'console_log'}, f, indent=4)
+    os.replace(tmp_path, 'pipeline_log.json')
+
+    if metrics is None:
+        raise RuntimeError('Error analyzing Jenkins data.')
+
+    # Fetch history for charts
+    history = get_job_history(job_name, limit=20)
+    return {
+        'metrics': metrics,
+        'suggestions': suggestions,
+        'history': {
             'labels': [f"#{b['build_number']}" for b in reversed(history)],
             'durations': [b['total_duration'] for b in reversed(history)],
             'scores': [b['efficiency_score'] for b in reversed(history)]
-        }
+        },
+        'top_failures': get_top_failures(since_days=7, limit=5)
+    }
+
+def _wants_json():
+    return request.is_json or request.accept_mimetypes.best == 'application/json'
+
+@app.route('/fetch_jenkins', methods=['POST'])
+def fetch_jenkins():
+    """
+    Queues analysis of the configured job's last build (or `build`) and returns at once:
+    202 + task id for API clients, a redirect to the result page for the dashboard.
+    Requests for a job+build already being analyzed join that task; "last build" requests share
+    one key and the queued task resolves the number, so Jenkins is never called on the request thread.
+    """
+    job_name = os.environ.get('JENKINS_JOB_NAME', 'test-job')
+    params = request.get_json(silent=True) or request.values
+    try:
+        build_number = int(params['build']) if params.get('build') else None
+    except (TypeError, ValueError):
+        return jsonify({'error': "build must be an integer"}), 400
+
+    try:
+        task_id, coalesced = get_analysis_queue().submit(('jenkins', job_name, 'last' if build_number is None else build_number),
+                                                         _analyze_jenkins_build, job_name, build_number)
+    except QueueFull:
+        if _wants_json():
+            return jsonify({'error': "Analysis queue is full, retry shortly"}), 503
+        flash("Analysis queue is full, please retry in a moment.", 'error')
+        return redirect(url_for('index'))
 
-        flash(f"Successfully fetched and analyzed build: {JOB_NAME} #{metrics.get('build_number')}", 'success')
-        return render_template('index.html', metrics=metrics, suggestions=suggestions, history=history_data)
+    if _wants_json():
+        return jsonify({'task_id': task_id, 'coalesced': coalesced, 'build_number': build_number,
+                        'status_url': url_for('task_status', task_id=task_id)}), 202
+    return redirect(url_for('fetch_jenkins_result', task_id=task_id))
 
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        flash(f"An unexpected error occurred: {str(e)}", 'error')
+@app.route('/fetch_jenkins/<task_id>')
+def fetch_jenkins_result(task_id):
+    """
+    Dashboard view of a queued analysis: refreshes itself until the result is ready.
+    """
+    task = get_analysis_queue().status(task_id)
+    if task is None:
+        flash("Analysis not found (results expire after a while).", 'error')
+        return redirect(url_for('index'))
+    if task['state'] == 'failed':
+        flash(task['error'], 'error')
         return redirect(url_for('index'))
+    if task['state'] != 'done':
+        return render_template('index.html', metrics=None, suggestions=None, pending_task=task)
+
+    result = task['result']
+    metrics = result['metrics']
+    flash(f"Successfully fetched and analyzed build: {metrics['job_name']} #{metrics.get('build_number')}", 'success')
+    return render_template('index.html', metrics=metrics, suggestions=result['suggestions'],
+                           history=result['history'], top_failures=result['top_failures'])
+
+@app.route('/tasks/<task_id>')
+def task_status(task_id):
+    """
+    Poll endpoint: task state, and the finished metrics/suggestions once done.
+    """
+    task = get_analysis_queue().status(task_id)
+    if task is None:
+        return jsonify({'error': "Unknown or expired task"}), 404
+    return jsonify(task)
+
+@app.route('/backfill', methods=['POST'])
+def backfill():
+    """
+    Seeds build history for a job in bulk. Body (JSON or form): job, count (capped at BACKFILL_MAX_BUILDS).
+    """
+    params = request.get_json(silent=True) or request.form
+    job_name = params.get('job') or os.environ.get('JENKINS_JOB_NAME', 'test-job')
+    try:
+        count = int(params.get('count', 100))
+    except (TypeError, ValueError):
+        return jsonify({'error': "count must be an integer"}), 400
+    if count < 1:
+        return jsonify({'error': "count must be >= 1"}), 400
+    count = min(count, BACKFILL_MAX_BUILDS)
+
+    client = get_client(os.environ.get('JENKINS_URL', 'http://localhost:8080'),
+                        os.environ.get('JENKINS_USER', 'admin'),
+                        os.environ.get('JENKINS_TOKEN', ''))
+    result, error_msg = backfill_job(client, job_name, count=count)
+    if error_msg:
+        return jsonify({'error': error_msg}), 502
+    return jsonify(result)
+
+@app.route('/cache_stats')
+def cache_stats():
+    """
+    Read-cache hit/miss counters for the history and statistics queries.
+    """
+    return jsonify(get_cache_stats())
+
+@app.route('/webhook/jenkins', methods=['POST'])
+def jenkins_webhook():
+    """
+    Build-completion notifications (Jenkins Notification plugin or generic webhook JSON).
+    Authenticated by WEBHOOK_SECRET, sent as the X-Webhook-Token header or ?token=.
+    Accepted builds are analyzed in batches in the background (see webhook.WebhookBatcher).
+    """
+    token = request.headers.get('X-Webhook-Token') or request.args.get('token')
+    if not verify_secret(token, os.environ.get('WEBHOOK_SECRET', '')):
+        return jsonify({'error': "Invalid or missing webhook token"}), 403
+
+    key, error_msg = parse_notification(request.get_json(silent=True))
+    if error_msg:
+        return jsonify({'error': error_msg}), 400
+    if key is None:
+        return jsonify({'status': 'ignored'}), 200
+
+    queued = get_webhook_batcher().submit(*key)
+    return jsonify({'status': 'queued' if queued else 'duplicate', 'job_name': key[0], 'build_number': key[1]}), 202
+
+@app.route('/webhook/jenkins/stats')
+def jenkins_webhook_stats():
+    """
+    Webhook batcher counters (received, duplicates, batches, saved, errors, pending).
+    """
+    return jsonify(get_webhook_batcher().stats())
+
+@app.route('/failures')
+def failures():
+    """
+    Recurring failures across all jobs, ranked by affected builds.
+    Query: days (default 7, 0 = all time), limit (default 20, capped at FAILURES_MAX_LIMIT).
+    """
+    try:
+        days = int(request.args.get('days', 7))
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        return jsonify({'error': "days and limit must be integers"}), 400
+    if days < 0 or limit < 1:
+        return jsonify({'error': "days must be >= 0 and limit >= 1"}), 400
+    return jsonify(get_top_failures(since_days=days or None, limit=min(limit, FAILURES_MAX_LIMIT)))
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,26 @@
+import time
+import logging
+from jenkins_fetch import fetch_build_history
+from database import save_builds_bulk
+
+def backfill_job(client, job_name, count=100, max_workers=8):
+    """
+    Seeds the history tables with the last `count` builds of a job:
+    one bulk build-list query, concurrent wfapi/describe fetches, one DB transaction.
+    Returns: (summary_dict, error_message)
+    """
+    started = time.perf_counter()
+    builds, error_msg = fetch_build_history(client, job_name, count=count, max_workers=max_workers)
+    if error_msg:
+        return None, error_msg
+
+    inserted = save_builds_bulk(job_name, builds)
+    elapsed = round(time.perf_counter() - started, 2)
+    logging.info(f"Backfilled {inserted}/{len(builds)} builds of {job_name} in {elapsed}s")
+    return {
+        'job_name': job_name,
+        'requested': count,
+        'fetched': len(builds),
+        'inserted': inserted,
+        'elapsed_seconds': elapsed
+    }, None
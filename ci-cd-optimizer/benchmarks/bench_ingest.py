@@ -0,0 +1,50 @@
+"""
+Measures SQLite ingest throughput of the persistence layer on a scratch database.
+
+Usage (from ci-cd-optimizer/):
+    python benchmarks/bench_ingest.py [--builds 5000] [--batch 500]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+
+STAGES = [{"name": name, "status": "SUCCESS", "durationMillis": 1000 * (i + 1)}
+          for i, name in enumerate(("Checkout", "Install", "Build", "Test", "Deploy"))]
+ISSUES = [{"type": "NETWORK", "cause": "Network/Connectivity Issue", "suggestion": "Retry"}]
+
+def record(job, n):
+    return {"job_name": job, "build_number": n, "status": "SUCCESS" if n % 5 else "FAILURE",
+            "duration": 60.0 + n % 17, "score": 70, "stages": STAGES, "issues": ISSUES if n % 5 == 0 else []}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--builds', type=int, default=5000)
+    parser.add_argument('--batch', type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_NAME = os.path.join(tmp, "bench.db")
+        database.init_db()
+
+        start = time.perf_counter()
+        for n in range(args.builds):
+            r = record("single", n)
+            database.save_analysis(r["job_name"], n, r["status"], r["duration"], r["score"], r["stages"], r["issues"])
+        single = args.builds / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for offset in range(0, args.builds, args.batch):
+            database.save_analyses_bulk([record("bulk", n) for n in range(offset, min(offset + args.batch, args.builds))])
+        bulk = args.builds / (time.perf_counter() - start)
+        database.close_connection()
+
+    print(f"save_analysis (1 txn/build):          {single:10.0f} builds/s")
+    print(f"save_analyses_bulk ({args.batch} builds/txn): {bulk:10.0f} builds/s")
+
+if __name__ == '__main__':
+    main()
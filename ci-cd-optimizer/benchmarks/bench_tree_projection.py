@@ -0,0 +1,66 @@
+"""
+Compares full vs tree= projected Jenkins API responses for one analysis.
+
+Usage (from ci-cd-optimizer/, with JENKINS_* set in .env):
+    python benchmarks/bench_tree_projection.py [--job NAME] [--repeat 5]
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import zlib
+import argparse
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jenkins_fetch import JenkinsClient, job_path, JOB_INFO_TREE, BUILD_TREE
+
+def measure(client, path, params, repeat):
+    """
+    Average wire bytes and JSON parse time for one GET.
+    """
+    transferred, parse_ms = 0, 0.0
+    for _ in range(repeat):
+        resp = client.session.get(client.url(path), params=params, timeout=client.timeout, stream=True)
+        body = resp.raw.read(decode_content=False) # As sent on the wire (gzip if negotiated)
+        transferred += len(body)
+        encoding = resp.headers.get('Content-Encoding', '')
+        if encoding == 'gzip':
+            body = gzip.decompress(body)
+        elif encoding == 'deflate':
+            body = zlib.decompress(body)
+        start = time.perf_counter()
+        json.loads(body)
+        parse_ms += (time.perf_counter() - start) * 1000.0
+    return transferred / repeat, parse_ms / repeat
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--job', default=os.environ.get('JENKINS_JOB_NAME', 'test-job'))
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    client = JenkinsClient(os.environ.get('JENKINS_URL', 'http://localhost:8080'),
+                           os.environ.get('JENKINS_USER'), os.environ.get('JENKINS_TOKEN'))
+    job = job_path(args.job)
+    build_number = client.session.get(client.url(f"{job}/api/json"), params={'tree': JOB_INFO_TREE},
+                                      timeout=client.timeout).json()['lastBuild']['number']
+
+    calls = [
+        ("job_info", f"{job}/api/json", JOB_INFO_TREE),
+        ("build_api", f"{job}/{build_number}/api/json", BUILD_TREE),
+    ]
+    total_saved_bytes, total_saved_ms = 0, 0.0
+    print(f"{'call':<10} {'full bytes':>12} {'tree bytes':>12} {'full parse ms':>14} {'tree parse ms':>14}")
+    for label, path, tree in calls:
+        full_bytes, full_ms = measure(client, path, None, args.repeat)
+        tree_bytes, tree_ms = measure(client, path, {'tree': tree}, args.repeat)
+        total_saved_bytes += full_bytes - tree_bytes
+        total_saved_ms += full_ms - tree_ms
+        print(f"{label:<10} {full_bytes:>12.0f} {tree_bytes:>12.0f} {full_ms:>14.2f} {tree_ms:>14.2f}")
+    print(f"\nSaved per analysis: {total_saved_bytes:.0f} bytes, {total_saved_ms:.2f} ms of JSON parsing")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import tarfile
+import logging
+from multiprocessing import Pool
+import database
+from analyzer import analyze_pipeline_v2
+from optimizer import optimize_pipeline_v2
+from fleet import _summarize, rank_fleet
+
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+
+# Only the first N failures are kept in the summary; the count is always exact
+MAX_REPORTED_ERRORS = 100
+
+def _jsonl_items(label, lines):
+    for lineno, line in enumerate(lines, start=1):
+        if line.strip():
+            yield f"{label}:{lineno}", 'text', line
+
+def _tar_items(path):
+    with tarfile.open(path, 'r:*') as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            label = f"{path}:{member.name}"
+            if member.name.endswith('.json'):
+                yield label, 'text', tar.extractfile(member).read()
+            elif member.name.endswith('.jsonl'):
+                yield from _jsonl_items(label, tar.extractfile(member))
+
+def _file_items(path):
+    if path.endswith(TAR_SUFFIXES):
+        yield from _tar_items(path)
+    elif path.endswith('.jsonl'):
+        with open(path, 'rb') as f:
+            yield from _jsonl_items(path, f)
+    elif path.endswith('.json'):
+        yield path, 'file', path # Read by the worker, not the parent
+
+def iter_sources(paths):
+    """
+    Expands directories, tar bundles and JSONL files into one pipeline document each.
+    Directories are walked in sorted order so runs are reproducible.
+    Yields: (label, kind, payload) where kind is 'file' (payload = path) or 'text' (payload = JSON)
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    yield from _file_items(os.path.join(root, name))
+        else:
+            yield from _file_items(path)
+
+def _load(kind, payload):
+    if kind == 'file':
+        with open(payload, 'rb') as f:
+            return json.load(f)
+    return json.loads(payload)
+
+def _analyze_one(item):
+    """
+    Worker: parse + analyze + optimize one document without touching the DB for writes.
+    Returns: {'source', 'record', 'row'} or {'source', 'error'}
+    """
+    label, kind, payload = item
+    try:
+        metrics = analyze_pipeline_v2(_load(kind, payload), persist=False)
+        if metrics is None:
+            return {'source': label, 'error': "Empty pipeline data"}
+        suggestions = optimize_pipeline_v2(metrics) # Only counted here
+    except Exception as e:
+        return {'source': label, 'error': f"{type(e).__name__}: {e}"}
+
+    row = _summarize(metrics)
+    row['suggestions'] = len(suggestions)
+    return {'source': label, 'record': database.analysis_record(metrics), 'row': row}
+
+def _init_worker(db_name):
+    database.DB_NAME = db_name
+    # The parent process is the writer, so a cached baseline here could be arbitrarily stale
+    database.set_cache_size(0)
+
+def _flush(pending):
+    if not pending:
+        return 0
+    saved = len(database.save_analyses_bulk(pending))
+    pending.clear()
+    return saved
+
+def _job_totals(rows):
+    jobs = {}
+    for row in rows:
+        job = jobs.setdefault(row['job_name'], {'builds': 0, 'failures': 0, 'regressions': 0})
+        job['builds'] += 1
+        job['failures'] += row['status'] != 'SUCCESS'
+        job['regressions'] += row['is_regression']
+    return jobs
+
+def ingest(paths, workers=None, batch_size=500, top=10, summary_path=None, chunksize=16):
+    """
+    Analyzes every pipeline JSON under `paths` (directories, .json, .jsonl, tar bundles).
+    Parsing, analysis and optimization run on a process pool; this process is the only
+    SQLite writer and commits results in input order, `batch_size` builds per transaction.
+    Workers read baselines as of the last committed batch.
+    Returns: summary dict (also written to `summary_path` when given)
+    """
+    started = time.perf_counter()
+    database.init_db()
+    rows, errors = [], []
+    error_count = saved = 0
+    pending = []
+
+    with Pool(processes=workers, initializer=_init_worker, initargs=(database.DB_NAME,)) as pool:
+        for result in pool.imap(_analyze_one, iter_sources(paths), chunksize=chunksize):
+            if 'error' in result:
+                error_count += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append(result)
+                continue
+            pending.append(result['record'])
+            rows.append(result['row'])
+            if len(pending) >= batch_size:
+                saved += _flush(pending)
+        saved += _flush(pending)
+
+    elapsed = time.perf_counter() - started
+    summary = rank_fleet(rows, top)
+    summary.update({
+        'inputs_total': len(rows) + error_count,
+        'analyzed': len(rows),
+        'saved': saved,
+        'error_count': error_count,
+        'errors': errors,
+        'jobs': _job_totals(rows),
+        'elapsed_seconds': round(elapsed, 2),
+        'builds_per_second': round(len(rows) / elapsed, 1) if elapsed > 0 else 0.0
+    })
+    logging.info(f"Ingested {len(rows)} builds ({error_count} errors) in {elapsed:.2f}s "
+                 f"({summary['builds_per_second']} builds/s)")
+
+    if summary_path:
+        with open(summary_path, 'w') as f:
+            json.dump(summary, f, indent=4)
+        logging.info(f"Summary written to {summary_path}")
+    return summary
@@ -0,0 +1,194 @@
+import os
+import sys
+import json
+import argparse
+import logging
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+def _jenkins_client(args):
+    from jenkins_fetch import get_client
+    kwargs = {}
+    if getattr(args, 'rate', None):
+        kwargs['rate_limit'] = args.rate
+    return get_client(
+        os.environ.get('JENKINS_URL', 'http://localhost:8080'),
+        os.environ.get('JENKINS_USER', 'admin'),
+        os.environ.get('JENKINS_TOKEN', ''),
+        **kwargs
+    )
+
+def _write_report(report, output):
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=4)
+        logging.info(f"Report written to {output}")
+    else:
+        json.dump(report, sys.stdout, indent=4)
+        print()
+
+def cmd_fleet_scan(args):
+    from fleet import scan_fleet
+    client = _jenkins_client(args)
+    report = scan_fleet(client, job_names=args.jobs or None, max_workers=args.workers, top=args.top)
+    _write_report(report, args.output)
+    return 0 if not report['errors'] else 1
+
+def cmd_backfill(args):
+    from backfill import backfill_job
+    client = _jenkins_client(args)
+    job_name = args.job or os.environ.get('JENKINS_JOB_NAME', 'test-job')
+    result, error_msg = backfill_job(client, job_name, count=args.count, max_workers=args.workers)
+    if error_msg:
+        logging.error(error_msg)
+        return 1
+    _write_report(result, None)
+    return 0
+
+def cmd_ingest(args):
+    from bulk_ingest import ingest
+    summary = ingest(args.paths, workers=args.workers, batch_size=args.batch, top=args.top,
+                     summary_path=args.summary)
+    if not args.summary:
+        _write_report(summary, None)
+    return 0 if not summary['error_count'] else 1
+
+def cmd_reclassify(args):
+    from reclassify import reclassify
+    summary = reclassify(workers=args.workers, batch_size=args.batch)
+    _write_report(summary, None)
+    return 0 if not summary['errors'] else 1
+
+def _stage_option(value, cast):
+    name, sep, number = value.rpartition('=')
+    if not sep or not name:
+        raise argparse.ArgumentTypeError(f"expected STAGE=VALUE, got {value!r}")
+    return name, cast(number)
+
+def cmd_simulate(args):
+    from database import init_db
+    from simulator import PipelineSimulator
+    init_db()
+    job_name = args.job or os.environ.get('JENKINS_JOB_NAME', 'test-job')
+    stages = None
+    if args.build:
+        with open(args.build) as f:
+            build = json.load(f)
+        job_name = args.job or build.get('job_name', job_name)
+        stages = build.get('stages')
+    simulator = PipelineSimulator.for_job(job_name, stages, seed=args.seed)
+    if simulator is None:
+        logging.error(f"No stage history for {job_name}; pass --build with a pipeline JSON")
+        return 1
+
+    changes = [('split', name, ways) for name, ways in args.split]
+    changes += [('speedup', name, factor) for name, factor in args.speedup]
+    changes += [('parallel', group.split(',')) for group in args.parallel]
+    if args.executors:
+        changes.append(('executors', args.executors))
+    try:
+        result = simulator.compare(changes, trials=args.trials)
+    except ValueError as e:
+        logging.error(str(e))
+        return 1
+    result.update(job_name=job_name, changes=[list(c) for c in changes], history_builds=len(simulator.samples))
+    _write_report(result, None)
+    return 0
+
+def cmd_poll(args):
+    from poller import JenkinsPoller
+    from jenkins_fetch import fetch_options_from_env
+    client = _jenkins_client(args)
+    poller = JenkinsPoller(client, job_names=args.jobs or None, interval=args.interval,
+                           concurrency=args.concurrency, fetch_options=fetch_options_from_env())
+    if args.once:
+        _write_report(poller.poll_once(now=float('inf')), None)
+        return 0
+    try:
+        poller.run()
+    except KeyboardInterrupt:
+        logging.info("Poller stopped")
+    return 0
+
+def cmd_tail(args):
+    from jenkins_fetch import tail_build
+    client = _jenkins_client(args)
+    def on_issue(issue):
+        logging.warning(f"{args.job}: {issue['cause']} - {issue['suggestion']}")
+    issues, error_msg = tail_build(client.base_url, args.job, None, None, build_number=args.build,
+                                   interval=args.interval, on_issue=on_issue, client=client)
+    if error_msg:
+        logging.error(error_msg)
+        return 1
+    _write_report({'job_name': args.job, 'build_number': args.build, 'issues': issues}, None)
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="CI/CD Intelligence Platform command line tools")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    fleet = sub.add_parser('fleet-scan', help="Analyze every job on the Jenkins controller and rank them")
+    fleet.add_argument('--jobs', nargs='*', help="Only scan these jobs (default: discover all, including folders)")
+    fleet.add_argument('--workers', type=int, default=8, help="Concurrent job fetches")
+    fleet.add_argument('--rate', type=float, help="Max requests per second against the controller")
+    fleet.add_argument('--top', type=int, default=10, help="Entries per ranking")
+    fleet.add_argument('--output', help="Write the JSON report here instead of stdout")
+    fleet.set_defaults(func=cmd_fleet_scan)
+
+    backfill = sub.add_parser('backfill', help="Seed history with the last N builds of a job")
+    backfill.add_argument('--job', help="Job name (default: JENKINS_JOB_NAME)")
+    backfill.add_argument('--count', type=int, default=100, help="How many recent builds to import")
+    backfill.add_argument('--workers', type=int, default=8, help="Concurrent wfapi/describe fetches")
+    backfill.set_defaults(func=cmd_backfill)
+
+    ingest = sub.add_parser('ingest', help="Analyze exported pipeline JSON (directories, .jsonl, tar bundles) offline")
+    ingest.add_argument('paths', nargs='+', help="Directories, .json, .jsonl or .tar[.gz] files")
+    ingest.add_argument('--workers', type=int, help="Analysis processes (default: CPU count)")
+    ingest.add_argument('--batch', type=int, default=500, help="Builds committed per SQLite transaction")
+    ingest.add_argument('--top', type=int, default=10, help="Entries per ranking")
+    ingest.add_argument('--summary', help="Write the JSON summary here instead of stdout")
+    ingest.set_defaults(func=cmd_ingest)
+
+    reclassify = sub.add_parser('reclassify', help="Re-run the current log rules over archived logs with stale findings")
+    reclassify.add_argument('--workers', type=int, help="Scanning processes (default: CPU count)")
+    reclassify.add_argument('--batch', type=int, default=1000, help="Builds committed per SQLite transaction")
+    reclassify.set_defaults(func=cmd_reclassify)
+
+    simulate = sub.add_parser('simulate', help="Predict wall-clock time for an alternative pipeline layout")
+    simulate.add_argument('--job', help="Job whose stage history is replayed (default: JENKINS_JOB_NAME)")
+    simulate.add_argument('--build', help="Pipeline JSON giving the stage layout (default: latest stored build, sequential)")
+    simulate.add_argument('--split', action='append', default=[], metavar='STAGE=N',
+                          type=lambda v: _stage_option(v, int), help="Run STAGE as N parallel branches")
+    simulate.add_argument('--speedup', action='append', default=[], metavar='STAGE=FACTOR',
+                          type=lambda v: _stage_option(v, float), help="Scale STAGE's duration (0.4 = 60%% faster)")
+    simulate.add_argument('--parallel', action='append', default=[], metavar='A,B',
+                          help="Let these stages run side by side")
+    simulate.add_argument('--executors', type=int, help="Executors available to the build")
+    simulate.add_argument('--trials', type=int, default=2000, help="Monte Carlo trials")
+    simulate.add_argument('--seed', type=int, help="Random seed for reproducible runs")
+    simulate.set_defaults(func=cmd_simulate)
+
+    poll = sub.add_parser('poll', help="Watch jobs and analyze each new completed build once")
+    poll.add_argument('--jobs', nargs='*', help="Only watch these jobs (default: discover all, including folders)")
+    poll.add_argument('--interval', type=float, help="Base seconds between probes of a job (default: POLL_INTERVAL)")
+    poll.add_argument('--concurrency', type=int, help="Concurrent requests against the controller")
+    poll.add_argument('--rate', type=float, help="Max requests per second against the controller")
+    poll.add_argument('--once', action='store_true', help="Check every job once and exit")
+    poll.set_defaults(func=cmd_poll)
+
+    tail = sub.add_parser('tail', help="Follow a running build's console and report log issues as they appear")
+    tail.add_argument('job', help="Job name (folders as a/b)")
+    tail.add_argument('build', type=int, nargs='?', help="Build number (default: the job's last build)")
+    tail.add_argument('--interval', type=float, default=5, help="Seconds between progressiveText polls")
+    tail.set_defaults(func=cmd_tail)
+
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,159 +1,635 @@
+import os
 import sqlite3
 import json
 import logging
-from datetime import datetime
+import threading
+from sketch import WindowedSketch
+from read_cache import ReadCache, cached_by_job
+from contextlib import contextmanager
+from datetime import datetime, timezone
 
 DB_NAME = "cicd_optimizer.db"
 
-def init_db():
-    conn = sqlite3.connect(DB_NAME)
+# Connection tuning applied once per connection.
+# WAL lets readers run alongside the single writer instead of hitting "database is locked",
+# and synchronous=NORMAL is durable across application crashes in WAL mode.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000", # ~16 MB page cache
+    "PRAGMA temp_store=MEMORY",
+)
+BUSY_TIMEOUT_SECONDS = 30
+
+# Builds in the rolling baseline window kept by job_stats
+STATS_WINDOW = 20
+
+# Recent runs of each stage kept by stage_baselines
+STAGE_WINDOW = 10
+
+# Successful runs behind the quantile baselines of each job and stage (between this and twice this many)
+SKETCH_WINDOW = int(os.environ.get('SKETCH_WINDOW', 1000))
+
+# Read-through cache for dashboard/analyzer queries, invalidated per job on every committed write.
+# The TTL only bounds staleness from writers in *other* processes (CLI backfill, bulk ingest).
+READ_CACHE_SIZE = int(os.environ.get('READ_CACHE_SIZE', 256))
+READ_CACHE_TTL = float(os.environ.get('READ_CACHE_TTL', 30))
+
+_local = threading.local()
+_read_cache = ReadCache(max_entries=READ_CACHE_SIZE, ttl=READ_CACHE_TTL)
+
+def _cache_namespace():
+    return DB_NAME
+
+def get_cache_stats():
+    """
+    Returns: hit/miss/invalidation counters of the read cache
+    """
+    return _read_cache.stats()
+
+def clear_cache():
+    _read_cache.clear()
+
+def set_cache_size(max_entries):
+    """
+    Resizes the read cache; 0 disables it (e.g. in processes that read while another one writes).
+    """
+    _read_cache.max_entries = max_entries
+    _read_cache.clear()
+
+def _touch(job_name):
+    """
+    Marks a job as written by the current transaction; its cached reads are dropped once it ends.
+    """
+    _local.dirty_jobs.add(job_name)
+
+def get_connection():
+    """
+    Returns this thread's connection to DB_NAME, opening and tuning it on first use.
+    Connections are cached per thread, per process and per database file.
+    """
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    key = (os.getpid(), DB_NAME) # Never reuse a connection inherited across fork()
+    conn = connections.get(key)
+    if conn is None:
+        conn = sqlite3.connect(DB_NAME, timeout=BUSY_TIMEOUT_SECONDS)
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        connections[key] = conn
+    return conn
+
+def close_connection():
+    """
+    Closes the calling thread's connections (e.g. at worker shutdown or in tests).
+    """
+    for conn in getattr(_local, 'connections', {}).values():
+        conn.close()
+    _local.connections = {}
+
+@contextmanager
+def transaction():
+    """
+    Yields a cursor; commits when the block exits cleanly, rolls back on error.
+    """
+    conn = get_connection()
     c = conn.cursor()
-    
-    # 1. Builds Table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS builds (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            job_name TEXT NOT NULL,
-            build_number INTEGER NOT NULL,
-            result TEXT,
-            total_duration REAL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            efficiency_score REAL,
-            UNIQUE(job_name, build_number)
-        )
-    ''')
-    
-    # 2. Stages Table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS stages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            build_id INTEGER,
-            name TEXT,
-            duration REAL,
-            status TEXT,
-            FOREIGN KEY(build_id) REFERENCES builds(id)
-        )
-    ''')
-    
-    # 3. Log Analysis / RCA Table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS log_analysis (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            build_id INTEGER,
-            issue_type TEXT,
-            root_cause TEXT,
-            suggestion TEXT,
-            FOREIGN KEY(build_id) REFERENCES builds(id)
-        )
-    ''')
+    _local.dirty_jobs = set()
+    _local.baselines = _BaselineBatch(c)
+    try:
+        yield c
+        _local.baselines.flush()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        _local.baselines = None
+        c.close()
+        # Invalidate only after commit so a concurrent miss can't re-cache pre-write rows
+        namespace = _cache_namespace()
+        for job_name in _local.dirty_jobs:
+            _read_cache.invalidate((namespace, job_name))
+        _local.dirty_jobs = set()
+
+def _ensure_column(c, table, column, declaration):
+    """
+    Adds a column to a table created by an older version of init_db.
+    """
+    c.execute(f'PRAGMA table_info({table})')
+    if column not in {row[1] for row in c.fetchall()}:
+        c.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+
+def init_db():
+    with transaction() as c:
+        # 1. Builds Table
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS builds (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_name TEXT NOT NULL,
+                build_number INTEGER NOT NULL,
+                result TEXT,
+                total_duration REAL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                efficiency_score REAL,
+                ruleset_version TEXT,
+                wall_clock INTEGER,
+                UNIQUE(job_name, build_number)
+            )
+        ''')
+        _ensure_column(c, 'builds', 'ruleset_version', 'TEXT')
+        # 1 once total_duration is first stage start to last stage end; NULL for rows stored
+        # when it was the sum of stage durations (longer than wall time for parallel stages)
+        _ensure_column(c, 'builds', 'wall_clock', 'INTEGER')
+
+        # 2. Stages Table
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS stages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                build_id INTEGER,
+                name TEXT,
+                duration REAL,
+                status TEXT,
+                log_signature TEXT,
+                FOREIGN KEY(build_id) REFERENCES builds(id)
+            )
+        ''')
+        # Set when the stage's own log was scanned (see jenkins_fetch.stage_log_signature)
+        _ensure_column(c, 'stages', 'log_signature', 'TEXT')
+
+        # 3. Log Analysis / RCA Table
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS log_analysis (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                build_id INTEGER,
+                issue_type TEXT,
+                root_cause TEXT,
+                suggestion TEXT,
+                FOREIGN KEY(build_id) REFERENCES builds(id)
+            )
+        ''')
+
+        # 4. Job Statistics (rolling baseline, maintained on every build write)
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS job_stats (
+                job_name TEXT PRIMARY KEY,
+                recent_builds TEXT NOT NULL,
+                total_builds INTEGER NOT NULL,
+                failures INTEGER NOT NULL,
+                success_count INTEGER NOT NULL,
+                success_sum REAL NOT NULL,
+                success_sum_sq REAL NOT NULL,
+                duration_sketch TEXT,
+                wall_clock INTEGER
+            )
+        ''')
+        _ensure_column(c, 'job_stats', 'duration_sketch', 'TEXT')
+        _ensure_column(c, 'job_stats', 'wall_clock', 'INTEGER') # Basis of the window and sketch, as builds.wall_clock
+        _rebuild_job_stats(c)
 
-    conn.commit()
-    conn.close()
+        # 5. Stage Baselines (per job + stage name, maintained as stages are saved)
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS stage_baselines (
+                job_name TEXT NOT NULL,
+                stage_name TEXT NOT NULL,
+                recent_runs TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                mean REAL NOT NULL,
+                std_dev REAL NOT NULL,
+                p50 REAL NOT NULL,
+                p90 REAL NOT NULL,
+                sketch TEXT,
+                PRIMARY KEY (job_name, stage_name)
+            )
+        ''')
+        _ensure_column(c, 'stage_baselines', 'sketch', 'TEXT')
+        _rebuild_stage_baselines(c)
+
+        # 6. Archived console logs (blobs live in log_store, addressed by SHA-256)
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS build_logs (
+                job_name TEXT NOT NULL,
+                build_number INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                raw_size INTEGER NOT NULL,
+                stored_size INTEGER NOT NULL,
+                archived_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (job_name, build_number)
+            )
+        ''')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_build_logs_digest ON build_logs(digest)')
+
+        # 7. Stage-scoped log findings (from per-stage node logs, replaced with the build's stages)
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS stage_issues (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                build_id INTEGER NOT NULL,
+                stage_name TEXT NOT NULL,
+                issue_type TEXT,
+                root_cause TEXT,
+                suggestion TEXT,
+                FOREIGN KEY(build_id) REFERENCES builds(id)
+            )
+        ''')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_stage_issues_build ON stage_issues(build_id)')
+
+        # 8. Failure fingerprints (normalized failing lines) and the builds they occurred in
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS failure_fingerprints (
+                fingerprint TEXT PRIMARY KEY,
+                issue_type TEXT NOT NULL,
+                normalized TEXT NOT NULL,
+                sample TEXT,
+                first_seen DATETIME,
+                last_seen DATETIME,
+                occurrences INTEGER NOT NULL DEFAULT 0,
+                last_job_name TEXT
+            )
+        ''')
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS fingerprint_occurrences (
+                fingerprint TEXT NOT NULL,
+                build_id INTEGER NOT NULL,
+                job_name TEXT NOT NULL,
+                seen_at DATETIME,
+                hits INTEGER NOT NULL,
+                PRIMARY KEY (fingerprint, build_id)
+            )
+        ''')
+        # Covering index for "top failures since X": a range scan, no table lookups
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_fingerprint_occurrences_seen
+                     ON fingerprint_occurrences(seen_at, fingerprint, job_name, hits)''')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_fingerprint_occurrences_build ON fingerprint_occurrences(build_id)')
+
+        # 9. Poller bookkeeping: last analyzed build and probe validators per controller job
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS poller_state (
+                controller TEXT NOT NULL,
+                job_name TEXT NOT NULL,
+                last_build INTEGER,
+                etag TEXT,
+                last_modified TEXT,
+                interval REAL,
+                next_check REAL,
+                errors INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                failed_build INTEGER,
+                checked_at DATETIME,
+                PRIMARY KEY (controller, job_name)
+            )
+        ''')
+        _ensure_column(c, 'poller_state', 'failed_build', 'INTEGER')
+
+        # Child rows are replaced per build on every save, so look them up by build_id
+        c.execute('CREATE INDEX IF NOT EXISTS idx_stages_build ON stages(build_id)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_log_analysis_build ON log_analysis(build_id)')
+
+    clear_cache() # Rebuilds above may have rewritten any job's derived rows
     logging.info(f"Database {DB_NAME} initialized.")
 
+def _upsert_build(c, job_name, build_number, result, duration, score):
+    """
+    Inserts or updates a build row in place, keeping its id stable so stage and
+    log rows stay attached. Returns the build id.
+    """
+    c.execute('SELECT result, total_duration, wall_clock FROM builds WHERE job_name=? AND build_number=?',
+              (job_name, build_number))
+    previous = c.fetchone()
+    c.execute('''
+        INSERT INTO builds (job_name, build_number, result, total_duration, efficiency_score, wall_clock)
+        VALUES (?, ?, ?, ?, ?, 1)
+        ON CONFLICT(job_name, build_number) DO UPDATE SET
+            result = excluded.result,
+            total_duration = excluded.total_duration,
+            efficiency_score = excluded.efficiency_score,
+            wall_clock = 1
+    ''', (job_name, build_number, result, duration, score))
+    c.execute('SELECT id FROM builds WHERE job_name=? AND build_number=?', (job_name, build_number))
+    build_id = c.fetchone()[0]
+    # A summed duration stored before the switch to wall-clock is not in a wall-clock sketch
+    _update_job_stats(c, job_name, build_number, result, duration,
+                      tuple(previous)[:2] if previous and previous[2] else None)
+    _touch(job_name)
+    return build_id
+
+def _replace_stages(c, build_id, stages, job_name=None, build_number=None):
+    if job_name is None:
+        c.execute('SELECT job_name, build_number FROM builds WHERE id=?', (build_id,))
+        job_name, build_number = c.fetchone()
+    _touch(job_name)
+    c.execute('SELECT name, duration, status FROM stages WHERE build_id=? ORDER BY id', (build_id,))
+    old_runs = {row[0]: (row[1], row[2]) for row in c.fetchall()}
+
+    # Clear old stages if any (for updates)
+    c.execute('DELETE FROM stages WHERE build_id=?', (build_id,))
+    c.execute('DELETE FROM stage_issues WHERE build_id=?', (build_id,))
+    c.executemany('''
+        INSERT INTO stages (build_id, name, duration, status, log_signature)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [(build_id, stage['name'], stage['durationMillis'] / 1000.0, stage['status'], stage.get('log_signature'))
+          for stage in stages])
+    c.executemany('''
+        INSERT INTO stage_issues (build_id, stage_name, issue_type, root_cause, suggestion)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [(build_id, stage['name'], issue['type'], issue['cause'], issue['suggestion'])
+          for stage in stages for issue in stage.get('log_issues', ())])
+
+    runs = {stage['name']: (stage['durationMillis'] / 1000.0, stage['status']) for stage in stages}
+    for name in set(old_runs) - set(runs):
+        # Stage no longer in this build
+        _update_stage_baseline(c, job_name, name, build_number, None, previous=old_runs[name])
+    for name, (duration, status) in runs.items():
+        _update_stage_baseline(c, job_name, name, build_number, duration, status, previous=old_runs.get(name))
+
+def _replace_issues(c, build_id, issues):
+    c.execute('DELETE FROM log_analysis WHERE build_id=?', (build_id,))
+    c.executemany('''
+        INSERT INTO log_analysis (build_id, issue_type, root_cause, suggestion)
+        VALUES (?, ?, ?, ?)
+    ''', [(build_id, issue['type'], issue['cause'], issue['suggestion']) for issue in issues])
+
+def _replace_failures(c, build_id, failures):
+    """
+    Replaces a build's failure fingerprints, keeping each fingerprint's build count,
+    first_seen and last_seen in step (re-analysing a build never double counts).
+    """
+    c.execute('SELECT job_name, timestamp FROM builds WHERE id=?', (build_id,))
+    job_name, seen_at = c.fetchone()
+    c.execute('SELECT fingerprint FROM fingerprint_occurrences WHERE build_id=?', (build_id,))
+    old = {row[0] for row in c.fetchall()}
+    new = {f['fingerprint']: f for f in failures}
+
+    gone = [(fingerprint,) for fingerprint in old - set(new)]
+    c.executemany('UPDATE failure_fingerprints SET occurrences = occurrences - 1 WHERE fingerprint=?', gone)
+    # A fingerprint no stored build hits any more is dropped, so the table doesn't keep every line ever seen
+    c.executemany('DELETE FROM failure_fingerprints WHERE fingerprint=? AND occurrences <= 0', gone)
+    c.executemany('''
+        INSERT INTO failure_fingerprints
+            (fingerprint, issue_type, normalized, sample, first_seen, last_seen, occurrences, last_job_name)
+        VALUES (?, ?, ?, ?, ?, ?, 1, ?)
+        ON CONFLICT(fingerprint) DO UPDATE SET
+            occurrences = occurrences + 1,
+            sample = excluded.sample,
+            first_seen = MIN(first_seen, excluded.first_seen),
+            last_seen = MAX(last_seen, excluded.last_seen),
+            last_job_name = excluded.last_job_name
+    ''', [(f['fingerprint'], f['type'], f['normalized'], f['sample'], seen_at, seen_at, job_name)
+          for fingerprint, f in new.items() if fingerprint not in old])
+
+    c.execute('DELETE FROM fingerprint_occurrences WHERE build_id=?', (build_id,))
+    c.executemany('''
+        INSERT INTO fingerprint_occurrences (fingerprint, build_id, job_name, seen_at, hits)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [(fingerprint, build_id, job_name, seen_at, f['hits']) for fingerprint, f in new.items()])
+
+def _write_analysis(c, record):
+    build_id = _upsert_build(c, record['job_name'], record['build_number'], record['status'],
+                             record['duration'], record.get('score', 0))
+    _replace_stages(c, build_id, record.get('stages', []), record['job_name'], record['build_number'])
+    _replace_issues(c, build_id, record.get('issues', []))
+    if record.get('failures') is not None:
+        _replace_failures(c, build_id, record['failures'])
+    # The issues were just replaced, so an older stamp no longer describes them (NULL without a scanned log)
+    c.execute('UPDATE builds SET ruleset_version=? WHERE id=?', (record.get('ruleset') or None, build_id))
+    log = record.get('log')
+    if log:
+        log['replaced'] = _upsert_build_log(c, record['job_name'], record['build_number'],
+                                            log['digest'], log['raw_size'], log['stored_size'])
+    return build_id
+
+def save_analysis(job_name, build_number, result, duration, score=0, stages=(), issues=(), ruleset=None,
+                  failures=None):
+    """
+    Persists one analysis (build + stages + log findings) in a single transaction.
+    `ruleset`: LogIntelligenceEngine.RULESET_VERSION that produced `issues`, when a log was scanned.
+    `failures`: fingerprinted failing lines (LogStreamScanner.failures); None leaves them untouched.
+    Returns: build id, or None on failure
+    """
+    try:
+        with transaction() as c:
+            return _write_analysis(c, {
+                'job_name': job_name, 'build_number': build_number, 'status': result,
+                'duration': duration, 'score': score, 'stages': stages, 'issues': issues,
+                'ruleset': ruleset, 'failures': failures
+            })
+    except Exception as e:
+        logging.error(f"Error saving analysis: {e}")
+        return None
+
+def analysis_record(metrics):
+    """
+    The save_analyses_bulk record for an analyze_pipeline_v2(..., persist=False) result.
+    """
+    return {
+        'job_name': metrics['job_name'],
+        'build_number': metrics['build_number'],
+        'status': metrics['status'],
+        'duration': metrics['total_duration'],
+        'score': metrics['efficiency']['total_score'],
+        'stages': metrics['stages'],
+        'issues': metrics['issues'],
+        'ruleset': metrics['ruleset_version'],
+        'failures': metrics['failures']
+    }
+
+def save_analyses_bulk(records):
+    """
+    Persists many analyses in one transaction (batch ingest).
+    `records`: dicts with job_name, build_number, status, duration, score, stages, issues
+               (and optionally ruleset, failures, and `log`: a LogStore.place() entry to point
+               the build at; its 'replaced' key is set to the digest the build pointed at before)
+    Returns: list of build ids (empty on failure)
+    """
+    try:
+        with transaction() as c:
+            return [_write_analysis(c, record) for record in records]
+    except Exception as e:
+        logging.error(f"Error bulk saving analyses: {e}")
+        return []
+
 def save_build(job_name, build_number, result, duration, score=0):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
     try:
-        c.execute('''
-            INSERT OR REPLACE INTO builds (job_name, build_number, result, total_duration, efficiency_score)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (job_name, build_number, result, duration, score))
-        build_id = c.lastrowid
-        # If REPLACE happened, lastrowid might be 0 or unexpected depending on sqlite version, 
-        # so let's fetch it to be safe.
-        if build_id == 0:
-             c.execute('SELECT id FROM builds WHERE job_name=? AND build_number=?', (job_name, build_number))
-             build_id = c.fetchone()[0]
-        conn.commit()
-        return build_id
+        with transaction() as c:
+            return _upsert_build(c, job_name, build_number, result, duration, score)
     except Exception as e:
         logging.error(f"Error saving build: {e}")
         return None
-    finally:
-        conn.close()
 
 def save_stages(build_id, stages):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
     try:
-        # Clear old stages if any (for updates)
-        c.execute('DELETE FROM stages WHERE build_id=?', (build_id,))
-        
-        for stage in stages:
-            c.execute('''
+        with transaction() as c:
+            _replace_stages(c, build_id, stages)
+    except Exception as e:
+        logging.error(f"Error saving stages: {e}")
+
+def _jenkins_timestamp(millis):
+    """
+    Jenkins epoch millis -> the 'YYYY-MM-DD HH:MM:SS' UTC format CURRENT_TIMESTAMP uses.
+    """
+    if not millis:
+        return None
+    return datetime.fromtimestamp(millis / 1000.0, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def save_builds_bulk(job_name, builds):
+    """
+    Inserts many historical builds (and their stages) in a single transaction.
+    Existing builds are left untouched so backfill never clobbers analyzed results.
+    Backfilled builds are not analyzed, so their efficiency_score is NULL (not a score of 0).
+    `builds`: list of fetcher data dicts (build_number, status, duration_seconds, stages, timestamp)
+    Returns: number of builds inserted
+    """
+    try:
+        with transaction() as c:
+            c.execute('SELECT build_number FROM builds WHERE job_name=?', (job_name,))
+            existing = {row[0] for row in c.fetchall()}
+            # Oldest first, so each build lands at the head of the baseline windows
+            new_builds = sorted((b for b in builds if b['build_number'] not in existing), key=lambda b: b['build_number'])
+            if not new_builds:
+                return 0
+            _touch(job_name)
+
+            c.executemany('''
+                INSERT INTO builds (job_name, build_number, result, total_duration, timestamp, efficiency_score, wall_clock)
+                VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), NULL, 1)
+            ''', [(job_name, b['build_number'], b['status'], b['duration_seconds'], _jenkins_timestamp(b.get('timestamp')))
+                  for b in new_builds])
+
+            c.execute('SELECT build_number, id FROM builds WHERE job_name=?', (job_name,))
+            ids = {row[0]: row[1] for row in c.fetchall()}
+            for b in new_builds:
+                _update_job_stats(c, job_name, b['build_number'], b['status'], b['duration_seconds'])
+
+            c.executemany('''
                 INSERT INTO stages (build_id, name, duration, status)
                 VALUES (?, ?, ?, ?)
-            ''', (build_id, stage['name'], stage['durationMillis'] / 1000.0, stage['status']))
-        conn.commit()
+            ''', [(ids[b['build_number']], stage['name'], stage['durationMillis'] / 1000.0, stage['status'])
+                  for b in new_builds for stage in b.get('stages', [])])
+            # Grouped by stage: each stage_baselines row is folded in memory and upserted once at commit
+            runs = {}
+            for b in new_builds:
+                for stage in b.get('stages', []):
+                    runs.setdefault(stage['name'], []).append((b['build_number'], stage['durationMillis'] / 1000.0,
+                                                               stage['status']))
+            for stage_name, stage_runs in runs.items():
+                for build_number, duration, status in stage_runs:
+                    _update_stage_baseline(c, job_name, stage_name, build_number, duration, status)
+            return len(new_builds)
     except Exception as e:
-        logging.error(f"Error saving stages: {e}")
-    finally:
-        conn.close()
+        logging.error(f"Error bulk saving builds: {e}")
+        return 0
 
+@cached_by_job(_read_cache, _cache_namespace)
 def get_job_history(job_name, limit=10):
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
+    c = get_connection().cursor()
     c.execute('''
-        SELECT * FROM builds 
-        WHERE job_name = ? 
-        ORDER BY build_number DESC 
+        SELECT * FROM builds
+        WHERE job_name = ?
+        ORDER BY build_number DESC
         LIMIT ?
     ''', (job_name, limit))
     rows = c.fetchall()
-    conn.close()
     return [dict(row) for row in rows]
 
+def get_stored_results(keys):
+    """
+    Stored result of each (job_name, build_number) pair that has a build row, in one query.
+    Returns: {(job_name, build_number): result}
+    """
+    keys = list(keys)
+    if not keys:
+        return {}
+    c = get_connection().cursor()
+    c.execute(f'''
+        SELECT job_name, build_number, result FROM builds
+        WHERE (job_name, build_number) IN (VALUES {", ".join("(?, ?)" for _ in keys)})
+    ''', [v for key in keys for v in key])
+    return {(job_name, build_number): result for job_name, build_number, result in c.fetchall()}
+
+@cached_by_job(_read_cache, _cache_namespace)
+def get_builds_page(job_name, before=None, after=None, limit=50, include=()):
+    """
+    Keyset page of a job's builds: newest first below build `before`, or oldest first above
+    build `after`. Each page is a seek on the (job_name, build_number) index, so deep pages
+    cost the same as the first. `include` may name 'stages' and/or 'issues' to attach them
+    (one extra query each for the whole page).
+    Returns: (builds, has_more)
+    """
+    c = get_connection().cursor()
+    if after is not None:
+        c.execute('''
+            SELECT id, build_number, result, total_duration, timestamp, efficiency_score, ruleset_version
+            FROM builds WHERE job_name = ? AND build_number > ?
+            ORDER BY build_number ASC LIMIT ?
+        ''', (job_name, after, limit + 1))
+    else:
+        c.execute('''
+            SELECT id, build_number, result, total_duration, timestamp, efficiency_score, ruleset_version
+            FROM builds WHERE job_name = ? AND build_number < ?
+            ORDER BY build_number DESC LIMIT ?
+        ''', (job_name, 2 ** 63 - 1 if before is None else before, limit + 1))
+    rows = c.fetchall()
+    builds = {row['id']: {k: row[k] for k in row.keys() if k != 'id'} for row in rows[:limit]}
+    if builds and include:
+        placeholders = ','.join('?' for _ in builds)
+        if 'stages' in include:
+            for build in builds.values():
+                build['stages'] = []
+            c.execute(f'''
+                SELECT build_id, name, duration, status FROM stages
+                WHERE build_id IN ({placeholders}) ORDER BY id
+            ''', list(builds))
+            for build_id, name, duration, status in c.fetchall():
+                builds[build_id]['stages'].append({'name': name, 'duration': duration, 'status': status})
+        if 'issues' in include:
+            for build in builds.values():
+                build['issues'] = []
+            c.execute(f'''
+                SELECT build_id, issue_type, root_cause, suggestion FROM log_analysis
+                WHERE build_id IN ({placeholders}) ORDER BY id
+            ''', list(builds))
+            for build_id, issue_type, cause, suggestion in c.fetchall():
+                builds[build_id]['issues'].append({'type': issue_type, 'cause': cause, 'suggestion': suggestion})
+    return list(builds.values()), len(rows) > limit
+
+def get_jobs_summary():
+    """
+    Every job with stored builds (one pass over the (job_name, build_number) index).
+    Returns: [{'job_name', 'builds', 'last_build'}]
+    """
+    c = get_connection().cursor()
+    c.execute('''
+        SELECT job_name, COUNT(*) AS builds, MAX(build_number) AS last_build
+        FROM builds GROUP BY job_name ORDER BY job_name
+    ''')
+    return [dict(row) for row in c.fetchall()]
+
 def get_average_duration(job_name):
     # Legacy wrapper
     stats = get_job_statistics(job_name)
     return stats['avg_duration']
 
-def get_job_statistics(job_name, limit=20):
+def _summarize_stats(total_builds, failures, success_count, success_sum, success_sum_sq):
     """
-    Calculates detailed statistics for the "Historical Baseline Engine".
-    Returns: {
-        'avg_duration': float,
-        'std_dev': float,
-        'failure_rate': float,
-        'total_builds': int
-    }
+    Turns rolling-window counters into the baseline dict the engines consume.
     """
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    
-    # Fetch last N builds
-    c.execute('''
-        SELECT result, total_duration FROM builds 
-        WHERE job_name = ? 
-        ORDER BY build_number DESC 
-        LIMIT ?
-    ''', (job_name, limit))
-    rows = c.fetchall()
-    conn.close()
-    
-    if not rows:
+    if not total_builds:
         return {'avg_duration': 0, 'std_dev': 0, 'failure_rate': 0, 'total_builds': 0}
 
-    total_builds = len(rows)
-    failures = sum(1 for r in rows if r['result'] != 'SUCCESS')
-    success_durations = [r['total_duration'] for r in rows if r['result'] == 'SUCCESS']
-    
     # 1. Failure Rate
-    failure_rate = (failures / total_builds) * 100 if total_builds > 0 else 0
-    
+    failure_rate = (failures / total_builds) * 100
+
     # 2. Average & StdDev (only for successful builds)
-    if not success_durations:
+    if not success_count:
         return {'avg_duration': 0, 'std_dev': 0, 'failure_rate': failure_rate, 'total_builds': total_builds}
-        
-    avg = sum(success_durations) / len(success_durations)
-    
-    # Variance = sum((x - mean)^2) / N
-    variance = sum((x - avg) ** 2 for x in success_durations) / len(success_durations)
+
+    avg = success_sum / success_count
+
+    # Population variance = E[x^2] - E[x]^2 (clamped against float rounding)
+    variance = max(0.0, success_sum_sq / success_count - avg * avg)
     std_dev = variance ** 0.5
-    
+
     return {
         'avg_duration': avg,
         'std_dev': std_dev,
@@ -161,45 +637,321 @@ def get_job_statistics(job_name, limit=20):
         'total_builds': total_builds
     }
 
+def _sketch_quantiles(sketch):
+    """
+    Robust baseline from a windowed duration sketch: median, p90 and an IQR-based sigma
+    (IQR / 1.349 estimates the std-dev of a normal distribution without outlier pull).
+    """
+    return {
+        'history_count': sketch.count,
+        'history_p50': sketch.quantile(0.5),
+        'history_p90': sketch.quantile(0.9),
+        'robust_sigma': (sketch.quantile(0.75) - sketch.quantile(0.25)) / 1.349
+    }
+
+def _window_counters(window):
+    """
+    (total, failures, success_count, success_sum, success_sum_sq) for [[build_number, result, duration], ...]
+    """
+    successes = [duration for _, result, duration in window if result == 'SUCCESS']
+    return (len(window), len(window) - len(successes), len(successes),
+            sum(successes), sum(d * d for d in successes))
+
+class _BaselineBatch:
+    """
+    The job_stats and stage_baselines rows touched by one transaction. Each row (and its
+    window and sketch) is decoded once, updated in memory by every build of the batch, and
+    encoded and written once by flush() just before the commit, so bulk writes cost one
+    read and one upsert per job and per (job, stage) rather than per build and per stage.
+    """
+    def __init__(self, c):
+        self.c = c
+        self.jobs = {} # job_name -> {'window', 'sketch', 'wall_clock', 'stored'}
+        self.stages = {} # (job_name, stage_name) -> {'window', 'sketch', 'stored'}
+        self._stage_jobs = set() # Jobs whose stage_baselines rows are loaded
+
+    def job(self, job_name):
+        state = self.jobs.get(job_name)
+        if state is None:
+            self.c.execute('SELECT recent_builds, duration_sketch, wall_clock FROM job_stats WHERE job_name=?',
+                           (job_name,))
+            row = self.c.fetchone()
+            state = self.jobs[job_name] = {
+                'window': json.loads(row[0]) if row else [],
+                'sketch': WindowedSketch.from_json(row[1] if row else None, SKETCH_WINDOW),
+                'wall_clock': row[2] if row else None,
+                'stored': row is not None
+            }
+        return state
+
+    def stage(self, job_name, stage_name):
+        if job_name not in self._stage_jobs:
+            # One range read loads every stage of the job
+            self._stage_jobs.add(job_name)
+            self.c.execute('SELECT stage_name, recent_runs, sketch FROM stage_baselines WHERE job_name=?', (job_name,))
+            for name, recent_runs, sketch in self.c.fetchall():
+                self.stages.setdefault((job_name, name), {
+                    'window': json.loads(recent_runs),
+                    'sketch': WindowedSketch.from_json(sketch, SKETCH_WINDOW), 'stored': True
+                })
+        state = self.stages.get((job_name, stage_name))
+        if state is None:
+            state = self.stages[(job_name, stage_name)] = {
+                'window': [], 'sketch': WindowedSketch(SKETCH_WINDOW), 'stored': False
+            }
+        return state
+
+    def flush(self):
+        if self.jobs:
+            self.c.executemany('''
+                INSERT INTO job_stats (job_name, recent_builds, total_builds, failures, success_count, success_sum,
+                                       success_sum_sq, duration_sketch, wall_clock)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(job_name) DO UPDATE SET
+                    recent_builds = excluded.recent_builds,
+                    total_builds = excluded.total_builds,
+                    failures = excluded.failures,
+                    success_count = excluded.success_count,
+                    success_sum = excluded.success_sum,
+                    success_sum_sq = excluded.success_sum_sq,
+                    duration_sketch = excluded.duration_sketch,
+                    wall_clock = excluded.wall_clock
+            ''', [(job_name, json.dumps(state['window'])) + _window_counters(state['window'])
+                  + (state['sketch'].to_json(), state['wall_clock'])
+                  for job_name, state in self.jobs.items() if 'dirty' in state])
+
+        rows, empty = [], []
+        for (job_name, stage_name), state in self.stages.items():
+            if 'dirty' not in state:
+                continue
+            if not state['window']:
+                empty.append((job_name, stage_name))
+                continue
+            values = sorted(d for _, d in state['window'])
+            mean = sum(values) / len(values)
+            std_dev = (sum((v - mean) ** 2 for v in values) / len(values)) ** 0.5
+            rows.append((job_name, stage_name, json.dumps(state['window']), len(values), mean, std_dev,
+                         _percentile(values, 0.5), _percentile(values, 0.9), state['sketch'].to_json()))
+        self.c.executemany('DELETE FROM stage_baselines WHERE job_name=? AND stage_name=?', empty)
+        self.c.executemany('''
+            INSERT INTO stage_baselines (job_name, stage_name, recent_runs, count, mean, std_dev, p50, p90, sketch)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(job_name, stage_name) DO UPDATE SET
+                recent_runs = excluded.recent_runs,
+                count = excluded.count,
+                mean = excluded.mean,
+                std_dev = excluded.std_dev,
+                p50 = excluded.p50,
+                p90 = excluded.p90,
+                sketch = excluded.sketch
+        ''', rows)
+        self.jobs, self.stages, self._stage_jobs = {}, {}, set()
+
+def _window_put(window, entry, size):
+    """
+    Newest-first window of [build_number, ...] entries with `entry` in place of any entry
+    for the same build, cut to `size`. The common case, a newer build, is a plain prepend.
+    """
+    if not window or entry[0] > window[0][0]:
+        window.insert(0, entry)
+        del window[size:]
+        return window
+    window = [e for e in window if e[0] != entry[0]]
+    window.append(entry)
+    window.sort(key=lambda e: e[0], reverse=True)
+    return window[:size]
+
+def _update_job_stats(c, job_name, build_number, result, duration, previous=None, wall_clock=True):
+    """
+    Folds one saved build into the job's rolling window (the newest STATS_WINDOW builds)
+    and, if it succeeded, into the duration sketch. `previous`: the (result, duration) stored
+    for this build before a re-analysis, taken back out of the sketch first.
+    The first wall-clock build of a job whose baseline holds summed stage durations
+    (see builds.wall_clock) starts the baseline over, so parallel jobs don't show false speedups.
+    Updates the transaction's _BaselineBatch; the row is written once at commit, so reads
+    never touch the builds table.
+    """
+    state = _local.baselines.job(job_name)
+    state['dirty'] = True
+    if state['stored'] and wall_clock and not state['wall_clock']:
+        logging.info(f"{job_name}: re-baselining on wall-clock durations")
+        state['window'], state['sketch'], previous = [], WindowedSketch(SKETCH_WINDOW), None
+    if wall_clock:
+        state['wall_clock'] = 1
+    state['stored'] = True
+
+    # Only successful builds feed the sketch, like the window's mean and std-dev
+    if previous and previous[0] == 'SUCCESS':
+        state['sketch'].remove(previous[1] or 0)
+    if result == 'SUCCESS':
+        state['sketch'].add(duration or 0)
+
+    # Re-analysis of a build replaces its entry; older builds outside a full window don't count
+    state['window'] = _window_put(state['window'], [build_number, result, duration or 0], STATS_WINDOW)
+
+def _rebuild_job_stats(c):
+    """
+    Seeds job_stats for jobs that have builds but no summary row (or no windowed sketch) yet,
+    by replaying their full history oldest-first (existing databases).
+    """
+    c.execute("DELETE FROM job_stats WHERE duration_sketch IS NULL OR json_extract(duration_sketch, '$.w') IS NULL")
+    c.execute('SELECT DISTINCT job_name FROM builds WHERE job_name NOT IN (SELECT job_name FROM job_stats)')
+    for (job_name,) in c.fetchall():
+        c.execute('''
+            SELECT build_number, result, total_duration, wall_clock FROM builds
+            WHERE job_name = ?
+            ORDER BY wall_clock IS NOT NULL, build_number -- Summed durations first, so wall-clock ones re-baseline
+        ''', (job_name,))
+        for build_number, result, duration, wall_clock in c.fetchall():
+            _update_job_stats(c, job_name, build_number, result, duration, wall_clock=wall_clock)
+
+def _percentile(sorted_values, q):
+    """
+    Linear-interpolated percentile (q in 0..1) of an already sorted list.
+    """
+    if not sorted_values:
+        return 0
+    pos = (len(sorted_values) - 1) * q
+    lower = int(pos)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (pos - lower)
+
+def _update_stage_baseline(c, job_name, stage_name, build_number, duration, status=None, previous=None):
+    """
+    Folds one stage run into its (job, stage) baseline: the newest STAGE_WINDOW runs with
+    mean, population std-dev and p50/p90, plus a duration sketch of its successful runs
+    (the same rule as the job sketch). `previous`: the (duration, status) stored for this
+    build before a re-analysis, taken back out of the sketch first.
+    duration=None drops the build's run from the window instead (and the row once it is empty).
+    Updates the transaction's _BaselineBatch; the row is written once at commit.
+    """
+    state = _local.baselines.stage(job_name, stage_name)
+    state['dirty'] = True
+    if previous and previous[1] == 'SUCCESS':
+        state['sketch'].remove(previous[0])
+    if duration is not None and status == 'SUCCESS':
+        state['sketch'].add(duration)
+
+    if duration is not None:
+        state['window'] = _window_put(state['window'], [build_number, duration], STAGE_WINDOW)
+    else:
+        state['window'] = [entry for entry in state['window'] if entry[0] != build_number]
+
+def _rebuild_stage_baselines(c):
+    """
+    Seeds stage_baselines for stages that have stored runs but no baseline (or no windowed
+    sketch) yet (existing databases).
+    """
+    c.execute("DELETE FROM stage_baselines WHERE sketch IS NULL OR json_extract(sketch, '$.w') IS NULL")
+    c.execute('''
+        SELECT b.job_name, b.build_number, s.name, s.duration, s.status
+        FROM stages s JOIN builds b ON b.id = s.build_id
+        WHERE NOT EXISTS (
+            SELECT 1 FROM stage_baselines sb WHERE sb.job_name = b.job_name AND sb.stage_name = s.name
+        )
+        ORDER BY b.build_number
+    ''')
+    for job_name, build_number, stage_name, duration, status in c.fetchall():
+        _update_stage_baseline(c, job_name, stage_name, build_number, duration, status)
+
+@cached_by_job(_read_cache, _cache_namespace)
+def get_stage_baselines(job_name):
+    """
+    Materialized per-stage baselines for a job (one primary-key range read).
+    Window stats cover the last STAGE_WINDOW runs; history_* quantiles come from the windowed sketch.
+    Returns: {stage_name: {'mean', 'std_dev', 'count', 'p50', 'p90',
+                           'history_count', 'history_p50', 'history_p90', 'robust_sigma'}}
+    """
+    c = get_connection().cursor()
+    c.execute('''
+        SELECT stage_name, mean, std_dev, count, p50, p90, sketch
+        FROM stage_baselines WHERE job_name = ?
+    ''', (job_name,))
+    baselines = {}
+    for row in c.fetchall():
+        baselines[row['stage_name']] = dict(
+            {'mean': row['mean'], 'std_dev': row['std_dev'], 'count': row['count'],
+             'p50': row['p50'], 'p90': row['p90']},
+            **_sketch_quantiles(WindowedSketch.from_json(row['sketch'], SKETCH_WINDOW))
+        )
+    return baselines
+
+@cached_by_job(_read_cache, _cache_namespace)
+def get_job_statistics(job_name, limit=STATS_WINDOW):
+    """
+    Calculates detailed statistics for the "Historical Baseline Engine".
+    The default window is served from the incrementally maintained job_stats row (one keyed read),
+    together with robust quantiles from the job's windowed duration sketch (see SKETCH_WINDOW);
+    other window sizes fall back to scanning the last `limit` builds.
+    Returns: {
+        'avg_duration': float,
+        'std_dev': float,
+        'failure_rate': float,
+        'total_builds': int,
+        # default window only:
+        'history_count': int, 'history_p50': float, 'history_p90': float, 'robust_sigma': float
+    }
+    """
+    c = get_connection().cursor()
+
+    if limit == STATS_WINDOW:
+        c.execute('''
+            SELECT total_builds, failures, success_count, success_sum, success_sum_sq, duration_sketch
+            FROM job_stats WHERE job_name = ?
+        ''', (job_name,))
+        row = c.fetchone()
+        if not row:
+            return _summarize_stats(0, 0, 0, 0, 0)
+        stats = _summarize_stats(*tuple(row)[:5])
+        stats.update(_sketch_quantiles(WindowedSketch.from_json(row['duration_sketch'], SKETCH_WINDOW)))
+        return stats
+
+    # Fetch last N builds
+    c.execute('''
+        SELECT build_number, result, total_duration FROM builds
+        WHERE job_name = ?
+        ORDER BY build_number DESC
+        LIMIT ?
+    ''', (job_name, limit))
+    window = [tuple(row) for row in c.fetchall()]
+    return _summarize_stats(*_window_counters(window))
+
+@cached_by_job(_read_cache, _cache_namespace)
 def get_stage_history(job_name, limit=10):
     """
     Fetches stage-level data for the last N builds to calculate baselines.
     Returns: Dict organized by build_number -> list of stages
     """
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    
+    c = get_connection().cursor()
+
     # 1. Get recent build IDs
     c.execute('''
-        SELECT id, build_number FROM builds 
-        WHERE job_name = ? 
-        ORDER BY build_number DESC 
+        SELECT id, build_number FROM builds
+        WHERE job_name = ?
+        ORDER BY build_number DESC
         LIMIT ?
     ''', (job_name, limit))
     builds = c.fetchall()
-    
+
     if not builds:
-        conn.close()
         return {}
-        
+
     build_ids = [b['id'] for b in builds]
     placeholders = ','.join('?' for _ in build_ids)
-    
+
     # 2. Get stages for these builds
     query = f'''
-        SELECT build_id, name as stage_name, duration as duration_seconds 
-        FROM stages 
+        SELECT build_id, name as stage_name, duration as duration_seconds
+        FROM stages
         WHERE build_id IN ({placeholders})
     '''
     c.execute(query, build_ids)
     stage_rows = c.fetchall()
-    conn.close()
-    
+
     # 3. Organize by build_number (via map)
     id_to_number = {b['id']: b['build_number'] for b in builds}
     history = {}
-    
+
     for row in stage_rows:
         b_num = id_to_number.get(row['build_id'])
         if b_num not in history:
@@ -208,5 +960,247 @@ def get_stage_history(job_name, limit=10):
             'name': row['stage_name'],
             'duration': row['duration_seconds']
         })
-        
+
     return history
+
+@cached_by_job(_read_cache, _cache_namespace)
+def get_stage_duration_samples(job_name, limit=200):
+    """
+    Stage durations of the job's last `limit` successful builds, one dict per build, newest first
+    (input for simulator.PipelineSimulator).
+    Returns: [{stage_name: duration_seconds}]
+    """
+    c = get_connection().cursor()
+    c.execute('''
+        SELECT b.build_number, s.name, s.duration
+        FROM (SELECT id, build_number FROM builds
+              WHERE job_name = ? AND result = 'SUCCESS'
+              ORDER BY build_number DESC LIMIT ?) b
+        JOIN stages s ON s.build_id = b.id
+        ORDER BY b.build_number DESC, s.id
+    ''', (job_name, limit))
+    samples = {}
+    for build_number, name, duration in c.fetchall():
+        samples.setdefault(build_number, {})[name] = duration
+    return list(samples.values())
+
+def get_stage_log_scans(job_name, build_number):
+    """
+    Stage log findings stored for one build, for stages whose own log was scanned.
+    Returns: {stage_name: {'signature', 'issues': [{'type', 'cause', 'suggestion', 'confidence'}]}}
+    """
+    c = get_connection().cursor()
+    c.execute('''
+        SELECT s.name, s.log_signature FROM stages s JOIN builds b ON b.id = s.build_id
+        WHERE b.job_name=? AND b.build_number=? AND s.log_signature IS NOT NULL
+    ''', (job_name, build_number))
+    scans = {name: {'signature': signature, 'issues': []} for name, signature in c.fetchall()}
+    if scans:
+        c.execute('''
+            SELECT i.stage_name, i.issue_type, i.root_cause, i.suggestion
+            FROM stage_issues i JOIN builds b ON b.id = i.build_id
+            WHERE b.job_name=? AND b.build_number=?
+            ORDER BY i.id
+        ''', (job_name, build_number))
+        for stage_name, issue_type, cause, suggestion in c.fetchall():
+            if stage_name in scans:
+                scans[stage_name]['issues'].append(
+                    {'type': issue_type, 'cause': cause, 'suggestion': suggestion, 'confidence': 1.0})
+    return scans
+
+def save_build_log(job_name, build_number, digest, raw_size, stored_size):
+    """
+    Points a build at an archived log blob.
+    Returns: the digest it pointed at before (None if the build had no archived log)
+    """
+    with transaction() as c:
+        return _upsert_build_log(c, job_name, build_number, digest, raw_size, stored_size)
+
+def _upsert_build_log(c, job_name, build_number, digest, raw_size, stored_size):
+    c.execute('SELECT digest FROM build_logs WHERE job_name=? AND build_number=?', (job_name, build_number))
+    row = c.fetchone()
+    c.execute('''
+        INSERT INTO build_logs (job_name, build_number, digest, raw_size, stored_size)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(job_name, build_number) DO UPDATE SET
+            digest = excluded.digest,
+            raw_size = excluded.raw_size,
+            stored_size = excluded.stored_size,
+            archived_at = CURRENT_TIMESTAMP
+    ''', (job_name, build_number, digest, raw_size, stored_size))
+    return row[0] if row else None
+
+def get_build_log(job_name, build_number):
+    """
+    Returns: {'digest', 'raw_size', 'stored_size', 'archived_at'} or None
+    """
+    c = get_connection().cursor()
+    c.execute('''
+        SELECT digest, raw_size, stored_size, archived_at FROM build_logs
+        WHERE job_name = ? AND build_number = ?
+    ''', (job_name, build_number))
+    row = c.fetchone()
+    return dict(row) if row else None
+
+def is_log_referenced(digest):
+    c = get_connection().cursor()
+    c.execute('SELECT 1 FROM build_logs WHERE digest = ? LIMIT 1', (digest,))
+    return c.fetchone() is not None
+
+def prune_build_logs(keep_builds, max_bytes, job_name=None):
+    """
+    Applies log retention: keeps the newest `keep_builds` archived logs per job (only
+    `job_name`'s when given), then drops the oldest archives until the distinct blobs
+    referenced fit in `max_bytes`.
+    Returns: digests of the dropped rows (their blobs may still be shared by other builds)
+    """
+    with transaction() as c:
+        if job_name is None:
+            c.execute('''
+                SELECT job_name, build_number, digest FROM (
+                    SELECT job_name, build_number, digest,
+                           ROW_NUMBER() OVER (PARTITION BY job_name ORDER BY build_number DESC) AS rank
+                    FROM build_logs
+                ) WHERE rank > ?
+            ''', (keep_builds,))
+        else:
+            c.execute('''
+                SELECT job_name, build_number, digest FROM build_logs WHERE job_name = ?
+                ORDER BY build_number DESC LIMIT -1 OFFSET ?
+            ''', (job_name, keep_builds))
+        dropped = [tuple(row) for row in c.fetchall()]
+
+        # Size accounting is per distinct blob, since deduplicated logs share one
+        refs, sizes = {}, {}
+        c.execute('SELECT digest, COUNT(*), MAX(stored_size) FROM build_logs GROUP BY digest')
+        for digest, count, size in c.fetchall():
+            refs[digest], sizes[digest] = count, size
+        for _, _, digest in dropped:
+            refs[digest] -= 1
+        total = sum(sizes[digest] for digest, count in refs.items() if count)
+
+        if total > max_bytes:
+            dropped_keys = {(job, n) for job, n, _ in dropped}
+            c.execute('SELECT job_name, build_number, digest FROM build_logs ORDER BY archived_at, build_number')
+            for job, n, digest in c.fetchall():
+                if total <= max_bytes:
+                    break
+                if (job, n) in dropped_keys:
+                    continue
+                dropped.append((job, n, digest))
+                refs[digest] -= 1
+                if refs[digest] == 0:
+                    total -= sizes[digest]
+
+        c.executemany('DELETE FROM build_logs WHERE job_name=? AND build_number=?',
+                      [(job, n) for job, n, _ in dropped])
+        return [digest for _, _, digest in dropped]
+
+def get_stale_log_builds(ruleset_version, after_id=0, limit=1000):
+    """
+    Builds with an archived log whose log findings came from another rule set (or none yet),
+    in id order starting after `after_id` (keyset paging).
+    Returns: list of {'id', 'job_name', 'build_number', 'digest'}
+    """
+    c = get_connection().cursor()
+    c.execute('''
+        SELECT b.id, b.job_name, b.build_number, l.digest FROM builds b
+        JOIN build_logs l ON l.job_name = b.job_name AND l.build_number = b.build_number
+        WHERE b.id > ? AND (b.ruleset_version IS NULL OR b.ruleset_version != ?)
+        ORDER BY b.id
+        LIMIT ?
+    ''', (after_id, ruleset_version, limit))
+    return [dict(row) for row in c.fetchall()]
+
+def save_reclassified(results, ruleset_version):
+    """
+    Replaces the log findings and failure fingerprints of many builds and stamps them with
+    `ruleset_version`, in one transaction.
+    `results`: list of (build_id, issues, failures)
+    Returns: number of builds updated (0 on failure)
+    """
+    try:
+        with transaction() as c:
+            c.executemany('DELETE FROM log_analysis WHERE build_id=?', [(r[0],) for r in results])
+            c.executemany('''
+                INSERT INTO log_analysis (build_id, issue_type, root_cause, suggestion)
+                VALUES (?, ?, ?, ?)
+            ''', [(build_id, issue['type'], issue['cause'], issue['suggestion'])
+                  for build_id, issues, _ in results for issue in issues])
+            for build_id, _, failures in results:
+                _replace_failures(c, build_id, failures)
+            c.executemany('UPDATE builds SET ruleset_version=? WHERE id=?',
+                          [(ruleset_version, r[0]) for r in results])
+            return len(results)
+    except Exception as e:
+        logging.error(f"Error saving re-classified builds: {e}")
+        return 0
+
+def get_top_failures(since_days=7, limit=10):
+    """
+    Recurring failures across all jobs, ranked by how many builds hit them in the last
+    `since_days` days (None = all time). One range scan of a covering index.
+    Returns: [{'fingerprint', 'issue_type', 'normalized', 'sample', 'first_seen', 'last_seen',
+               'total_builds', 'builds', 'jobs', 'hits'}]
+    """
+    window, params = '', (limit,)
+    if since_days is not None:
+        window, params = "WHERE seen_at >= datetime('now', ?)", (f'-{int(since_days)} days', limit)
+    c = get_connection().cursor()
+    c.execute(f'''
+        SELECT f.fingerprint, f.issue_type, f.normalized, f.sample, f.first_seen, f.last_seen,
+               f.occurrences AS total_builds, w.builds, w.jobs, w.hits
+        FROM (
+            SELECT fingerprint, COUNT(*) AS builds, COUNT(DISTINCT job_name) AS jobs, SUM(hits) AS hits
+            -- The planner otherwise prefers the primary key for GROUP BY and reads the whole table
+            FROM fingerprint_occurrences INDEXED BY idx_fingerprint_occurrences_seen
+            {window}
+            GROUP BY fingerprint
+        ) w
+        JOIN failure_fingerprints f ON f.fingerprint = w.fingerprint
+        ORDER BY w.builds DESC, f.last_seen DESC
+        LIMIT ?
+    ''', params)
+    return [dict(row) for row in c.fetchall()]
+
+def get_poller_states(controller):
+    """
+    Returns: {job_name: {'last_build', 'etag', 'last_modified', 'interval', 'next_check', 'errors',
+                         'last_error', 'failed_build', 'checked_at'}} for one controller
+    """
+    c = get_connection().cursor()
+    c.execute('''
+        SELECT job_name, last_build, etag, last_modified, interval, next_check, errors, last_error,
+               failed_build, checked_at
+        FROM poller_state WHERE controller = ?
+    ''', (controller,))
+    return {row['job_name']: {k: row[k] for k in row.keys() if k != 'job_name'} for row in c.fetchall()}
+
+def save_poller_state(controller, job_name, state):
+    """
+    Upserts one job's poller state (keys as returned by get_poller_states).
+    Returns: True, or False on failure
+    """
+    try:
+        with transaction() as c:
+            c.execute('''
+                INSERT INTO poller_state (controller, job_name, last_build, etag, last_modified, interval,
+                                          next_check, errors, last_error, failed_build, checked_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(controller, job_name) DO UPDATE SET
+                    last_build = excluded.last_build,
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    interval = excluded.interval,
+                    next_check = excluded.next_check,
+                    errors = excluded.errors,
+                    last_error = excluded.last_error,
+                    failed_build = excluded.failed_build,
+                    checked_at = CURRENT_TIMESTAMP
+            ''', (controller, job_name, state.get('last_build'), state.get('etag'), state.get('last_modified'),
+                  state.get('interval'), state.get('next_check'), state.get('errors', 0), state.get('last_error'),
+                  state.get('failed_build')))
+        return True
+    except Exception as e:
+        logging.error(f"Error saving poller state for {job_name}: {e}")
+        return False
@@ -0,0 +1,75 @@
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from jenkins_fetch import fetch_jenkins_data, list_jobs
+from analyzer import analyze_pipeline_v2
+
+def _summarize(metrics):
+    """
+    Flattens analyzer output into one fleet report row.
+    """
+    regression = metrics.get('regression') or {}
+    return {
+        'job_name': metrics['job_name'],
+        'build_number': metrics['build_number'],
+        'status': metrics['status'],
+        'duration': metrics['total_duration'],
+        'efficiency_score': metrics['efficiency']['total_score'],
+        'is_regression': bool(regression.get('is_regression')),
+        'increase_percent': regression.get('increase_percent', 0),
+        'risk_level': metrics['risk']['risk_level'],
+        'risk_probability': metrics['risk']['probability'],
+        'issues': [i['type'] for i in metrics.get('issues', [])]
+    }
+
+def rank_fleet(rows, top=10):
+    """
+    Builds the triage rankings from summarized rows.
+    """
+    regressed = [r for r in rows if r['increase_percent'] > 0]
+    return {
+        'slowest': sorted(rows, key=lambda r: r['duration'], reverse=True)[:top],
+        'most_regressed': sorted(regressed, key=lambda r: r['increase_percent'], reverse=True)[:top],
+        'riskiest': sorted(rows, key=lambda r: (-r['risk_probability'], r['efficiency_score']))[:top]
+    }
+
+def scan_fleet(client, job_names=None, max_workers=8, top=10):
+    """
+    Fetches and analyzes every job on the controller (or `job_names`) with bounded concurrency.
+    Network fetches run on the pool; analysis and DB writes stay on the calling thread.
+    Per-host request rate is governed by the client's rate limiter.
+    Returns: report dict with rankings, errors and timing
+    """
+    started = time.perf_counter()
+    if job_names is None:
+        job_names = list_jobs(client)
+    logging.info(f"Fleet scan: {len(job_names)} jobs, {max_workers} workers")
+
+    rows, errors = [], []
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fleet') as pool:
+        futures = {
+            pool.submit(fetch_jenkins_data, client.base_url, name, None, None,
+                        stream_console=True, client=client): name
+            for name in job_names
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            data, error_msg = future.result()
+            if error_msg or not data:
+                errors.append({'job_name': name, 'error': error_msg or "No data returned"})
+                continue
+            metrics = analyze_pipeline_v2(data)
+            if metrics is None:
+                errors.append({'job_name': name, 'error': "Analysis failed"})
+                continue
+            rows.append(_summarize(metrics))
+
+    report = rank_fleet(rows, top)
+    report.update({
+        'jobs_total': len(job_names),
+        'jobs_analyzed': len(rows),
+        'errors': errors,
+        'elapsed_seconds': round(time.perf_counter() - started, 2),
+        'requests': client.stats()
+    })
+    return report
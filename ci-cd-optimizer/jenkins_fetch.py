@@ -2,10 +2,327 @@ import requests
 import json
 import logging
 import os
+import re
+import html
+import time
+import hashlib
+import threading
+from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from log_parser import LogIntelligenceEngine
+from timeline import wall_clock_seconds
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Console logs are read in fixed-size chunks when streaming, so memory does not grow with log size
+CONSOLE_CHUNK_SIZE = 64 * 1024
+
+# tree= projections: only the fields the parsers below actually read.
+# (wfapi/describe has no tree support; it is already a compact document.)
+JOB_INFO_TREE = "lastBuild[number]"
+BUILD_TREE = "number,result,duration,timestamp"
+
+# Build statuses of a build that has not finished (WFAPI), and the prefix of the error returned
+# when a build has neither WFAPI nor standard API data (deleted by log rotation, never existed)
+RUNNING_STATUSES = ('IN_PROGRESS', 'PAUSED_PENDING_INPUT', 'QUEUED')
+BUILD_DATA_ERROR = "Failed to fetch build data (API & WFAPI both failed)"
+
+# wfapi/log returns console text as HTML (console notes, timestamps, hyperlinks)
+_MARKUP = re.compile(r'<[^>]+>')
+
+class RateLimiter:
+    """
+    Spaces calls at least 1/rate seconds apart, shared across threads.
+    """
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class JenkinsClient:
+    """
+    Reusable HTTP client for one Jenkins controller.
+    Holds a pooled keep-alive requests.Session (auth set once, gzip negotiated), retries
+    429/502/503 with exponential backoff, and keeps per-request latency, transfer and
+    JSON parse counters.
+    `rate_limit` (requests/second) caps the load this process puts on the controller.
+    """
+    RETRY_STATUSES = (429, 502, 503)
+
+    def __init__(self, jenkins_url, username=None, api_token=None, pool_size=10,
+                 retries=3, backoff_factor=0.5, timeout=10, session=None, rate_limit=None):
+        self.base_url = jenkins_url if jenkins_url.endswith('/') else jenkins_url + '/'
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter(rate_limit) if rate_limit else None
+        self.session = session or requests.Session()
+        if session is None:
+            retry = Retry(
+                total=retries,
+                backoff_factor=backoff_factor,
+                status_forcelist=self.RETRY_STATUSES,
+                allowed_methods=frozenset(['GET', 'HEAD']),
+                respect_retry_after_header=True,
+                raise_on_status=False # Hand the last response back so callers keep their status checks
+            )
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+            self.session.mount('http://', adapter)
+            self.session.mount('https://', adapter)
+        if username and api_token:
+            self.session.auth = (username, api_token)
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def url(self, path):
+        return self.base_url + path.lstrip('/')
+
+    def get(self, path, label=None, **kwargs):
+        """
+        GET relative to the controller URL. `label` groups the latency counters
+        (defaults to the path).
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+        start = time.perf_counter()
+        try:
+            resp = self.session.get(self.url(path), **kwargs)
+        except requests.exceptions.RequestException:
+            self._record(label or path, time.perf_counter() - start, error=True)
+            raise
+        self._record(label or path, time.perf_counter() - start, error=resp.status_code >= 400)
+        if not kwargs.get('stream'):
+            self.record_transfer(label or path, _wire_size(resp))
+        return resp
+
+    def json(self, resp, label):
+        """
+        resp.json(), with the parse time added to the label's counters.
+        """
+        start = time.perf_counter()
+        data = resp.json()
+        with self._lock:
+            self._entry(label)['parse_ms'] += (time.perf_counter() - start) * 1000.0
+        return data
+
+    def record_transfer(self, label, num_bytes):
+        """
+        Adds body bytes to a label; streamed responses report theirs once consumed.
+        """
+        with self._lock:
+            self._entry(label)['bytes'] += num_bytes
+
+    def _entry(self, label):
+        return self._stats.setdefault(label, {'count': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                                              'bytes': 0, 'parse_ms': 0.0})
+
+    def _record(self, label, elapsed, error=False):
+        elapsed_ms = elapsed * 1000.0
+        with self._lock:
+            entry = self._entry(label)
+            entry['count'] += 1
+            entry['total_ms'] += elapsed_ms
+            entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+            if error:
+                entry['errors'] += 1
+
+    def stats(self):
+        """
+        Returns: {label: {'count', 'errors', 'total_ms', 'max_ms', 'avg_ms', 'bytes', 'parse_ms'}}
+        """
+        with self._lock:
+            return {
+                label: dict(entry, avg_ms=round(entry['total_ms'] / max(1, entry['count']), 2))
+                for label, entry in self._stats.items()
+            }
+
+def _wire_size(resp):
+    """
+    Bytes received for a fully read response: compressed size off the socket when
+    urllib3 can tell us, otherwise the body length.
+    """
+    try:
+        size = resp.raw.tell()
+    except Exception:
+        size = 0
+    return size or len(resp.content or b'')
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(jenkins_url, username=None, api_token=None, **kwargs):
+    """
+    Returns the shared JenkinsClient for this controller and credentials, so
+    connections are reused across Flask requests and bulk fetchers.
+    """
+    key = (jenkins_url.rstrip('/'), username, api_token)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            kwargs.setdefault('pool_size', int(os.environ.get('JENKINS_POOL_SIZE', 10)))
+            if os.environ.get('JENKINS_RATE_LIMIT'):
+                kwargs.setdefault('rate_limit', float(os.environ['JENKINS_RATE_LIMIT']))
+            client = JenkinsClient(jenkins_url, username, api_token, **kwargs)
+            _clients[key] = client
+        return client
+
+def fetch_options_from_env():
+    """
+    fetch_jenkins_data keyword arguments shared by the dashboard, the webhook batcher and the
+    poller, from JENKINS_STREAM_CONSOLE, JENKINS_ARCHIVE_LOGS and JENKINS_STAGE_LOGS (all default true).
+    Returns: {'stream_console', 'log_store', 'stage_logs'}
+    """
+    from log_store import get_log_store # Deferred: the log store pulls in the database
+    enabled = lambda name: os.environ.get(name, 'true').lower() == 'true'
+    return {
+        'stream_console': enabled('JENKINS_STREAM_CONSOLE'),
+        'log_store': get_log_store() if enabled('JENKINS_ARCHIVE_LOGS') else None,
+        'stage_logs': enabled('JENKINS_STAGE_LOGS')
+    }
+
+def job_path(job_name):
+    """
+    URL path for a job, including jobs nested in folders ("team/app" -> "job/team/job/app").
+    """
+    return "job/" + "/job/".join(part for part in job_name.split('/') if part)
+
+def _jobs_tree(depth):
+    """
+    tree= projection listing jobs `depth` folder levels deep.
+    """
+    tree = "name,url"
+    for _ in range(depth - 1):
+        tree = f"name,url,jobs[{tree}]"
+    return f"jobs[{tree}]"
+
+def list_jobs(client, folder=None, depth=3):
+    """
+    Lists every buildable job on the controller, descending into folders.
+    One tree= request covers `depth` levels; deeper folders are queried recursively.
+    Returns: list of full job names ("folder/sub/job")
+    """
+    prefix = f"{job_path(folder)}/" if folder else ""
+    resp = client.get(f"{prefix}api/json", label='list_jobs', params={'tree': _jobs_tree(depth)})
+    resp.raise_for_status()
+
+    names = []
+    def walk(entries, parent, level):
+        for entry in entries:
+            full_name = f"{parent}/{entry['name']}" if parent else entry['name']
+            if 'jobs' in entry:
+                walk(entry['jobs'], full_name, level + 1)
+            elif level == depth and any(kind in entry.get('_class', '') for kind in ('Folder', 'MultiBranch')):
+                names.extend(list_jobs(client, full_name, depth)) # Projection ran out, go deeper
+            else:
+                names.append(full_name)
+    walk(client.json(resp, 'list_jobs').get('jobs', []), folder, 1)
+    return names
+
+def _stream_console(client, console_path, scanner, cancel=None, archive=None):
+    """
+    Streams consoleText chunk by chunk into a LogStreamScanner without holding the log in memory.
+    Stops downloading once every pattern category has matched, or when `cancel` is set;
+    with an `archive` LogWriter the whole log is downloaded and copied into it.
+    Returns: number of bytes read (0 if the console was unavailable)
+    """
+    with client.get(console_path, label='console', stream=True) as resp:
+        if resp.status_code != 200:
+            return 0
+        for chunk in resp.iter_content(chunk_size=CONSOLE_CHUNK_SIZE):
+            scanner.feed(chunk)
+            if archive is not None:
+                archive.write(chunk)
+            elif scanner.complete:
+                break
+            if cancel and cancel.is_set():
+                break
+    client.record_transfer('console', scanner.bytes_seen)
+    return scanner.bytes_seen
+
+def _download_console(client, console_path, cancel=None, archive=None):
+    """
+    Downloads the whole consoleText for buffered analysis. It is still read chunk by chunk,
+    so setting `cancel` stops the transfer instead of waiting for the rest of the log.
+    Returns: console text, or None if the console was unavailable or the download was cancelled
+    """
+    chunks, size = [], 0
+    with client.get(console_path, label='console', stream=True) as resp:
+        if resp.status_code != 200:
+            return None
+        encoding = resp.encoding or 'utf-8'
+        for chunk in resp.iter_content(chunk_size=CONSOLE_CHUNK_SIZE):
+            if cancel and cancel.is_set():
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+            if archive is not None:
+                archive.write(chunk)
+    client.record_transfer('console', size)
+    if cancel and cancel.is_set():
+        return None
+    return b"".join(chunks).decode(encoding, errors='replace')
+
+def _fetch_console(client, console_path, stream_console, cancel=None, log_store=None, build=None,
+                   defer_archive=False):
+    """
+    Console half of fetch_jenkins_data, run concurrently with the build-structure calls.
+    With a `log_store`, the log is also archived under `build` = (job_name, build_number)
+    (only placed in the store with defer_archive, see LogStore.place).
+    Returns: (console_text, scanner, log) - text is empty and scanner set when streaming;
+             log is the archive's {'digest', ...} entry, None unless the log was archived
+    """
+    if stream_console:
+        scanner = LogIntelligenceEngine().stream()
+        archive = log_store.writer() if log_store is not None else None
+        try:
+            size = _stream_console(client, console_path, scanner, cancel, archive)
+        except BaseException:
+            if archive is not None:
+                archive.abort()
+            raise
+        return "", scanner, _commit_archive(log_store, archive, build, size and not (cancel and cancel.is_set()),
+                                           defer_archive)
+    archive = log_store.writer() if log_store is not None else None
+    try:
+        console_text = _download_console(client, console_path, cancel, archive)
+    except BaseException:
+        if archive is not None:
+            archive.abort()
+        raise
+    return console_text or "", None, _commit_archive(log_store, archive, build, bool(console_text), defer_archive)
+
+def _commit_archive(log_store, archive, build, complete, defer=False):
+    """
+    Publishes (or with `defer` only places) a fully downloaded log; archiving problems never
+    fail the fetch itself.
+    Returns: the archive's {'digest', ...} entry, or None
+    """
+    if archive is None:
+        return None
+    if not complete:
+        archive.abort()
+        return None
+    try:
+        if defer:
+            return log_store.place(archive)
+        return {'digest': log_store.commit(archive, *build)}
+    except Exception as e:
+        archive.abort()
+        logging.error(f"Failed to archive console log of {build[0]} #{build[1]}: {e}")
+        return None
+
 def _parse_wfapi_data(wfapi_json, job_name, build_number, console_text=""):
     """
     Parses Jenkins WFAPI JSON into our optimized format.
@@ -14,6 +331,7 @@ def _parse_wfapi_data(wfapi_json, job_name, build_number, console_text=""):
         stages = []
         for stage in wfapi_json.get('stages', []):
             stages.append({
+                'id': stage.get('id'), # Flow node id, for per-stage log fetches
                 'name': stage['name'],
                 'status': stage['status'],
                 'durationMillis': stage['durationMillis'],
@@ -22,8 +340,8 @@ def _parse_wfapi_data(wfapi_json, job_name, build_number, console_text=""):
                 'pauseDurationMillis': stage.get('pauseDurationMillis', 0)
             })
 
-        # Calculate total duration from stages or use top-level
-        total_duration = sum(s['durationMillis'] for s in stages) / 1000.0
+        # Wall-clock duration from the stage intervals (parallel branches overlap, so no plain sum)
+        total_duration = wall_clock_seconds(stages)
 
         return {
             "job_name": job_name,
@@ -37,6 +355,79 @@ def _parse_wfapi_data(wfapi_json, job_name, build_number, console_text=""):
         logging.error(f"Error parsing WFAPI data: {e}")
         return None
 
+def _href_path(client, href):
+    """
+    Controller-relative path for a wfapi `_links` href (which includes any Jenkins context path).
+    """
+    url = urljoin(client.base_url, href)
+    return url[len(client.base_url):] if url.startswith(client.base_url) else href
+
+def stage_log_signature(stage):
+    """
+    Identity of a stage's log under the current rule set. A finished stage keeps its flow node,
+    status and duration, so an equal signature means a rescan would find the same issues.
+    """
+    key = f"{LogIntelligenceEngine.RULESET_VERSION}:{stage.get('id')}:{stage['status']}:{stage['durationMillis']}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+def _scan_stage_log(client, job_name, build_number, stage):
+    """
+    Runs the log engine over one stage's step logs (wfapi `_links` -> execution/node/<id>/wfapi/log).
+    Stage logs are extra detail: any failure only drops this stage's findings (and leaves it
+    unsigned, so the next fetch retries it), never the build fetch.
+    Returns: {'log_issues', 'log_bytes', 'log_truncated'}, or None if the stage could not be scanned
+    """
+    try:
+        resp = client.get(f"{job_path(job_name)}/{build_number}/execution/node/{stage['id']}/wfapi/describe",
+                          label='stage_describe')
+        if resp.status_code != 200:
+            return None
+        scanner = LogIntelligenceEngine().stream()
+        truncated = False
+        for node in client.json(resp, 'stage_describe').get('stageFlowNodes', []):
+            href = node.get('_links', {}).get('log', {}).get('href')
+            if not href:
+                continue # Steps without output have no log link
+            log_resp = client.get(_href_path(client, href), label='node_log')
+            if log_resp.status_code != 200:
+                continue
+            log = client.json(log_resp, 'node_log')
+            scanner.feed(html.unescape(_MARKUP.sub('', log.get('text') or '')) + "\n")
+            truncated = truncated or bool(log.get('hasMore')) # wfapi/log serves a bounded slice of long logs
+        return {'log_issues': scanner.finish(), 'log_bytes': scanner.bytes_seen, 'log_truncated': truncated}
+    except Exception as e:
+        logging.error(f"Failed to scan stage log of {job_name} #{build_number} '{stage['name']}': {e}")
+        return None
+
+def fetch_stage_logs(client, job_name, build_number, stages, previous=None, max_workers=8):
+    """
+    Adds stage-scoped log findings to parsed WFAPI stages ('log_issues', 'log_signature'), fetching
+    the stages' node logs concurrently. Healthy stages whose signature matches `previous`
+    ({stage_name: {'signature', 'issues'}}, see database.get_stage_log_scans) reuse the stored
+    findings without any request. Stages whose scan failed get neither key.
+    Returns: {'scanned', 'reused'}
+    """
+    previous = previous or {}
+    todo, reused = [], 0
+    for stage in stages:
+        if not stage.get('id'):
+            continue
+        signature = stage_log_signature(stage)
+        known = previous.get(stage['name'])
+        if stage['status'] == 'SUCCESS' and known and known['signature'] == signature:
+            stage.update(log_issues=known['issues'], log_signature=signature)
+            reused += 1
+        else:
+            todo.append((stage, signature))
+
+    if todo:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='jenkins-stage-logs') as pool:
+            results = list(pool.map(lambda item: _scan_stage_log(client, job_name, build_number, item[0]), todo))
+        for (stage, signature), result in zip(todo, results):
+            if result is not None:
+                stage.update(result, log_signature=signature)
+    return {'scanned': len(todo), 'reused': reused}
+
 def _parse_standard_data(build_data, job_name, console_text=""):
     """
     Fallback parser for standard API response.
@@ -63,57 +454,121 @@ def _parse_standard_data(build_data, job_name, console_text=""):
         "console_log": console_text
     }
 
-def fetch_jenkins_data(jenkins_url, job_name, username, api_token):
+def is_build_finished(status):
     """
-    Fetches rich build data using WFAPI and Console Text.
-    Falls back to standard API if WFAPI is not available.
-    Returns: (data_dict, error_message)
+    False for the status of a build Jenkins is still running (its result would change after analysis).
+    The standard API reports a running build with result null.
+    """
+    return status is not None and status not in RUNNING_STATUSES
+
+def _attach_log_issues(data, scanner):
+    """
+    Adds streamed log findings to parsed build data so the analyzer does not rescan.
+    """
+    if data is not None and scanner is not None:
+        data['log_issues'] = scanner.finish()
+        data['log_failures'] = scanner.failures
+        data['console_bytes'] = scanner.bytes_seen
+    return data
+
+def get_last_build_number(client, job_name):
+    """
+    One tree=lastBuild[number] request: the number the "last build" of a job resolves to right now.
+    Returns: (build_number, error_message)
     """
     try:
-        if not jenkins_url.endswith('/'):
-            jenkins_url += '/'
-        
-        auth = (username, api_token) if username and api_token else None
-        
-        # 1. Get Job Info to find last build number
-        job_url = f"{jenkins_url}job/{job_name}/api/json"
-        resp = requests.get(job_url, auth=auth, timeout=10)
+        resp = client.get(f"{job_path(job_name)}/api/json", label='job_info', params={'tree': JOB_INFO_TREE})
         if resp.status_code != 200:
-             return None, f"Failed to get job info: {resp.status_code}"
-             
-        last_build = resp.json().get('lastBuild')
+            return None, f"Failed to get job info: {resp.status_code}"
+        last_build = client.json(resp, 'job_info').get('lastBuild')
         if not last_build:
             return None, "No builds found for this job."
-            
-        build_number = last_build['number']
-        
-        # 2. Fetch Console Log (Common for both methods)
-        console_url = f"{jenkins_url}job/{job_name}/{build_number}/consoleText"
-        logging.info(f"Fetching Console: {console_url}")
-        console_resp = requests.get(console_url, auth=auth, timeout=10)
-        console_text = console_resp.text if console_resp.status_code == 200 else ""
-
-        # 3. Try Fetching WFAPI (Pipeline Structure)
-        wfapi_url = f"{jenkins_url}job/{job_name}/{build_number}/wfapi/describe"
-        logging.info(f"Fetching WFAPI: {wfapi_url}")
+        return last_build['number'], None
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Connection Error: {e}")
+        return None, f"Jenkins Connection Failed: {e}"
+
+def fetch_jenkins_data(jenkins_url, job_name, username, api_token, stream_console=False, client=None,
+                       log_store=None, stage_logs=False, build_number=None, previous_stage_logs=None,
+                       defer_archive=False):
+    """
+    Fetches rich build data using WFAPI and Console Text, for `build_number` or the last build.
+    Falls back to standard API if WFAPI is not available.
+    With stream_console=True the console is analyzed chunk by chunk while downloading:
+    'console_log' is left empty and the findings are returned under 'log_issues' and 'log_failures'.
+    With a `log_store` (see log_store.LogStore) the console is also archived compressed,
+    and its content digest is returned under 'log_digest'. With defer_archive=True the blob is only
+    placed: its LogStore.place() entry comes back under 'log_archive' for the caller to save
+    (save_analyses_bulk's `log` field) and then hand to log_store.settle().
+    With stage_logs=True each WFAPI stage also gets its own log findings (see fetch_stage_logs),
+    fetched while the console download is still running; `previous_stage_logs` are the findings
+    already stored for this build, reused for unchanged healthy stages.
+    All calls go through the pooled JenkinsClient (the shared one for this controller by default).
+    Returns: (data_dict, error_message)
+    """
+    try:
+        client = client or get_client(jenkins_url, username, api_token)
         
-        wfapi_resp = requests.get(wfapi_url, auth=auth, timeout=10)
+        # 1. Get Job Info to find last build number
+        if build_number is None:
+            build_number, error_msg = get_last_build_number(client, job_name)
+            if error_msg:
+                return None, error_msg
         
-        if wfapi_resp.status_code == 200:
+        # 2. Fetch Console Log (Common for both methods) on a worker thread,
+        #    overlapping the slow download with the WFAPI/standard API calls below
+        console_path = f"{job_path(job_name)}/{build_number}/consoleText"
+        logging.info(f"Fetching Console: {client.url(console_path)}")
+        cancel = threading.Event()
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='jenkins-console') as pool:
+            console_future = pool.submit(_fetch_console, client, console_path, stream_console, cancel,
+                                         log_store, (job_name, build_number), defer_archive)
+            try:
+                # 3. Try Fetching WFAPI (Pipeline Structure)
+                wfapi_path = f"{job_path(job_name)}/{build_number}/wfapi/describe"
+                logging.info(f"Fetching WFAPI: {client.url(wfapi_path)}")
+
+                wfapi_resp = client.get(wfapi_path, label='wfapi')
+                wfapi_json = build_json = staged = None
+
+                if wfapi_resp.status_code == 200:
+                    wfapi_json = client.json(wfapi_resp, 'wfapi')
+                else:
+                    # Fallback to Standard API
+                    logging.info(f"WFAPI failed ({wfapi_resp.status_code}), falling back to Standard API.")
+                    build_resp = client.get(f"{job_path(job_name)}/{build_number}/api/json", label='build_api',
+                                            params={'tree': BUILD_TREE})
+
+                    if build_resp.status_code != 200:
+                        cancel.set() # No build data, so stop paying for the console
+                        return None, f"{BUILD_DATA_ERROR}: {build_resp.status_code}"
+                    build_json = client.json(build_resp, 'build_api')
+
+                if stage_logs and wfapi_json is not None:
+                    # Per-stage logs overlap with the console download still running on the worker
+                    staged = _parse_wfapi_data(wfapi_json, job_name, build_number)
+                    if staged is not None:
+                        fetch_stage_logs(client, job_name, build_number, staged['stages'], previous_stage_logs)
+            except BaseException:
+                cancel.set()
+                raise
+
+            console_text, scanner, log = console_future.result()
+
+        if staged is not None:
+            data = dict(staged, console_log=console_text)
+        elif wfapi_json is not None:
             # Success - Parse WFAPI
-            data = _parse_wfapi_data(wfapi_resp.json(), job_name, build_number, console_text)
-            return data, None
+            data = _parse_wfapi_data(wfapi_json, job_name, build_number, console_text)
         else:
-            # Fallback to Standard API
-            logging.info(f"WFAPI failed ({wfapi_resp.status_code}), falling back to Standard API.")
-            build_url = f"{jenkins_url}job/{job_name}/{build_number}/api/json"
-            build_resp = requests.get(build_url, auth=auth, timeout=10)
-            
-            if build_resp.status_code == 200:
-                data = _parse_standard_data(build_resp.json(), job_name, console_text)
-                return data, None
-            else:
-                 return None, f"Failed to fetch build data (API & WFAPI both failed): {build_resp.status_code}"
+            data = _parse_standard_data(build_json, job_name, console_text)
+        if log and data is not None:
+            data['log_digest'] = log['digest']
+            if defer_archive:
+                data['log_archive'] = log
+        elif log and defer_archive:
+            log_store.settle([(job_name, log)]) # No build data to save it with
+        return _attach_log_issues(data, scanner), None
 
     except requests.exceptions.RequestException as e:
         logging.error(f"Connection Error: {e}")
@@ -122,5 +577,117 @@ def fetch_jenkins_data(jenkins_url, job_name, username, api_token):
         logging.error(f"Unexpected Error: {e}")
         return None, f"Unexpected Error: {e}"
 
+def _fetch_history_build(client, job_name, build):
+    """
+    Structure for one historical build: WFAPI stages if available, else the list entry itself.
+    """
+    resp = client.get(f"{job_path(job_name)}/{build['number']}/wfapi/describe", label='wfapi')
+    if resp.status_code == 200:
+        data = _parse_wfapi_data(client.json(resp, 'wfapi'), job_name, build['number'])
+    else:
+        data = _parse_standard_data(build, job_name)
+    if data is not None:
+        # Keep Jenkins' own result/timestamp so history matches what the controller reports
+        data['status'] = build.get('result') or data['status']
+        data['timestamp'] = build.get('timestamp')
+    return data
+
+def fetch_build_history(client, job_name, count=100, max_workers=8):
+    """
+    Bulk history for backfilling: one api/json?tree=builds[...]{0,N} call for the build list,
+    then wfapi/describe for each completed build concurrently.
+    Returns: (list_of_data_dicts, error_message)
+    """
+    try:
+        tree = f"builds[{BUILD_TREE}]{{0,{count}}}"
+        resp = client.get(f"{job_path(job_name)}/api/json", label='build_list', params={'tree': tree})
+        if resp.status_code != 200:
+            return None, f"Failed to get build list: {resp.status_code}"
+
+        # Running builds have no result yet; they'll be picked up once finished
+        builds = [b for b in client.json(resp, 'build_list').get('builds', []) if b.get('result')]
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='jenkins-history') as pool:
+            results = list(pool.map(lambda b: _fetch_history_build(client, job_name, b), builds))
+        return [data for data in results if data], None
+
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Connection Error: {e}")
+        return None, f"Jenkins Connection Failed: {e}"
+
+class ProgressiveLogTailer:
+    """
+    Follows a (possibly still running) build's console through logText/progressiveText.
+    Each poll asks only for bytes after the last X-Text-Size offset, so total transfer is
+    O(log size) however often we poll, and new chunks go straight into a LogStreamScanner.
+    """
+    def __init__(self, client, job_name, build_number, scanner=None):
+        self.client = client
+        self.path = f"{job_path(job_name)}/{build_number}/logText/progressiveText"
+        self.scanner = scanner or LogIntelligenceEngine().stream()
+        self.offset = 0
+        self.more_data = True
+        self.bytes_transferred = 0
+
+    def poll(self):
+        """
+        Fetches the console from the current offset.
+        Returns the issues first seen in this batch (empty list if none).
+        """
+        seen_before = set(self.scanner.seen)
+        with self.client.get(self.path, label='progressive', params={'start': self.offset}, stream=True) as resp:
+            if resp.status_code != 200:
+                raise requests.exceptions.HTTPError(f"progressiveText returned {resp.status_code}")
+            received = 0
+            for chunk in resp.iter_content(chunk_size=CONSOLE_CHUNK_SIZE):
+                received += len(chunk)
+                self.scanner.feed(chunk)
+            self.bytes_transferred += received
+            self.client.record_transfer('progressive', received)
+            # X-Text-Size is the offset to resume from; X-More-Data is absent once the build is done
+            self.offset = int(resp.headers.get('X-Text-Size', self.offset + received))
+            self.more_data = resp.headers.get('X-More-Data', '').lower() == 'true'
+
+        if not self.more_data:
+            self.scanner.finish()
+        return self.scanner.engine.build_issues(self.scanner.seen - seen_before)
+
+    def follow(self, interval=5, on_issue=None, max_polls=None):
+        """
+        Polls until Jenkins reports no more data, calling on_issue(issue) as soon as a
+        pattern shows up. Returns the full issue list.
+        """
+        polls = 0
+        while True:
+            for issue in self.poll():
+                if on_issue:
+                    on_issue(issue)
+                else:
+                    logging.warning(f"Early warning from {self.client.url(self.path)}: {issue['cause']}")
+            polls += 1
+            if not self.more_data or (max_polls and polls >= max_polls):
+                break
+            time.sleep(interval)
+        return self.scanner.issues
+
+def tail_build(jenkins_url, job_name, username, api_token, build_number=None, interval=5, on_issue=None,
+               client=None):
+    """
+    Live-tails a build (lastBuild by default) and reports log issues while it runs.
+    Returns: (issues, error_message)
+    """
+    try:
+        client = client or get_client(jenkins_url, username, api_token)
+        if build_number is None:
+            build_number, error_msg = get_last_build_number(client, job_name)
+            if error_msg:
+                return None, error_msg
+
+        logging.info(f"Tailing {job_name} #{build_number}")
+        tailer = ProgressiveLogTailer(client, job_name, build_number)
+        return tailer.follow(interval=interval, on_issue=on_issue), None
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Connection Error: {e}")
+        return None, f"Jenkins Connection Failed: {e}"
+
 # Backwards compatibility alias if needed, or we update app.py
 fetch_last_build = fetch_jenkins_data
@@ -0,0 +1,115 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Background analysis: worker threads, backlog cap, and how long finished results stay pollable
+ANALYSIS_WORKERS = int(os.environ.get('ANALYSIS_WORKERS', 4))
+ANALYSIS_QUEUE_MAX = int(os.environ.get('ANALYSIS_QUEUE_MAX', 100))
+ANALYSIS_RESULT_TTL = int(os.environ.get('ANALYSIS_RESULT_TTL', 600))
+
+class QueueFull(Exception):
+    """
+    Raised by AnalysisQueue.submit when the backlog is at its cap.
+    """
+
+class AnalysisQueue:
+    """
+    Runs analyses on a background thread pool so web workers only enqueue and poll.
+    Tasks carry a coalescing key (e.g. job + build): submitting a key that is already
+    queued or running returns the existing task instead of starting a second one.
+    Finished tasks keep their result for `result_ttl` seconds, then are forgotten.
+    """
+    def __init__(self, workers=None, max_pending=None, result_ttl=None):
+        self.workers = workers or ANALYSIS_WORKERS
+        self.max_pending = ANALYSIS_QUEUE_MAX if max_pending is None else max_pending
+        self.result_ttl = ANALYSIS_RESULT_TTL if result_ttl is None else result_ttl
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='analysis')
+        self._lock = threading.Lock()
+        self._tasks = {} # task id -> task
+        self._active = {} # coalescing key -> id of its queued/running task
+
+    def submit(self, key, func, *args, **kwargs):
+        """
+        Queues func(*args, **kwargs) unless a task with the same key is still pending.
+        Returns: (task_id, coalesced)
+        Raises: QueueFull when max_pending tasks are already waiting or running
+        """
+        with self._lock:
+            self._expire()
+            task_id = self._active.get(key)
+            if task_id is not None:
+                self._tasks[task_id]['coalesced'] += 1
+                return task_id, True
+            if len(self._active) >= self.max_pending:
+                raise QueueFull(f"{len(self._active)} analyses already pending")
+            task_id = uuid.uuid4().hex
+            task = {
+                'id': task_id, 'key': key, 'state': 'queued', 'coalesced': 0,
+                'submitted_at': time.time(), 'started_at': None, 'finished_at': None,
+                'result': None, 'error': None
+            }
+            self._tasks[task_id] = task
+            self._active[key] = task_id
+        self._pool.submit(self._run, task, func, args, kwargs)
+        return task_id, False
+
+    def _run(self, task, func, args, kwargs):
+        with self._lock:
+            task['state'], task['started_at'] = 'running', time.time()
+        try:
+            result, state, error = func(*args, **kwargs), 'done', None
+        except Exception as e:
+            logging.exception(f"Analysis task {task['id']} ({task['key']}) failed: {e}")
+            result, state, error = None, 'failed', str(e)
+        with self._lock:
+            task.update(result=result, state=state, error=error, finished_at=time.time())
+            if self._active.get(task['key']) == task['id']:
+                del self._active[task['key']]
+
+    def _expire(self):
+        cutoff = time.time() - self.result_ttl
+        for task_id in [t['id'] for t in self._tasks.values() if t['finished_at'] and t['finished_at'] < cutoff]:
+            del self._tasks[task_id]
+
+    def status(self, task_id):
+        """
+        Returns: copy of the task ({'id', 'state', 'coalesced', 'submitted_at', 'started_at',
+                 'finished_at', 'result', 'error'}), or None if unknown or expired
+        """
+        with self._lock:
+            self._expire()
+            task = self._tasks.get(task_id)
+            if task is None:
+                return None
+            return {k: v for k, v in task.items() if k != 'key'}
+
+    def stats(self):
+        with self._lock:
+            states = [t['state'] for t in self._tasks.values()]
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'queued': states.count('queued'),
+                'running': states.count('running'),
+                'done': states.count('done'),
+                'failed': states.count('failed')
+            }
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_analysis_queue():
+    """
+    Returns the process-wide AnalysisQueue, started on first use.
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = AnalysisQueue()
+        return _queue
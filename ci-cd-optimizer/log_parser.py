@@ -1,6 +1,82 @@
 import re
+import json
+import codecs
+import hashlib
 import logging
 
+def _compile_patterns(patterns):
+    """
+    Folds every category's regex list into one alternation with a named group per category,
+    so a single pass over the log reports which categories matched.
+    """
+    groups = []
+    for issue_type, rules in patterns.items():
+        alternatives = "|".join(f"(?:{p})" for p in rules["regex"])
+        groups.append(f"(?P<{issue_type}>{alternatives})")
+    return re.compile("|".join(groups), re.IGNORECASE)
+
+def _literal(pattern):
+    """
+    The plain text a regex matches when it has no metacharacters (escaped punctuation allowed), else None.
+    """
+    if re.search(r'[.^$*+?{}\[\]|()\\]', re.sub(r'\\[^A-Za-z0-9]', '', pattern)):
+        return None
+    return re.sub(r'\\([^A-Za-z0-9])', r'\1', pattern)
+
+def _fold_literals(patterns):
+    """
+    Lower-cased literals per category, for rule sets made only of literals; None if any rule
+    is a real regex. Substring search on text.lower() runs in C at memory speed, whereas the
+    IGNORECASE alternation case-folds and tries every rule at every position (~2-5 MB/s).
+    """
+    folded = {}
+    for issue_type, rules in patterns.items():
+        literals = [_literal(p) for p in rules["regex"]]
+        if None in literals:
+            return None
+        folded[issue_type] = [literal.lower() for literal in literals]
+    return folded
+
+# Failure fingerprinting: the matching line and the few lines after it, stripped of what varies between runs
+MAX_FAILURE_LINE = 300 # Characters kept from a failing line (sample and normalized form)
+MAX_FAILURE_WINDOW = 600 # Characters kept from the normalized line + context that is fingerprinted
+_NORMALIZERS = [
+    (re.compile(r'(https?://[^/\s]+)/\S*'), r'\1/<path>'), # Keep the host, drop the rest of a URL
+    (re.compile(r'\d{4}-\d{2}-\d{2}[t ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:z|[+-]\d{2}:?\d{2})?'), '<ts>'),
+    (re.compile(r'\b\d{1,2}:\d{2}:\d{2}(?:[.,]\d+)?\b'), '<ts>'),
+    (re.compile(r'\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b'), '<uuid>'),
+    (re.compile(r'\b(?=[0-9a-f]*\d)(?=[0-9a-f]*[a-f])[0-9a-f]{7,}\b'), '<hash>'),
+    (re.compile(r'(?:[a-z]:)?(?:[\\/][\w.@+-]+){2,}[\\/]?'), '<path>'),
+    (re.compile(r'\d+(?:\.\d+)*'), '<n>'),
+    (re.compile(r'\s+'), ' '),
+]
+
+def normalize_failure(line):
+    """
+    Canonical form of a failing line: lower-cased, with timestamps, UUIDs, hashes, paths
+    and numbers replaced by placeholders, so the same failure in different runs compares equal.
+    """
+    text = line.lower()
+    for pattern, replacement in _NORMALIZERS:
+        text = pattern.sub(replacement, text)
+    return text.strip()[:MAX_FAILURE_LINE]
+
+def normalize_failure_window(lines):
+    """
+    Canonical form of a failing line followed by its context lines, one normalized line each.
+    """
+    return "\n".join(normalize_failure(line) for line in lines)[:MAX_FAILURE_WINDOW]
+
+def failure_fingerprint(issue_type, normalized):
+    return hashlib.sha1(f"{issue_type}\0{normalized}".encode('utf-8')).hexdigest()[:16]
+
+def _ruleset_version(patterns):
+    """
+    Short content hash of the rule set; changes whenever a category, regex or text is edited.
+    """
+    canonical = json.dumps(patterns, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:12]
+
 class LogIntelligenceEngine:
     """
     Parses Jenkins console logs to identify specific failure patterns and root causes.
@@ -39,24 +115,262 @@ class LogIntelligenceEngine:
         }
     }
 
+    # Compiled once at class load: one combined matcher instead of ~20 re.search calls per log
+    MATCHER = _compile_patterns(PATTERNS)
+    FOLDED_LITERALS = _fold_literals(PATTERNS)
+    FOLD_BLOCK = 1024 * 1024 # Characters lower-cased at a time by the literal path, so it can stop early
+
+    # Stored with each build's log_analysis rows so stale results can be found and re-classified
+    RULESET_VERSION = _ruleset_version(PATTERNS)
+
+    def find_categories(self, text, seen=None):
+        """
+        Adds matched category names to `seen`. Literal-only rule sets are checked with
+        substring search on the lower-cased text, one line-aligned FOLD_BLOCK at a time
+        (categories already seen are skipped); otherwise one pass of MATCHER. Either way
+        the scan stops early once every category has been found.
+        """
+        seen = set() if seen is None else seen
+        if not text or len(seen) == len(self.PATTERNS):
+            return seen
+
+        if self.FOLDED_LITERALS is not None:
+            for lowered in _folded_blocks(text, self.FOLD_BLOCK):
+                for issue_type, literals in self.FOLDED_LITERALS.items():
+                    if issue_type not in seen and any(literal in lowered for literal in literals):
+                        seen.add(issue_type)
+                if len(seen) == len(self.PATTERNS):
+                    break # Every category found, no need to fold the rest of the log
+            return seen
+
+        for match in self.MATCHER.finditer(text):
+            seen.add(match.lastgroup)
+            if len(seen) == len(self.PATTERNS):
+                break # Every category found, nothing left to learn from the rest of the log
+        return seen
+
+    def find_failures(self, text, limit=20):
+        """
+        The lines that triggered a rule, each line once per category, at most `limit` per category.
+        Returns: [(issue_type, line)]
+        """
+        source, spans = self.failure_spans(text, limit)
+        return [(issue_type, source[start:end]) for issue_type, start, end in spans]
+
+    def failure_spans(self, text, limit=20):
+        """
+        find_failures as line positions, so callers can also read the lines that follow.
+        Returns: (source, [(issue_type, start, end)]) - positions index `source`, which is `text`
+                 unless lower() changed its length (then the lower-cased text)
+        """
+        spans = []
+        if not text:
+            return text, spans
+        if self.FOLDED_LITERALS is not None:
+            lowered = text.lower()
+            source = text if len(lowered) == len(text) else lowered # lower() can change length
+            for issue_type, literals in self.FOLDED_LITERALS.items():
+                starts = set()
+                for literal in literals:
+                    pos = lowered.find(literal)
+                    while pos != -1 and len(starts) < limit:
+                        start, end = _line_bounds(lowered, pos)
+                        if start not in starts:
+                            starts.add(start)
+                            spans.append((issue_type, start, end))
+                        pos = lowered.find(literal, end)
+            return source, spans
+
+        counts, last_line = {}, {}
+        for match in self.MATCHER.finditer(text):
+            issue_type = match.lastgroup
+            if counts.get(issue_type, 0) < limit:
+                start, end = _line_bounds(text, match.start())
+                if last_line.get(issue_type) == start:
+                    continue # Another rule of the same category on the same line
+                last_line[issue_type] = start
+                counts[issue_type] = counts.get(issue_type, 0) + 1
+                spans.append((issue_type, start, end))
+        return text, spans
+
+    def build_issues(self, seen):
+        """
+        Turns a set of matched categories into the issue list, in PATTERNS order.
+        """
+        issues = []
+        for issue_type, rules in self.PATTERNS.items():
+            if issue_type in seen:
+                issues.append({
+                    "type": issue_type,
+                    "cause": rules["cause"],
+                    "suggestion": rules["suggestion"],
+                    "confidence": 1.0 # Regex matches are high confidence
+                })
+        return issues
+
     def analyze_log(self, console_text):
         """
         Scans values for patterns.
         Returns list of found issues: [{'type': 'TIMEOUT', 'cause': '...', 'suggestion': '...'}, ...]
         """
-        issues = []
         if not console_text:
-            return issues
+            return []
 
-        for issue_type, rules in self.PATTERNS.items():
-            for pattern in rules["regex"]:
-                if re.search(pattern, console_text, re.IGNORECASE):
-                    issues.append({
-                        "type": issue_type,
-                        "cause": rules["cause"],
-                        "suggestion": rules["suggestion"],
-                        "confidence": 1.0 # Regex matches are high confidence
-                    })
-                    break # Found one match for this category, move to next category
-        
-        return issues
+        return self.build_issues(self.find_categories(console_text))
+
+    def stream(self):
+        """
+        Returns a LogStreamScanner bound to this rule set, for chunked input.
+        """
+        return LogStreamScanner(self)
+
+def _folded_blocks(text, size):
+    """
+    Lower-cased slices of `text` of about `size` characters, each cut after a line break
+    so a literal (which never spans lines) is never split between two slices.
+    """
+    start = 0
+    while start < len(text):
+        end = text.find("\n", start + size)
+        end = len(text) if end == -1 else end + 1
+        yield text[start:end].lower()
+        start = end
+
+def _line_bounds(text, pos):
+    start = text.rfind("\n", 0, pos) + 1
+    end = text.find("\n", pos)
+    return start, len(text) if end == -1 else end
+
+def _following_lines(text, pos, count):
+    """
+    Up to `count` non-empty lines of `text` from `pos` on, stripped and cut to MAX_FAILURE_LINE.
+    """
+    lines = []
+    while len(lines) < count and pos < len(text):
+        end = text.find("\n", pos)
+        end = len(text) if end == -1 else end
+        line = text[pos:end].strip()
+        if line:
+            lines.append(line[:MAX_FAILURE_LINE])
+        pos = end + 1
+    return lines
+
+class LogStreamScanner:
+    """
+    Incremental LogIntelligenceEngine for logs that arrive in chunks.
+    Only complete lines are scanned; the trailing partial line is carried into the next
+    chunk so a match split across a chunk boundary is still found. Memory stays bounded
+    by the chunk size plus MAX_CARRY, however large the log is.
+    """
+
+    MAX_CARRY = 64 * 1024 # Longest partial line we hold before scanning it anyway
+    OVERLAP = 1024 # Tail kept from an over-long line so boundary matches survive
+    MAX_FINGERPRINTS = 50 # Distinct failure fingerprints kept per log
+    MAX_FAILURE_LINES = 200 # Failing lines fingerprinted per category per chunk (bounds the cost of floods)
+    CONTEXT_LINES = 2 # Non-empty lines after a failing line that are part of its fingerprint
+
+    def __init__(self, engine=None):
+        self.engine = engine or LogIntelligenceEngine()
+        self.seen = set()
+        self.bytes_seen = 0
+        self._failures = {}
+        self._line_fingerprints = {} # Raw line + context -> fingerprint, so repeats skip normalization
+        self._pending = [] # (issue_type, line, context) whose context continues in the next chunk
+        self._carry = ""
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    @property
+    def complete(self):
+        """True once every category has matched; the rest of the log can be skipped."""
+        return len(self.seen) == len(self.engine.PATTERNS)
+
+    def feed(self, chunk):
+        """
+        Scans one chunk (bytes or str). Returns the issues first seen in this chunk.
+        """
+        if isinstance(chunk, bytes):
+            self.bytes_seen += len(chunk)
+            chunk = self._decoder.decode(chunk)
+        if not chunk:
+            return []
+
+        text = self._carry + chunk
+        cut = text.rfind("\n") + 1
+        if cut == 0 and len(text) > self.MAX_CARRY:
+            # No line break in sight: scan what we have and keep only a small overlap
+            cut = len(text)
+            self._carry = text[-self.OVERLAP:]
+        else:
+            self._carry = text[cut:]
+        return self._scan(text[:cut])
+
+    def finish(self):
+        """
+        Flushes the carried partial line and returns the full issue list.
+        """
+        self._scan(self._carry + self._decoder.decode(b"", final=True))
+        self._carry = ""
+        for failure in self._pending:
+            self._record_failure(*failure) # The log ended first: fingerprint with the context there is
+        self._pending = []
+        return self.issues
+
+    @property
+    def issues(self):
+        return self.engine.build_issues(self.seen)
+
+    @property
+    def failures(self):
+        """
+        Fingerprinted failing lines, most frequent first:
+        [{'fingerprint', 'type', 'normalized', 'sample', 'hits'}]
+        A fingerprint covers the failing line and the CONTEXT_LINES non-empty lines after it, so
+        one headline with different details stays apart; `sample` is the failing line itself.
+        Lines are only fingerprinted until every category has matched (see `complete`).
+        """
+        return sorted(self._failures.values(), key=lambda f: -f['hits'])
+
+    def _record_failures(self, text):
+        source, spans = self.engine.failure_spans(text, self.MAX_FAILURE_LINES)
+        for issue_type, start, end in spans:
+            context = _following_lines(source, end + 1, self.CONTEXT_LINES)
+            if len(context) < self.CONTEXT_LINES:
+                self._pending.append((issue_type, source[start:end], context))
+            else:
+                self._record_failure(issue_type, source[start:end], context)
+
+    def _complete_pending(self, text):
+        pending, self._pending = self._pending, []
+        for issue_type, line, context in pending:
+            context = context + _following_lines(text, 0, self.CONTEXT_LINES - len(context))
+            if len(context) < self.CONTEXT_LINES:
+                self._pending.append((issue_type, line, context))
+            else:
+                self._record_failure(issue_type, line, context)
+
+    def _record_failure(self, issue_type, line, context):
+        key = (issue_type, line, tuple(context))
+        fingerprint = self._line_fingerprints.get(key)
+        if fingerprint is None:
+            normalized = normalize_failure_window([line] + context)
+            fingerprint = failure_fingerprint(issue_type, normalized)
+            if fingerprint not in self._failures:
+                if len(self._failures) >= self.MAX_FINGERPRINTS:
+                    return
+                self._failures[fingerprint] = {
+                    'fingerprint': fingerprint, 'type': issue_type, 'normalized': normalized,
+                    'sample': line.strip()[:MAX_FAILURE_LINE], 'hits': 0
+                }
+            if len(self._line_fingerprints) < self.MAX_FAILURE_LINES:
+                self._line_fingerprints[key] = fingerprint
+        self._failures[fingerprint]['hits'] += 1
+
+    def _scan(self, text):
+        if text and self._pending:
+            self._complete_pending(text)
+        if not text or self.complete:
+            return []
+        self._record_failures(text)
+        before = set(self.seen)
+        self.engine.find_categories(text, self.seen)
+        return self.engine.build_issues(self.seen - before)
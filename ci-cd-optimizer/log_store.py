@@ -0,0 +1,237 @@
+import os
+import mmap
+import zlib
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import Counter
+from database import save_build_log, get_build_log, prune_build_logs, is_log_referenced
+from log_parser import LogIntelligenceEngine
+
+LOG_STORE_DIR = os.environ.get('LOG_STORE_DIR', 'log_store')
+# Retention: newest N archived builds per job, and a cap on total compressed bytes
+LOG_RETENTION_BUILDS = int(os.environ.get('LOG_RETENTION_BUILDS', 50))
+LOG_STORE_MAX_MB = int(os.environ.get('LOG_STORE_MAX_MB', 2048))
+
+COMPRESSION_LEVEL = 6
+READ_CHUNK_SIZE = 64 * 1024 # Compressed bytes handed to the decompressor per step
+MAX_OUTPUT_CHUNK = 256 * 1024 # Upper bound on each decompressed chunk yielded
+
+class LogWriter:
+    """
+    Compresses and hashes a console log as it arrives, spooling it to a temp file inside
+    the store. Nothing is visible to readers until LogStore.commit() renames it into place.
+    """
+    def __init__(self, store):
+        self.store = store
+        self.raw_size = 0
+        self._hash = hashlib.sha256()
+        self._compressor = zlib.compressobj(COMPRESSION_LEVEL)
+        fd, self._tmp_path = tempfile.mkstemp(prefix='.incoming-', dir=store.root)
+        self._file = os.fdopen(fd, 'wb')
+
+    def write(self, chunk):
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        self.raw_size += len(chunk)
+        self._hash.update(chunk)
+        self._file.write(self._compressor.compress(chunk))
+
+    def close(self):
+        """
+        Returns: (digest, raw_size, stored_size)
+        """
+        self._file.write(self._compressor.flush())
+        stored_size = self._file.tell()
+        self._file.close()
+        return self._hash.hexdigest(), self.raw_size, stored_size
+
+    def abort(self):
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+class LogStore:
+    """
+    Per-build console log archive.
+    Blobs are zlib-compressed and named by the SHA-256 of the raw log, so identical logs
+    (retried builds, re-fetches) are stored once; the build_logs table maps
+    (job, build) -> blob. Reads stream the blob through a memory map and an incremental
+    decompressor, so a log is never held in memory whole.
+    """
+    def __init__(self, root=None, keep_builds=None, max_bytes=None):
+        self.root = root or LOG_STORE_DIR
+        self.keep_builds = LOG_RETENTION_BUILDS if keep_builds is None else keep_builds
+        self.max_bytes = LOG_STORE_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+        self._lock = threading.Lock() # Orders blob placement against garbage collection
+        self._placed = Counter() # Blobs placed but not yet settled; never collected meanwhile
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], f"{digest}.zz")
+
+    def writer(self):
+        os.makedirs(self.root, exist_ok=True)
+        return LogWriter(self)
+
+    def commit(self, writer, job_name, build_number):
+        """
+        Publishes a finished LogWriter as the log of `job_name` #`build_number`, then
+        applies retention.
+        Returns: digest
+        """
+        log = self.place(writer)
+        try:
+            log['replaced'] = save_build_log(job_name, build_number, log['digest'], log['raw_size'], log['stored_size'])
+        finally:
+            self.settle([(job_name, log)])
+        logging.info(f"Archived log of {job_name} #{build_number}: {log['raw_size']} -> {log['stored_size']} bytes "
+                     f"({log['digest'][:12]})")
+        return log['digest']
+
+    def place(self, writer):
+        """
+        Moves a finished LogWriter's blob into the store without recording it, so the caller can
+        write the build_logs row in its own transaction (save_analyses_bulk's `log` field).
+        Every placed entry must be passed to settle() afterwards, recorded or not.
+        Returns: {'digest', 'raw_size', 'stored_size'}
+        """
+        digest, raw_size, stored_size = writer.close()
+        path = self.path(digest)
+        with self._lock:
+            if os.path.exists(path):
+                os.remove(writer._tmp_path) # Same content already stored
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(writer._tmp_path, path)
+            self._placed[digest] += 1
+        return {'digest': digest, 'raw_size': raw_size, 'stored_size': stored_size}
+
+    def settle(self, logs):
+        """
+        Finishes placed logs once their rows are written (or failed to be): deletes the blobs
+        they replaced, and their own if left unreferenced, then applies retention once per job.
+        `logs`: (job_name, place() entry) pairs
+        Returns: number of blobs deleted
+        """
+        with self._lock:
+            for _, log in logs:
+                self._placed[log['digest']] -= 1
+                if self._placed[log['digest']] <= 0:
+                    del self._placed[log['digest']]
+            deleted = self._collect([log['digest'] for _, log in logs] +
+                                    [log['replaced'] for _, log in logs if log.get('replaced')])
+        for job_name in dict.fromkeys(job_name for job_name, _ in logs):
+            deleted += self.enforce_retention(job_name)
+        return deleted
+
+    def archive(self, job_name, build_number, chunks):
+        """
+        Archives a log given as bytes/str or an iterable of chunks.
+        Returns: digest
+        """
+        if isinstance(chunks, (bytes, str)):
+            chunks = [chunks]
+        writer = self.writer()
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+        except BaseException:
+            writer.abort()
+            raise
+        return self.commit(writer, job_name, build_number)
+
+    def iter_blob(self, digest):
+        """
+        Yields decompressed chunks of a stored blob (each at most MAX_OUTPUT_CHUNK bytes).
+        """
+        decompressor = zlib.decompressobj()
+        with open(self.path(digest), 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for offset in range(0, len(mapped), READ_CHUNK_SIZE):
+                data = mapped[offset:offset + READ_CHUNK_SIZE]
+                while data:
+                    chunk = decompressor.decompress(data, MAX_OUTPUT_CHUNK)
+                    if chunk:
+                        yield chunk
+                    data = decompressor.unconsumed_tail
+        tail = decompressor.flush()
+        if tail:
+            yield tail
+        if not decompressor.eof:
+            raise ValueError(f"Truncated log blob {digest}")
+
+    def open(self, job_name, build_number):
+        """
+        Returns: iterator of the archived log's byte chunks, or None if it is not archived
+        """
+        record = get_build_log(job_name, build_number)
+        if record is None or not os.path.exists(self.path(record['digest'])):
+            return None
+        return self.iter_blob(record['digest'])
+
+    def read(self, job_name, build_number):
+        """
+        Returns: the whole archived log as text, or None. Prefer open() for large logs.
+        """
+        chunks = self.open(job_name, build_number)
+        if chunks is None:
+            return None
+        return b''.join(chunks).decode('utf-8', errors='replace')
+
+    def scan(self, job_name, build_number, engine=None, scanner=None):
+        """
+        Runs the log engine over an archived log without any network I/O.
+        Pass a LogStreamScanner as `scanner` to read its failure fingerprints afterwards.
+        Returns: issue list, or None if the build has no archived log
+        """
+        record = get_build_log(job_name, build_number)
+        if record is None or not os.path.exists(self.path(record['digest'])):
+            return None
+        return self.scan_blob(record['digest'], engine, scanner)
+
+    def scan_blob(self, digest, engine=None, scanner=None):
+        """
+        Returns: issue list for one stored blob (stops decompressing once every category matched)
+        """
+        scanner = scanner or (engine or LogIntelligenceEngine()).stream()
+        chunks = self.iter_blob(digest)
+        for chunk in chunks:
+            scanner.feed(chunk)
+            if scanner.complete:
+                chunks.close()
+                break
+        return scanner.finish()
+
+    def enforce_retention(self, job_name=None):
+        """
+        Drops archived logs beyond keep_builds per job (just `job_name`'s when given) and,
+        oldest first, beyond max_bytes, then deletes blobs nobody references any more.
+        Returns: number of blobs deleted
+        """
+        with self._lock:
+            return self._collect(prune_build_logs(self.keep_builds, self.max_bytes, job_name))
+
+    def _collect(self, digests):
+        deleted = 0
+        for digest in set(digests):
+            if digest in self._placed:
+                continue
+            if not is_log_referenced(digest) and os.path.exists(self.path(digest)):
+                os.remove(self.path(digest))
+                deleted += 1
+        return deleted
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_log_store(root=None):
+    """
+    Returns the shared LogStore for `root` (LOG_STORE_DIR by default).
+    """
+    root = root or LOG_STORE_DIR
+    with _stores_lock:
+        store = _stores.get(root)
+        if store is None:
+            store = _stores[root] = LogStore(root)
+        return store
@@ -1,8 +1,16 @@
 class DecisionEngine:
     """
     Engine 6 & 5: Optimization Decision & Root Cause Mapper
+    Timing advice follows the wall-clock timeline: only critical-path stages, gaps and waits
+    delay the build finish, so off-path work is never the headline.
+    With a PipelineSimulator, impact numbers are simulated wall-clock savings over the job's
+    history instead of fixed multipliers.
     """
-    def __init__(self):
+    BOTTLENECK_SHARE_PCT = 40 # A critical stage holding this much of the wall time is the bottleneck
+    MIN_GAP_SECONDS = 10 # Idle/wait time on the critical path worth acting on
+
+    def __init__(self, simulator=None):
+        self.simulator = simulator
         self.knowledge_base = {
             "DEPENDENCY_NODE": {
                 "title": "Enable NPM Caching",
@@ -45,11 +53,18 @@ class DecisionEngine:
             action = self.knowledge_base.get(issue_type)
             
             if action:
-                # Estimate Impact
-                # If we save impact_factor % of the regression deviation?
-                # Or just heuristics.
+                # Estimate Impact: simulate the fix on the stage whose own log had the issue,
+                # taking impact_factor as the share of that stage's time it saves
                 estimated_saving = "N/A"
-                if metrics.get('regression') and metrics['regression']['is_regression']:
+                stage = next((s['name'] for s in metrics.get('stage_analysis', [])
+                              if any(i['type'] == issue_type for i in s.get('issues', []))), None)
+                simulated = None
+                if stage and 0 < action['impact_factor'] < 1:
+                    simulated = self._simulated_saving([('speedup', stage, 1 - action['impact_factor'])])
+                if simulated:
+                    estimated_saving = simulated
+                elif metrics.get('regression') and metrics['regression']['is_regression']:
+                    # Fallback heuristic: the fix recovers impact_factor of the regression deviation
                     dev = metrics['regression']['deviation_seconds']
                     if dev > 0:
                         saved = int(dev * action['impact_factor'])
@@ -69,18 +84,115 @@ class DecisionEngine:
         if reg and reg['is_regression']:
              suggestions.append({
                 'title': "⚠️ Regression Detected",
-                'description': f"Build is {reg['increase_percent']}% slower than baseline ({reg['baseline_avg']}s).",
+                'description': f"Build is {reg['increase_percent']}% slower than baseline ({reg.get('baseline', reg['baseline_avg'])}s).",
                 'confidence': "100%",
                 'impact': "Variable",
                 'severity': 'MEDIUM',
                 'snippet': "// Check commit history for heavy changes"
             })
-            
+
+        # 3. Critical Path (what actually gates the build finish)
+        if metrics.get('timeline'):
+            suggestions.extend(self._critical_path_plan(metrics))
+
+        return suggestions
+
+    def _critical_path_plan(self, metrics):
+        timeline = metrics['timeline']
+        suggestions = []
+        stages = metrics.get('stage_analysis', [])
+
+        for stage in stages:
+            if stage['status'] != 'REGRESSION':
+                continue
+            over = round(stage['duration'] - stage['baseline'], 1)
+            if stage['critical']:
+                suggestions.append({
+                    'title': f"⏱️ Critical-Path Regression: {stage['name']}",
+                    'description': f"{stage['name']} is {stage['regression_pct']}% over its baseline and on the "
+                                   f"critical path, so the whole build finishes later.",
+                    'confidence': "100%",
+                    'impact': f"~{int(over)} seconds",
+                    'severity': 'HIGH',
+                    'snippet': "// Profile this stage first: every second here delays the build"
+                })
+            else:
+                suggestions.append({
+                    'title': f"Off-Path Regression: {stage['name']}",
+                    'description': f"{stage['name']} is {stage['regression_pct']}% over its baseline but runs in "
+                                   f"parallel with {stage['slack_seconds']}s of slack; it does not delay the build yet.",
+                    'confidence': "100%",
+                    'impact': "None",
+                    'severity': 'LOW',
+                    'snippet': "// Watch this stage; it only matters once its slack is used up"
+                })
+
+        critical = [s for s in stages if s['critical']]
+        bottleneck = max(critical, key=lambda s: s['impact_pct'], default=None)
+        if bottleneck and bottleneck['impact_pct'] >= self.BOTTLENECK_SHARE_PCT and len(stages) > 1:
+            impact = f"Up to ~{int(bottleneck['duration'] / 2)} seconds if halved"
+            if self.simulator:
+                # Two shards need one more executor than the build used
+                impact = self._simulated_saving([('split', bottleneck['name'], 2),
+                                                 ('executors', self.simulator.executors + 1)]) or impact
+            suggestions.append({
+                'title': f"🚧 Bottleneck Stage: {bottleneck['name']}",
+                'description': f"{bottleneck['name']} holds {bottleneck['impact_pct']}% of the wall-clock time on "
+                               f"the critical path ({' → '.join(timeline['critical_path'])}). Split or parallelize it.",
+                'confidence': "90%",
+                'impact': impact,
+                'severity': 'MEDIUM',
+                'snippet': "parallel {\n    stage('Shard 1') { steps { sh 'make test SHARD=1/2' } }\n"
+                           "    stage('Shard 2') { steps { sh 'make test SHARD=2/2' } }\n}"
+            })
+
+        for gap in timeline['gaps']:
+            if not gap['critical'] or gap['seconds'] < self.MIN_GAP_SECONDS:
+                continue
+            if gap['kind'] == 'idle':
+                suggestions.append({
+                    'title': f"Idle Time Before {gap['before']}",
+                    'description': f"Nothing ran for {gap['seconds']}s between {gap['after']} and {gap['before']} "
+                                   f"(waiting for an executor or agent).",
+                    'confidence': "80%",
+                    'impact': f"~{int(gap['seconds'])} seconds",
+                    'severity': 'MEDIUM',
+                    'snippet': "agent { label 'warm-pool' } // Pre-provisioned agents skip the queue"
+                })
+            else:
+                suggestions.append({
+                    'title': f"Input Wait in {gap['stage']}",
+                    'description': f"{gap['stage']} paused {gap['seconds']}s for manual input on the critical path.",
+                    'confidence': "100%",
+                    'impact': f"~{int(gap['seconds'])} seconds",
+                    'severity': 'LOW',
+                    'snippet': "stage('Approve') {\n    agent none // Don't hold an executor while waiting\n"
+                               "    steps { timeout(time: 15, unit: 'MINUTES') { input 'Deploy?' } }\n}"
+                })
         return suggestions
 
-def optimize_pipeline_v2(metrics):
+    def _simulated_saving(self, changes):
+        """
+        Returns: impact text from simulating `changes`, or None without a simulator
+        """
+        if not self.simulator:
+            return None
+        try:
+            saving = self.simulator.compare(changes)['saving_seconds']
+        except ValueError:
+            return None # Stage not in the simulated layout
+        if saving['p50'] <= 0:
+            return "None (off the critical path)"
+        return f"~{int(saving['p50'])} seconds (p90 {int(saving['p90'])}s, simulated)"
+
+def optimize_pipeline_v2(metrics, simulator=None):
+    """
+    Pure by default: fixed impact heuristics, no history read and no Monte Carlo run.
+    Callers that can afford it pass a simulator.PipelineSimulator for the build to get
+    simulated savings instead (see app._analyze_jenkins_build, run off the request thread).
+    """
     if not metrics:
         return []
 
-    engine = DecisionEngine()
+    engine = DecisionEngine(simulator)
     return engine.generate_plan(metrics)
@@ -0,0 +1,203 @@
+import os
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from jenkins_fetch import fetch_jenkins_data, job_path, list_jobs, is_build_finished, BUILD_DATA_ERROR
+from analyzer import analyze_pipeline_v2
+from database import get_poller_states, save_poller_state, get_job_history, get_stage_log_scans
+
+# Seconds between probes of a job: base interval, ceiling while a job stays quiet, and +/- jitter fraction
+POLL_INTERVAL = float(os.environ.get('POLL_INTERVAL', 60))
+POLL_MAX_INTERVAL = float(os.environ.get('POLL_MAX_INTERVAL', 900))
+POLL_JITTER = float(os.environ.get('POLL_JITTER', 0.2))
+# Concurrent probes/fetches against one controller
+POLL_CONTROLLER_CONCURRENCY = int(os.environ.get('POLL_CONTROLLER_CONCURRENCY', 4))
+# Most builds analyzed per job per change (a job that ran 50 times while we were down gets its newest N)
+POLL_MAX_CATCHUP = int(os.environ.get('POLL_MAX_CATCHUP', 5))
+# Attempts at a build that keeps failing to fetch or analyze before the poller moves past it
+POLL_MAX_RETRIES = int(os.environ.get('POLL_MAX_RETRIES', 3))
+
+# Probe projection: the one number that tells us whether there is anything new
+PROBE_TREE = "lastCompletedBuild[number]"
+
+class JenkinsPoller:
+    """
+    Change-driven poller: analyzes each completed build of the watched jobs exactly once.
+    Every job is probed with a tiny tree= request carrying the validators (ETag / Last-Modified)
+    of its last answer, so an unchanged job costs one 304 or a few dozen bytes. Only build
+    numbers above the last analyzed one are fetched and analyzed, oldest first. A build that no
+    longer exists is skipped, one that keeps failing is given up after `max_retries` attempts,
+    and one that is still running (builds can finish out of order) is waited for, so the
+    watermark never passes a build whose final result was not stored. A quiet job's interval doubles
+    up to POLL_MAX_INTERVAL and drops back to the base as soon as it builds again; every
+    interval is jittered so jobs don't probe in lockstep. At most `concurrency` requests run
+    against the controller at a time, on top of the client's own rate limit.
+    State lives in the poller_state table, so restarts resume where they stopped.
+    """
+    def __init__(self, client, job_names=None, interval=None, max_interval=None, jitter=None,
+                 concurrency=None, max_catchup=None, max_retries=None, fetch_options=None, seed=None):
+        self.client = client
+        self.controller = client.base_url.rstrip('/')
+        self.job_names = job_names
+        self.interval = interval or POLL_INTERVAL
+        self.max_interval = max(self.interval, max_interval or POLL_MAX_INTERVAL)
+        self.jitter = POLL_JITTER if jitter is None else jitter
+        self.concurrency = concurrency or POLL_CONTROLLER_CONCURRENCY
+        self.max_catchup = max_catchup or POLL_MAX_CATCHUP
+        self.max_retries = max_retries or POLL_MAX_RETRIES
+        self.fetch_options = fetch_options or {'stream_console': True}
+        self._random = random.Random(seed)
+        self._states = None
+
+    def _jittered(self, seconds):
+        return seconds * self._random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _load(self):
+        if self._states is None:
+            self._states = get_poller_states(self.controller)
+            if self.job_names is None:
+                self.job_names = list_jobs(self.client)
+        for name in self.job_names:
+            if name not in self._states:
+                # Start from what is already stored (manual fetches, backfill) and spread the first probes
+                history = get_job_history(name, limit=1)
+                self._states[name] = {
+                    'last_build': history[0]['build_number'] if history else None,
+                    'etag': None, 'last_modified': None, 'interval': self.interval,
+                    'next_check': time.time() + self._random.uniform(0, self.interval * self.jitter),
+                    'errors': 0, 'last_error': None, 'failed_build': None
+                }
+        return self._states
+
+    def probe(self, job_name, state):
+        """
+        Conditional lastCompletedBuild probe.
+        Returns: (latest completed build number or None if unchanged, validators to store once it is handled)
+        """
+        headers = {}
+        if state.get('etag'):
+            headers['If-None-Match'] = state['etag']
+        if state.get('last_modified'):
+            headers['If-Modified-Since'] = state['last_modified']
+        resp = self.client.get(f"{job_path(job_name)}/api/json", label='poll_probe',
+                               params={'tree': PROBE_TREE}, headers=headers)
+        validators = {'etag': state.get('etag'), 'last_modified': state.get('last_modified')}
+        if resp.status_code == 304:
+            return None, validators
+        if resp.status_code != 200:
+            raise RuntimeError(f"Probe failed: {resp.status_code}")
+        validators = {'etag': resp.headers.get('ETag'), 'last_modified': resp.headers.get('Last-Modified')}
+        build = self.client.json(resp, 'poll_probe').get('lastCompletedBuild')
+        return (build['number'] if build else None), validators
+
+    def _analyze(self, job_name, build_number):
+        """
+        Returns: 'analyzed', 'missing' (the build has no data on the controller) or 'running'
+        Raises: RuntimeError on any other fetch or analysis failure
+        """
+        previous = get_stage_log_scans(job_name, build_number) if self.fetch_options.get('stage_logs') else None
+        data, error_msg = fetch_jenkins_data(self.client.base_url, job_name, None, None, client=self.client,
+                                             build_number=build_number, previous_stage_logs=previous,
+                                             **self.fetch_options)
+        if error_msg and error_msg.startswith(BUILD_DATA_ERROR):
+            return 'missing'
+        if error_msg or not data:
+            raise RuntimeError(error_msg or "No data returned")
+        if not is_build_finished(data.get('status')):
+            return 'running'
+        if analyze_pipeline_v2(data) is None:
+            raise RuntimeError("Analysis failed")
+        return 'analyzed'
+
+    def check_job(self, job_name, state):
+        """
+        Probes one job and analyzes its new builds, oldest first. Updates `state` in place.
+        Returns: list of analyzed build numbers
+        """
+        analyzed, current, waiting = [], None, False
+        try:
+            latest, validators = self.probe(job_name, state)
+            last = state.get('last_build')
+            if latest is not None and (last is None or latest > last):
+                first = max(1, latest - self.max_catchup + 1, (last or 0) + 1)
+                for current in range(first, latest + 1):
+                    outcome = self._analyze(job_name, current)
+                    if outcome == 'running':
+                        # Nothing past it is committed until it finishes; probe again at the base interval
+                        logging.info(f"Poller: {job_name} #{current} still running")
+                        waiting = True
+                        break
+                    if outcome == 'missing':
+                        logging.warning(f"Poller: {job_name} #{current} has no build data, skipping it")
+                    else:
+                        analyzed.append(current)
+                    # Advance after each build, so a failure mid-way resumes at the right build
+                    state['last_build'] = current
+                current = None
+            # Validators are only kept once everything they cover is analyzed; after a failure
+            # (or while a build is still running) the next probe must not come back 304
+            if not waiting:
+                state.update(validators)
+            state.update(errors=0, last_error=None, failed_build=None)
+            if analyzed or waiting:
+                state['interval'] = self.interval
+                if analyzed:
+                    logging.info(f"Poller: {job_name} analyzed {analyzed}")
+            else:
+                state['interval'] = min(self.max_interval, (state.get('interval') or self.interval) * 2)
+            state['next_check'] = time.time() + self._jittered(state['interval'])
+        except Exception as e:
+            logging.error(f"Poller: {job_name} failed: {e}")
+            state['last_error'] = str(e)
+            if current is None:
+                state['errors'] = state.get('errors', 0) + 1
+            else:
+                # Attempts are counted per build, so one bad build cannot hold the job back forever
+                same_build = state.get('failed_build') == current
+                state['errors'] = state.get('errors', 0) + 1 if same_build else 1
+                state['failed_build'] = current
+                if state['errors'] >= self.max_retries:
+                    logging.warning(f"Poller: giving up on {job_name} #{current} after {state['errors']} attempts")
+                    state.update(last_build=current, failed_build=None, errors=0)
+            # Back off on repeated errors instead of hammering a struggling controller
+            backoff = min(self.max_interval, self.interval * 2 ** min(max(state['errors'] - 1, 0), 10))
+            state['next_check'] = time.time() + self._jittered(backoff)
+        save_poller_state(self.controller, job_name, state)
+        return analyzed
+
+    def poll_once(self, now=None):
+        """
+        Checks every job that is due.
+        Returns: {'due', 'changed', 'analyzed', 'errors', 'next_check'}
+        """
+        states = self._load()
+        now = time.time() if now is None else now
+        due = [name for name in self.job_names if states[name]['next_check'] <= now]
+        results = {}
+        if due:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(due)), thread_name_prefix='poller') as pool:
+                for name, analyzed in zip(due, pool.map(lambda n: self.check_job(n, states[n]), due)):
+                    results[name] = analyzed
+        return {
+            'due': len(due),
+            'changed': sum(1 for analyzed in results.values() if analyzed),
+            'analyzed': sum(len(analyzed) for analyzed in results.values()),
+            'errors': sum(1 for name in due if states[name]['last_error']),
+            'next_check': min((states[name]['next_check'] for name in self.job_names), default=None)
+        }
+
+    def run(self, stop=None, max_cycles=None):
+        """
+        Polls until `stop` (a threading.Event) is set, sleeping until the next job is due.
+        """
+        stop = stop or threading.Event()
+        cycles = 0
+        while not stop.is_set() and (max_cycles is None or cycles < max_cycles):
+            summary = self.poll_once()
+            cycles += 1
+            if summary['analyzed'] or summary['errors']:
+                logging.info(f"Poller cycle: {summary}")
+            wait = (summary['next_check'] or time.time() + self.interval) - time.time()
+            stop.wait(max(1.0, min(wait, self.max_interval)))
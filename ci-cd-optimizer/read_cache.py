@@ -0,0 +1,117 @@
+import copy
+import time
+import inspect
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+class ReadCache:
+    """
+    In-process LRU + TTL cache for per-job read queries.
+    Entries are grouped by (namespace, job) so a write to one job drops exactly that job's
+    entries. Each group carries a generation number: a read that started before an
+    invalidation is not allowed to store its (possibly stale) result afterwards.
+    Values are deep-copied in and out, so callers can mutate what they get back.
+    """
+    def __init__(self, max_entries=256, ttl=30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict() # key -> (expires_at, value)
+        self._groups = {} # group -> set of keys
+        self._generations = {} # group -> int
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, group, key):
+        """
+        Returns: (True, value) on a fresh hit, (False, generation) on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, copy.deepcopy(entry[1])
+                self._drop(key, group)
+            self.misses += 1
+            return False, self._generations.get(group, 0)
+
+    def put(self, group, key, value, generation):
+        """
+        Stores a value computed under `generation`; discarded if the group was invalidated since.
+        """
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if self._generations.get(group, 0) != generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            self._groups.setdefault(group, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                old_key = next(iter(self._entries))
+                self._drop(old_key, old_key[:2])
+
+    def _drop(self, key, group):
+        self._entries.pop(key, None)
+        keys = self._groups.get(group)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._groups[group]
+
+    def invalidate(self, group):
+        with self._lock:
+            self._generations[group] = self._generations.get(group, 0) + 1
+            for key in self._groups.pop(group, ()):
+                self._entries.pop(key, None)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            for group in list(self._generations) + list(self._groups):
+                self._generations[group] = self._generations.get(group, 0) + 1
+            self._entries.clear()
+            self._groups.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'invalidations': self.invalidations
+            }
+
+def cached_by_job(cache, namespace):
+    """
+    Decorator for read functions whose first argument is the job name.
+    `namespace` is a callable returning the current scope (e.g. the database file),
+    so switching databases never serves another file's rows.
+    Keys are (namespace, job_name, function, remaining args with defaults applied).
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @wraps(func)
+        def wrapper(job_name, *args, **kwargs):
+            bound = signature.bind(job_name, *args, **kwargs)
+            bound.apply_defaults()
+            group = (namespace(), job_name)
+            key = group + (func.__name__, tuple(bound.arguments.items())[1:])
+            hit, value = cache.get(group, key)
+            if hit:
+                return value
+            result = func(job_name, *args, **kwargs)
+            cache.put(group, key, result, value)
+            return result
+        wrapper.uncached = func
+        return wrapper
+    return decorator
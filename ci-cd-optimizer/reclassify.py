@@ -0,0 +1,72 @@
+import time
+import logging
+from multiprocessing import Pool
+import database
+from log_parser import LogIntelligenceEngine
+from log_store import LogStore, get_log_store
+
+_worker_store = None
+
+def _init_worker(store_root):
+    global _worker_store
+    _worker_store = LogStore(store_root)
+
+def _scan_digest(digest):
+    """
+    Worker: runs the current rule set over one archived blob. Needs no DB access.
+    Returns: (digest, (issues, failures) or None, error message or None)
+    """
+    try:
+        scanner = LogIntelligenceEngine().stream()
+        issues = _worker_store.scan_blob(digest, scanner=scanner)
+        return digest, (issues, scanner.failures), None
+    except Exception as e:
+        return digest, None, f"{type(e).__name__}: {e}"
+
+def reclassify(workers=None, batch_size=1000, store=None, chunksize=8):
+    """
+    Re-runs the current LogIntelligenceEngine rule set over every archived log whose
+    log_analysis rows (and failure fingerprints) were produced by another rule set
+    (or never), on a process pool.
+    Builds are paged by id; each page's distinct blobs are scanned once, and the page is
+    committed in one transaction that also stamps the new RULESET_VERSION. Since progress
+    lives in the builds table, an interrupted run resumes where it stopped.
+    Returns: summary dict
+    """
+    started = time.perf_counter()
+    store = store or get_log_store()
+    version = LogIntelligenceEngine.RULESET_VERSION
+    scanned = updated = 0
+    errors = []
+    after_id = 0
+
+    with Pool(processes=workers, initializer=_init_worker, initargs=(store.root,)) as pool:
+        while True:
+            batch = database.get_stale_log_builds(version, after_id, batch_size)
+            if not batch:
+                break
+            after_id = batch[-1]['id']
+
+            digests = list(dict.fromkeys(b['digest'] for b in batch))
+            results = {}
+            for digest, found, error_msg in pool.imap_unordered(_scan_digest, digests, chunksize=chunksize):
+                if error_msg:
+                    errors.append({'digest': digest, 'error': error_msg})
+                else:
+                    results[digest] = found
+            scanned += len(digests)
+
+            # Builds whose blob failed stay stale and are retried by the next run
+            updated += database.save_reclassified(
+                [(b['id'],) + results[b['digest']] for b in batch if b['digest'] in results], version)
+            logging.info(f"Re-classified {updated} builds so far (up to build id {after_id})")
+
+    elapsed = time.perf_counter() - started
+    return {
+        'ruleset_version': version,
+        'builds_updated': updated,
+        'logs_scanned': scanned,
+        'errors': errors,
+        'elapsed_seconds': round(elapsed, 2),
+        'builds_per_second': round(updated / elapsed, 1) if elapsed > 0 else 0.0
+    }
@@ -0,0 +1,171 @@
+import os
+import heapq
+import random
+from timeline import TimelineEngine
+from database import get_stage_duration_samples
+
+# Successful builds whose stage durations are replayed, and trials per distribution
+SIM_HISTORY_BUILDS = int(os.environ.get('SIM_HISTORY_BUILDS', 200))
+SIM_TRIALS = int(os.environ.get('SIM_TRIALS', 500))
+
+class PipelineSimulator:
+    """
+    Discrete-event Monte Carlo simulator for a pipeline's stage DAG.
+    Each trial replays the stage durations of one historical build (so a slow agent slows every
+    stage together), runs the DAG on a pool of executors and records the wall-clock finish.
+    Layout changes are applied to the DAG before replaying:
+        ('split', stage, ways[, overhead_seconds])  run a stage as `ways` equal parallel branches
+        ('speedup', stage, factor)                  scale a stage's duration (e.g. 0.4 for cached installs)
+        ('parallel', [stage, ...])                  let these stages run side by side
+        ('executors', count)                        change how many stages may run at once
+    """
+    def __init__(self, durations, deps, samples=(), executors=None, seed=None):
+        self.durations = dict(durations) # Current build: stage -> seconds (fallback for unsampled stages)
+        self.deps = {name: set(deps.get(name, ())) for name in self.durations}
+        self.samples = list(samples)
+        self.executors = executors or len(self.durations)
+        self.seed = seed
+
+    @classmethod
+    def from_stages(cls, stages, samples=(), executors=None, seed=None):
+        """
+        DAG from one build's stage intervals: a stage depends on every stage that had already
+        finished when it started. Executors default to the build's peak stage concurrency.
+        """
+        engine = TimelineEngine()
+        spans = engine.intervals(stages)
+        names = [s['name'] for s in stages]
+        deps = {names[j]: {names[i] for i, (s, e) in enumerate(spans)
+                           if i != j and s < start and e <= start + engine.OVERLAP_TOLERANCE_MS}
+                for j, (start, _) in enumerate(spans)}
+        peak = max(sum(1 for s, e in spans if s <= start < e) for start, _ in spans) if spans else 1
+        durations = {s['name']: s['durationMillis'] / 1000.0 for s in stages}
+        return cls(durations, deps, samples, executors or max(1, peak), seed)
+
+    @classmethod
+    def for_job(cls, job_name, stages=None, seed=None):
+        """
+        Simulator over `stages` (a build's WFAPI stages) with the job's stored history. Without
+        stages the latest successful build's stages are laid out back to back.
+        Returns: PipelineSimulator, or None if there is nothing to simulate
+        """
+        samples = get_stage_duration_samples(job_name, SIM_HISTORY_BUILDS)
+        if not stages:
+            if not samples:
+                return None
+            stages = [{'name': name, 'durationMillis': seconds * 1000} for name, seconds in samples[0].items()]
+        return cls.from_stages(stages, samples, seed=seed)
+
+    def _layout(self, changes):
+        """
+        Returns: (nodes, executors) where nodes = {node: (stage, scale, overhead, deps)} in run order
+        """
+        nodes = {name: (name, 1.0, 0.0, set(self.deps[name])) for name in self.durations}
+        executors = self.executors
+        for change in changes:
+            op = change[0]
+            if op == 'executors':
+                executors = max(1, int(change[1]))
+                continue
+            if op == 'parallel':
+                group = set(change[1])
+                for name in group & set(nodes):
+                    stage, scale, overhead, deps = nodes[name]
+                    # Keep what the group's members waited for, but not each other
+                    inherited = set().union(*(nodes[g][3] for g in deps & group))
+                    nodes[name] = (stage, scale, overhead, (deps | inherited) - group)
+                continue
+            name = change[1]
+            if name not in nodes:
+                raise ValueError(f"Unknown stage {name!r}")
+            stage, scale, overhead, deps = nodes[name]
+            if op == 'speedup':
+                nodes[name] = (stage, scale * change[2], overhead, deps)
+            elif op == 'split':
+                ways = int(change[2])
+                extra = change[3] if len(change) > 3 else 0.0
+                branches = [f"{name} [{k}/{ways}]" for k in range(1, ways + 1)]
+                position = list(nodes).index(name)
+                items = list(nodes.items())
+                items[position:position + 1] = [(b, (stage, scale / ways, overhead + extra, set(deps))) for b in branches]
+                nodes = dict(items)
+                for node, (s, sc, ov, d) in nodes.items():
+                    if name in d:
+                        nodes[node] = (s, sc, ov, (d - {name}) | set(branches))
+            else:
+                raise ValueError(f"Unknown change {op!r}")
+        return nodes, executors
+
+    def _run(self, nodes, executors, sample):
+        """
+        One discrete-event replay. Returns: wall-clock seconds
+        """
+        order = {node: i for i, node in enumerate(nodes)}
+        waiting = {node: len(spec[3]) for node, spec in nodes.items()}
+        dependents = {node: [] for node in nodes}
+        for node, spec in nodes.items():
+            for dep in spec[3]:
+                dependents[dep].append(node)
+
+        ready = [order[node] for node, count in waiting.items() if count == 0]
+        heapq.heapify(ready)
+        names = list(nodes)
+        running, clock, done, free = [], 0.0, 0, executors
+        while ready or running:
+            while ready and free:
+                node = names[heapq.heappop(ready)]
+                stage, scale, overhead, _ = nodes[node]
+                duration = sample.get(stage, self.durations[stage]) * scale + overhead
+                heapq.heappush(running, (clock + duration, order[node], node))
+                free -= 1
+            clock, _, node = heapq.heappop(running)
+            free += 1
+            done += 1
+            for dependent in dependents[node]:
+                waiting[dependent] -= 1
+                if waiting[dependent] == 0:
+                    heapq.heappush(ready, order[dependent])
+        if done != len(nodes):
+            raise ValueError("Stage dependencies form a cycle")
+        return clock
+
+    def _picks(self, trials):
+        rng = random.Random(self.seed)
+        if not self.samples:
+            return [{}] * trials
+        return [rng.choice(self.samples) for _ in range(trials)]
+
+    def simulate(self, changes=(), trials=None, picks=None):
+        """
+        Returns: {'trials', 'executors', 'mean', 'min', 'p10', 'p50', 'p90', 'max'} of wall-clock seconds
+        """
+        picks = picks or self._picks(trials or SIM_TRIALS)
+        nodes, executors = self._layout(changes)
+        walls = sorted(self._run(nodes, executors, sample) for sample in picks)
+        return {
+            'trials': len(walls),
+            'executors': executors,
+            'mean': round(sum(walls) / len(walls), 2),
+            'min': round(walls[0], 2),
+            'p10': round(_quantile(walls, 0.10), 2),
+            'p50': round(_quantile(walls, 0.50), 2),
+            'p90': round(_quantile(walls, 0.90), 2),
+            'max': round(walls[-1], 2)
+        }
+
+    def compare(self, changes, trials=None):
+        """
+        Current layout vs. `changes`, replaying the same historical builds for both.
+        Returns: {'baseline', 'scenario', 'saving_seconds': {'p50', 'p90'}}
+        """
+        picks = self._picks(trials or SIM_TRIALS)
+        baseline = self.simulate((), picks=picks)
+        scenario = self.simulate(changes, picks=picks)
+        return {
+            'baseline': baseline,
+            'scenario': scenario,
+            'saving_seconds': {q: round(baseline[q] - scenario[q], 2) for q in ('p50', 'p90')}
+        }
+
+def _quantile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
@@ -0,0 +1,185 @@
+import json
+import math
+
+class QuantileSketch:
+    """
+    Mergeable, fixed-memory quantile sketch (DDSketch-style logarithmic buckets).
+    Any quantile is returned within `relative_accuracy` of the true value, and memory is
+    capped at `max_buckets` counters however many values are added. When the cap is hit the
+    lowest buckets are collapsed, so only the fast tail loses precision - p50/p90/p99 do not.
+    """
+    MIN_VALUE = 1e-3 # Durations below a millisecond are counted as zero
+
+    def __init__(self, relative_accuracy=0.01, max_buckets=512):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, index):
+        # Midpoint (in relative terms) of bucket (gamma^(i-1), gamma^i]
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def add(self, value, weight=1):
+        """
+        Records a value. O(1), plus an occasional O(max_buckets) collapse.
+        """
+        if value is None:
+            return
+        if value <= self.MIN_VALUE:
+            self.zero_count += weight
+        else:
+            index = self._index(value)
+            self.bins[index] = self.bins.get(index, 0) + weight
+            if len(self.bins) > self.max_buckets:
+                self._collapse()
+        self.count += weight
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def remove(self, value, weight=1):
+        """
+        Takes back a value added earlier (a re-analysed build). Min/max are not narrowed,
+        so they may still reflect the removed value.
+        Returns: True if the sketch held a value in that bucket
+        """
+        if value is None or self.count < weight:
+            return False
+        if value <= self.MIN_VALUE:
+            if self.zero_count < weight:
+                return False
+            self.zero_count -= weight
+        else:
+            index = self._index(value)
+            if index not in self.bins and self.bins and index < min(self.bins):
+                index = min(self.bins) # Collapsed into the lowest bucket
+            if self.bins.get(index, 0) < weight:
+                return False
+            self.bins[index] -= weight
+            if not self.bins[index]:
+                del self.bins[index]
+        self.count -= weight
+        if not self.count:
+            self.min = self.max = None
+        return True
+
+    def _collapse(self):
+        indexes = sorted(self.bins)
+        overflow = indexes[:len(indexes) - self.max_buckets + 1]
+        target = indexes[len(overflow)]
+        self.bins[target] += sum(self.bins.pop(i) for i in overflow)
+
+    def merge(self, other):
+        """
+        Folds another sketch (same relative accuracy) into this one.
+        """
+        if other.count == 0:
+            return self
+        if not math.isclose(other.gamma, self.gamma):
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for index, weight in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + weight
+        while len(self.bins) > self.max_buckets:
+            self._collapse()
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """
+        Value at quantile q (0..1), or 0 for an empty sketch.
+        """
+        if self.count == 0:
+            return 0
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0 if self.min <= 0 else self.min
+        value = self.max
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                value = self._value(index)
+                break
+        return min(max(value, self.min), self.max)
+
+    def to_json(self):
+        return json.dumps({
+            'a': self.relative_accuracy, 'm': self.max_buckets, 'z': self.zero_count,
+            'n': self.count, 'lo': self.min, 'hi': self.max,
+            'b': [[index, weight] for index, weight in sorted(self.bins.items())]
+        }, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, payload):
+        if not payload:
+            return cls()
+        state = json.loads(payload)
+        sketch = cls(state['a'], state['m'])
+        sketch.bins = {index: weight for index, weight in state['b']}
+        sketch.zero_count = state['z']
+        sketch.count = state['n']
+        sketch.min = state['lo']
+        sketch.max = state['hi']
+        return sketch
+
+class WindowedSketch:
+    """
+    QuantileSketch over roughly the last `window` values, so a baseline follows a job whose
+    durations shift for good instead of averaging over its whole life. Values go into the
+    current generation; once it holds `window` values it becomes the previous one (the older
+    generation is dropped) and a new one starts. Quantiles come from both generations, i.e.
+    from the newest `window` to `2 * window` values.
+    """
+    def __init__(self, window, relative_accuracy=0.01, max_buckets=512):
+        self.window = window
+        self.current = QuantileSketch(relative_accuracy, max_buckets)
+        self.previous = QuantileSketch(relative_accuracy, max_buckets)
+
+    @property
+    def count(self):
+        return self.current.count + self.previous.count
+
+    def add(self, value):
+        if value is None:
+            return
+        if self.current.count >= self.window:
+            self.previous = self.current
+            self.current = QuantileSketch(self.current.relative_accuracy, self.current.max_buckets)
+        self.current.add(value)
+
+    def remove(self, value):
+        """
+        Takes back a value added earlier. A value whose generation was already dropped is ignored.
+        """
+        return self.current.remove(value) or self.previous.remove(value)
+
+    def quantile(self, q):
+        merged = QuantileSketch(self.current.relative_accuracy, self.current.max_buckets)
+        return merged.merge(self.previous).merge(self.current).quantile(q)
+
+    def to_json(self):
+        return json.dumps({'w': self.window, 'cur': self.current.to_json(), 'prev': self.previous.to_json()},
+                          separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, payload, window):
+        """
+        Restores a sketch saved by to_json; `window` applies from now on.
+        """
+        sketch = cls(window)
+        if payload:
+            state = json.loads(payload)
+            sketch.current = QuantileSketch.from_json(state['cur'])
+            sketch.previous = QuantileSketch.from_json(state['prev'])
+        return sketch
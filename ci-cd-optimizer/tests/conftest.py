@@ -0,0 +1,9 @@
+import pytest
+import database
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Points the persistence layer at a fresh SQLite file for one test."""
+    monkeypatch.setattr(database, "DB_NAME", str(tmp_path / "test.db"))
+    database.init_db()
+    return database
@@ -0,0 +1,57 @@
+import pytest
+from analyzer import RegressionEngine, StageAnalysisEngine, analyze_pipeline_v2
+
+def _build(number, status="SUCCESS", **durations):
+    stages = [{"name": name, "status": "SUCCESS", "durationMillis": int(sec * 1000), "startTimeMillis": 0}
+              for name, sec in durations.items()]
+    return {"job_name": "demo", "build_number": number, "status": status,
+            "duration_seconds": sum(durations.values()), "stages": stages, "console_log": ""}
+
+def test_stage_regression_uses_materialized_baseline(db):
+    for n in range(1, 6):
+        analyze_pipeline_v2(_build(n, Build=10, Test=20))
+    stages = StageAnalysisEngine().analyze(_build(6, Build=10, Test=40)["stages"], "demo")
+    by_name = {s["name"]: s for s in stages}
+    assert by_name["Build"]["status"] == "HEALTHY"
+    assert by_name["Test"]["status"] == "REGRESSION"
+    assert by_name["Test"]["baseline"] == 20
+    assert by_name["Test"]["regression_pct"] == 100
+
+def _stats(**history):
+    stats = {'avg_duration': 100.0, 'std_dev': 2.0, 'failure_rate': 0, 'total_builds': 20}
+    stats.update(history)
+    return stats
+
+def test_regression_falls_back_to_mean_without_history():
+    result = RegressionEngine().detect(104.0, _stats(history_count=2, history_p50=100.0,
+                                                     history_p90=101.0, robust_sigma=1.0))
+    assert result["method"] == "mean"
+    assert result["is_regression"] # z = 2.0 against a tight mean/std-dev
+
+def test_regression_uses_median_and_p90_with_history():
+    history = dict(history_count=500, history_p50=100.0, history_p90=130.0, robust_sigma=15.0)
+    within_p90 = RegressionEngine().detect(125.0, _stats(**history))
+    assert within_p90["method"] == "quantile" and not within_p90["is_regression"]
+
+    slow = RegressionEngine().detect(160.0, _stats(**history))
+    assert slow["is_regression"]
+    assert slow["baseline"] == 100.0 and slow["increase_percent"] == 60.0
+    assert slow["z_score"] == 4.0
+
+def test_stage_regression_ignores_single_outlier(db):
+    for n, test_duration in enumerate([20, 21, 19, 20, 22, 20, 400, 21, 20, 19], start=1):
+        analyze_pipeline_v2(_build(n, Build=10, Test=test_duration))
+    by_name = {s["name"]: s for s in StageAnalysisEngine().analyze(_build(11, Build=10, Test=27)["stages"], "demo")}
+    assert by_name["Test"]["baseline"] == pytest.approx(20, rel=0.02)
+    assert by_name["Test"]["status"] == "REGRESSION" # A 400s outlier would have hidden this behind the mean
+
+def test_stage_impact_uses_wall_clock_share(db):
+    t0 = 1_700_000_000_000
+    stages = [{"name": "Build", "status": "SUCCESS", "durationMillis": 10000, "startTimeMillis": t0},
+              {"name": "Unit", "status": "SUCCESS", "durationMillis": 20000, "startTimeMillis": t0 + 10000},
+              {"name": "E2E", "status": "SUCCESS", "durationMillis": 40000, "startTimeMillis": t0 + 10000}]
+    metrics = analyze_pipeline_v2({"job_name": "par", "build_number": 1, "status": "SUCCESS",
+                                   "duration_seconds": 50.0, "stages": stages, "console_log": ""})
+    impact = {s["name"]: (s["impact_pct"], s["critical"]) for s in metrics["stage_analysis"]}
+    assert impact == {"Build": (20, True), "Unit": (20, False), "E2E": (60, True)}
+    assert metrics["timeline"]["wall_seconds"] == 50.0
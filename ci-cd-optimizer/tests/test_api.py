@@ -0,0 +1,58 @@
+import gzip
+import json
+import pytest
+import app as webapp
+
+@pytest.fixture
+def client(db, monkeypatch):
+    for n in range(1, 121):
+        db.save_analysis("team/app", n, "SUCCESS" if n % 10 else "FAILURE", 60 + n, score=80,
+                         stages=[{"name": "Build", "status": "SUCCESS", "durationMillis": 20000},
+                                 {"name": "Test", "status": "SUCCESS", "durationMillis": (40 + n) * 1000}],
+                         issues=[{"type": "NETWORK", "cause": "Connection refused", "suggestion": "Retry"}]
+                         if n % 10 == 0 else [])
+    monkeypatch.setitem(webapp.app.config, "TESTING", True)
+    return webapp.app.test_client()
+
+def test_keyset_pages_walk_the_whole_history(client):
+    seen, url = [], "/api/jobs/team/app/builds?limit=50"
+    while url:
+        page = client.get(url).get_json()
+        seen += [b["build_number"] for b in page["builds"]]
+        url = page["next"]
+    assert seen == list(range(120, 0, -1))
+
+    newer = client.get("/api/jobs/team/app/builds?after=115").get_json()
+    assert [b["build_number"] for b in newer["builds"]] == [116, 117, 118, 119, 120] and newer["next"] is None
+    assert client.get("/api/jobs").get_json() == {"jobs": [{"job_name": "team/app", "builds": 120, "last_build": 120}]}
+    assert client.get("/api/jobs/team/app/builds?limit=x").status_code == 400
+    assert client.get("/api/jobs/team/app/builds?before=5&after=1").status_code == 400
+    assert client.get("/api/jobs/team/app/builds?include=logs").status_code == 400
+
+def test_stages_issues_stats_and_chart(client):
+    build = client.get("/api/jobs/team/app/stages?limit=1").get_json()["builds"][0]
+    assert build["build_number"] == 120 and [s["name"] for s in build["stages"]] == ["Build", "Test"]
+    issues = client.get("/api/jobs/team/app/issues?before=101&limit=2").get_json()
+    assert [(b["build_number"], len(b["issues"])) for b in issues["builds"]] == [(100, 1), (99, 0)]
+    both = client.get("/api/jobs/team/app/builds?include=issues,stages&limit=1").get_json()["builds"][0]
+    assert "stages" in both and "issues" in both
+
+    stats = client.get("/api/jobs/team/app/stats").get_json()
+    assert stats["statistics"]["history_count"] == 108 and set(stats["stage_baselines"]) == {"Build", "Test"}
+    chart = client.get("/api/jobs/team/app/chart?limit=3").get_json()
+    assert chart["labels"] == ["#118", "#119", "#120"] and chart["durations"] == [178, 179, 180]
+
+def test_etag_revalidation_and_gzip(client, db):
+    resp = client.get("/api/jobs/team/app/builds?limit=100", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert len(json.loads(gzip.decompress(resp.data))["builds"]) == 100
+    etag = resp.headers["ETag"]
+
+    again = client.get("/api/jobs/team/app/builds?limit=100", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.data == b""
+    small = client.get("/api/jobs", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers
+
+    db.save_analysis("team/app", 121, "SUCCESS", 70)
+    changed = client.get("/api/jobs/team/app/builds?limit=100", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.get_json()["builds"][0]["build_number"] == 121
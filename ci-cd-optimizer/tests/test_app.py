@@ -0,0 +1,119 @@
+import io
+import json
+import pytest
+import threading
+import app as webapp
+from job_queue import AnalysisQueue
+
+DOC = {"job_name": "upload-demo", "build_number": 3, "status": "SUCCESS", "duration_seconds": 20,
+       "stages": [], "console_log": "step\n" * 1000 + "Connection refused\n"}
+
+@pytest.fixture
+def client(db, tmp_path, monkeypatch):
+    monkeypatch.setitem(webapp.app.config, "UPLOAD_FOLDER", str(tmp_path / "uploads"))
+    monkeypatch.setitem(webapp.app.config, "TESTING", True)
+    return webapp.app.test_client()
+
+def test_upload_is_analyzed_without_touching_disk(client, db, tmp_path):
+    resp = client.post("/upload", data={"file": (io.BytesIO(json.dumps(DOC).encode()), "build.json")},
+                       content_type="multipart/form-data")
+    assert resp.status_code == 200
+    assert b"Network/Connectivity Issue" in resp.data
+    assert db.get_job_history("upload-demo")[0]["build_number"] == 3
+    assert not (tmp_path / "uploads").exists()
+
+def test_raw_json_body_and_opt_in_archiving(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(webapp, "SAVE_UPLOADS", True)
+    (tmp_path / "uploads").mkdir()
+    for _ in range(2):
+        resp = client.post("/upload", data=json.dumps(DOC), content_type="application/json")
+        assert resp.status_code == 200
+    saved = sorted((tmp_path / "uploads").iterdir())
+    assert len(saved) == 2 and all(p.name.endswith("-upload.json") for p in saved) # No overwrites
+    assert json.loads(saved[0].read_text()) == DOC
+
+def test_invalid_and_oversized_uploads_redirect(client, monkeypatch):
+    resp = client.post("/upload", data={"file": (io.BytesIO(b"{not json"), "build.json")},
+                       content_type="multipart/form-data")
+    assert resp.status_code == 302
+
+    monkeypatch.setitem(webapp.app.config, "MAX_CONTENT_LENGTH", 1024)
+    resp = client.post("/upload", data={"file": (io.BytesIO(json.dumps(DOC).encode()), "build.json")},
+                       content_type="multipart/form-data")
+    assert resp.status_code == 302
+    with client.session_transaction() as session:
+        assert "limit" in session["_flashes"][-1][1]
+
+def test_uploaded_failures_are_ranked(client):
+    client.post("/upload", data=json.dumps(DOC), content_type="application/json")
+    top = client.get("/failures?days=0").get_json()
+    assert [(f["issue_type"], f["sample"], f["builds"]) for f in top] == [("NETWORK", "Connection refused", 1)]
+    assert client.get("/failures?days=x").status_code == 400
+    assert client.get("/failures?days=-3").status_code == 400
+    assert client.get("/failures?limit=0").status_code == 400
+    assert client.get("/failures?days=0&limit=100000").status_code == 200
+
+def test_fetch_jenkins_is_queued_and_polled(client, monkeypatch):
+    queue, gate, calls = AnalysisQueue(workers=1), threading.Event(), []
+    def analyze(job_name, build_number=None):
+        gate.wait(5)
+        calls.append((job_name, build_number))
+        metrics = webapp.analyze_pipeline_v2({**DOC, "job_name": job_name, "build_number": build_number or 6})
+        return {"metrics": metrics, "suggestions": [], "history": {"labels": [], "durations": [], "scores": []}, "top_failures": []}
+    monkeypatch.setattr(webapp, "get_analysis_queue", lambda: queue)
+    monkeypatch.setattr(webapp, "_analyze_jenkins_build", analyze)
+    monkeypatch.setenv("JENKINS_JOB_NAME", "demo")
+
+    resp = client.post("/fetch_jenkins", json={"build": 5})
+    assert resp.status_code == 202 and not resp.get_json()["coalesced"]
+    task_id = resp.get_json()["task_id"]
+    assert client.post("/fetch_jenkins", json={"build": 5}).get_json() == {**resp.get_json(), "coalesced": True}
+    assert client.post("/fetch_jenkins", json={"build": "x"}).status_code == 400
+    # "Last build" requests share one task, resolved by the worker
+    last = client.post("/fetch_jenkins", json={}).get_json()
+    assert last["task_id"] != task_id and last["build_number"] is None
+    assert client.post("/fetch_jenkins", json={}).get_json()["task_id"] == last["task_id"]
+
+    page = client.get(f"/fetch_jenkins/{task_id}")
+    assert b"Analyzing Pipeline" in page.data and b'http-equiv="refresh"' in page.data
+    gate.set()
+    queue.shutdown()
+
+    status = client.get(resp.get_json()["status_url"]).get_json()
+    assert status["state"] == "done" and status["result"]["metrics"]["build_number"] == 5
+    assert calls == [("demo", 5), ("demo", None)]
+    assert b"demo #5" in client.get(f"/fetch_jenkins/{task_id}").data
+    assert client.get("/tasks/nope").status_code == 404
+
+    # The dashboard form gets redirected to the result page
+    queue = AnalysisQueue(workers=1)
+    resp = client.post("/fetch_jenkins")
+    assert resp.status_code == 302 and "/fetch_jenkins/" in resp.headers["Location"]
+    queue.shutdown()
+
+def test_last_build_is_resolved_by_the_queued_task(client, monkeypatch):
+    resolved, fetched = [], []
+    def last_build(client, job_name):
+        resolved.append(job_name)
+        return (None, "Failed to get job info: 404") if job_name == "gone" else (9, None)
+    def fetch(*args, **kwargs):
+        fetched.append(kwargs["build_number"])
+        return None, "stop here"
+    monkeypatch.setattr(webapp, "get_last_build_number", last_build)
+    monkeypatch.setattr(webapp, "fetch_jenkins_data", fetch)
+    with pytest.raises(RuntimeError, match="404"):
+        webapp._analyze_jenkins_build("gone")
+    with pytest.raises(RuntimeError, match="stop here"):
+        webapp._analyze_jenkins_build("demo")
+    assert resolved == ["gone", "demo"] and fetched == [9]
+
+def test_backfill_count_is_clamped(client, monkeypatch):
+    counts = []
+    def fake_backfill(client, job_name, count):
+        counts.append(count)
+        return {"job_name": job_name, "requested": count}, None
+    monkeypatch.setattr(webapp, "backfill_job", fake_backfill)
+    monkeypatch.setattr(webapp, "BACKFILL_MAX_BUILDS", 500)
+    assert client.post("/backfill", json={"job": "demo", "count": 10 ** 9}).status_code == 200
+    assert client.post("/backfill", json={"job": "demo", "count": 0}).status_code == 400
+    assert counts == [500]
@@ -0,0 +1,39 @@
+from backfill import backfill_job
+from jenkins_fetch import JenkinsClient
+from test_jenkins_fetch import FakeResponse, FakeSession, JENKINS, WFAPI
+
+BUILD_LIST = {"builds": [
+    {"number": 12, "result": None, "duration": 0, "timestamp": 1700000300000},  # still running
+    {"number": 11, "result": "SUCCESS", "duration": 10000, "timestamp": 1700000200000},
+    {"number": 10, "result": "FAILURE", "duration": 7000, "timestamp": 1700000100000},
+]}
+
+def _client():
+    session = FakeSession({
+        f"{JENKINS}job/demo/api/json": FakeResponse(json_data=BUILD_LIST),
+        f"{JENKINS}job/demo/11/wfapi/describe": FakeResponse(json_data=WFAPI),
+    })
+    return JenkinsClient(JENKINS, session=session), session
+
+def test_backfill_seeds_history_in_bulk(db):
+    client, session = _client()
+    result, error = backfill_job(client, "demo", count=50)
+
+    assert error is None
+    assert result["fetched"] == 2 and result["inserted"] == 2
+    assert session.calls[0][1]["params"]["tree"] == "builds[number,result,duration,timestamp]{0,50}"
+
+    history = db.get_job_history("demo")
+    assert [(b["build_number"], b["result"]) for b in history] == [(11, "SUCCESS"), (10, "FAILURE")]
+    assert history[0]["timestamp"] == "2023-11-14 22:16:40"
+    assert [b["efficiency_score"] for b in history] == [None, None] # Not analyzed, so no score
+    stages = db.get_stage_history("demo")
+    assert [s["name"] for s in stages[11]] == ["Build", "Test"]
+    assert [s["name"] for s in stages[10]] == ["Full Build"]
+
+def test_backfill_does_not_overwrite_existing_builds(db):
+    db.save_build("demo", 11, "SUCCESS", 42.0, score=88)
+    client, _ = _client()
+    result, _ = backfill_job(client, "demo")
+    assert result["inserted"] == 1
+    assert db.get_job_history("demo")[0]["efficiency_score"] == 88
@@ -0,0 +1,45 @@
+import io
+import json
+import tarfile
+from bulk_ingest import ingest, iter_sources
+
+def _doc(number, duration=10.0, status="SUCCESS", console_log=""):
+    return {"job_name": "demo", "build_number": number, "status": status, "duration_seconds": duration,
+            "stages": [{"name": "Build", "status": "SUCCESS", "durationMillis": int(duration * 1000)}],
+            "console_log": console_log}
+
+def _bundle(tmp_path):
+    (tmp_path / "dir" / "nested").mkdir(parents=True)
+    (tmp_path / "dir" / "1.json").write_text(json.dumps(_doc(1)))
+    (tmp_path / "dir" / "nested" / "2.json").write_text(json.dumps(_doc(2)))
+    (tmp_path / "dir" / "broken.json").write_text("{not json")
+    (tmp_path / "dir" / "notes.txt").write_text("ignored")
+    (tmp_path / "more.jsonl").write_text(json.dumps(_doc(3)) + "\n\n" + json.dumps(_doc(4, status="FAILURE")) + "\n")
+
+    tar_path = tmp_path / "archive.tar.gz"
+    with tarfile.open(tar_path, "w:gz") as tar:
+        payload = json.dumps(_doc(5, duration=40.0, console_log="npm ERR! code E404\n")).encode()
+        info = tarfile.TarInfo("exports/5.json")
+        info.size = len(payload)
+        tar.addfile(info, io.BytesIO(payload))
+    return [str(tmp_path / "dir"), str(tmp_path / "more.jsonl"), str(tar_path)]
+
+def test_iter_sources_expands_directories_jsonl_and_tar(tmp_path):
+    labels = [label for label, _, _ in iter_sources(_bundle(tmp_path))]
+    assert [label.rsplit("/", 1)[-1] for label in labels] == [
+        "1.json", "broken.json", "2.json", "more.jsonl:1", "more.jsonl:3", "5.json"]
+
+def test_ingest_analyzes_in_pool_and_writes_in_batches(db, tmp_path):
+    summary_path = tmp_path / "summary.json"
+    summary = ingest(_bundle(tmp_path), workers=2, batch_size=2, summary_path=str(summary_path))
+
+    assert summary["inputs_total"] == 6 and summary["analyzed"] == 5 and summary["saved"] == 5
+    assert summary["error_count"] == 1 and summary["errors"][0]["source"].endswith("broken.json")
+    assert summary["jobs"] == {"demo": {"builds": 5, "failures": 1, "regressions": 0}}
+    assert summary["slowest"][0]["build_number"] == 5
+    assert summary["slowest"][0]["issues"] == ["DEPENDENCY_NODE"]
+    assert json.loads(summary_path.read_text())["analyzed"] == 5
+
+    history = db.get_job_history("demo")
+    assert [b["build_number"] for b in history] == [5, 4, 3, 2, 1]
+    assert db.get_job_statistics("demo")["total_builds"] == 5
@@ -0,0 +1,288 @@
+import random
+import threading
+import pytest
+
+STAGES = [
+    {"name": "Build", "status": "SUCCESS", "durationMillis": 4000},
+    {"name": "Test", "status": "FAILED", "durationMillis": 6000},
+]
+ISSUES = [{"type": "DOCKER", "cause": "Docker Infrastructure Failure", "suggestion": "Fix docker"}]
+
+def test_connection_uses_wal(db):
+    conn = db.get_connection()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1 # NORMAL
+    assert db.get_connection() is conn
+
+def test_connections_are_per_thread(db):
+    seen = []
+    t = threading.Thread(target=lambda: seen.append(db.get_connection()))
+    t.start(); t.join()
+    assert seen[0] is not db.get_connection()
+
+def test_save_analysis_persists_everything_in_one_transaction(db):
+    build_id = db.save_analysis("demo", 5, "FAILURE", 10.0, 40, stages=STAGES, issues=ISSUES)
+    c = db.get_connection()
+    assert [tuple(r) for r in c.execute("SELECT name, duration FROM stages WHERE build_id=?", (build_id,))] == \
+        [("Build", 4.0), ("Test", 6.0)]
+    assert [r[0] for r in c.execute("SELECT issue_type FROM log_analysis WHERE build_id=?", (build_id,))] == ["DOCKER"]
+
+def test_reanalysis_keeps_build_id_and_replaces_children(db):
+    first = db.save_analysis("demo", 5, "FAILURE", 10.0, 40, stages=STAGES, issues=ISSUES)
+    second = db.save_analysis("demo", 5, "SUCCESS", 8.0, 90, stages=STAGES[:1], issues=[])
+    assert first == second
+    c = db.get_connection()
+    assert c.execute("SELECT COUNT(*) FROM stages").fetchone()[0] == 1
+    assert c.execute("SELECT COUNT(*) FROM log_analysis").fetchone()[0] == 0
+    assert db.get_job_history("demo")[0]["result"] == "SUCCESS"
+
+def test_failed_bulk_write_rolls_back(db):
+    records = [
+        {"job_name": "demo", "build_number": 1, "status": "SUCCESS", "duration": 5.0, "stages": STAGES},
+        {"job_name": "demo", "build_number": 2, "status": "SUCCESS", "duration": 5.0, "stages": [{"name": "x"}]},
+    ]
+    assert db.save_analyses_bulk(records) == []
+    assert db.get_job_history("demo") == []
+
+def _baseline_rows(db):
+    c = db.get_connection()
+    return (c.execute("SELECT * FROM job_stats ORDER BY job_name").fetchall(),
+            c.execute("SELECT * FROM stage_baselines ORDER BY job_name, stage_name").fetchall())
+
+def test_bulk_write_updates_each_baseline_row_once(db):
+    records = [{"job_name": f"job{n % 2}", "build_number": n, "status": "SUCCESS" if n % 3 else "FAILURE",
+                "duration": 10.0 + n, "stages": _stages(Build=n, Test=2 * n)} for n in range(1, 41)]
+    records.append(dict(records[0], status="SUCCESS", stages=_stages(Build=1))) # Re-analysed in the same batch
+    for record in records:
+        db.save_analyses_bulk([record])
+    sequential = [[tuple(row) for row in rows] for rows in _baseline_rows(db)]
+
+    for table in ("builds", "stages", "job_stats", "stage_baselines"):
+        db.get_connection().execute(f"DELETE FROM {table}")
+    db.get_connection().commit()
+    statements = []
+    db.get_connection().set_trace_callback(statements.append)
+    try:
+        db.save_analyses_bulk(records)
+    finally:
+        db.get_connection().set_trace_callback(None)
+    assert [[tuple(row) for row in rows] for rows in _baseline_rows(db)] == sequential
+    assert sum("INSERT INTO job_stats" in sql for sql in statements) == 2 # One per job
+    assert sum("INSERT INTO stage_baselines" in sql for sql in statements) == 4 # One per (job, stage)
+
+def test_backfill_upserts_each_stage_baseline_once(db):
+    builds = [{"build_number": n, "status": "SUCCESS", "duration_seconds": 5.0 + n,
+               "stages": _stages(Build=n, Test=1, Deploy=2)} for n in range(60, 0, -1)] # Newest first, as Jenkins lists them
+    statements = []
+    db.get_connection().set_trace_callback(statements.append)
+    try:
+        assert db.save_builds_bulk("demo", builds) == 60
+    finally:
+        db.get_connection().set_trace_callback(None)
+    assert sum("INSERT INTO stage_baselines" in sql for sql in statements) == 3
+    assert sum("INSERT INTO job_stats" in sql for sql in statements) == 1
+    baselines = db.get_stage_baselines("demo")
+    assert baselines["Build"]["count"] == db.STAGE_WINDOW and baselines["Build"]["mean"] == pytest.approx(55.5)
+
+def test_concurrent_writers_do_not_lock(db):
+    errors = []
+    def writer(offset):
+        for n in range(50):
+            if db.save_analysis("demo", offset + n, "SUCCESS", 1.0, stages=STAGES) is None:
+                errors.append(n)
+        db.close_connection()
+    threads = [threading.Thread(target=writer, args=(i * 100,)) for i in range(4)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert errors == []
+    assert len(db.get_job_history("demo", limit=1000)) == 200
+
+def legacy_statistics(db, job_name, limit=20):
+    # Reference: recompute from the raw builds table, as get_job_statistics used to
+    rows = db.get_connection().execute(
+        "SELECT result, total_duration FROM builds WHERE job_name=? ORDER BY build_number DESC LIMIT ?",
+        (job_name, limit)).fetchall()
+    if not rows:
+        return {'avg_duration': 0, 'std_dev': 0, 'failure_rate': 0, 'total_builds': 0}
+    failures = sum(1 for r in rows if r[0] != 'SUCCESS')
+    durations = [r[1] for r in rows if r[0] == 'SUCCESS']
+    failure_rate = failures / len(rows) * 100
+    if not durations:
+        return {'avg_duration': 0, 'std_dev': 0, 'failure_rate': failure_rate, 'total_builds': len(rows)}
+    avg = sum(durations) / len(durations)
+    std = (sum((d - avg) ** 2 for d in durations) / len(durations)) ** 0.5
+    return {'avg_duration': avg, 'std_dev': std, 'failure_rate': failure_rate, 'total_builds': len(rows)}
+
+def assert_stats_equal(actual, expected):
+    assert actual.keys() >= expected.keys()
+    for key in expected:
+        assert actual[key] == pytest.approx(expected[key], rel=1e-9, abs=1e-9), key
+
+def test_job_stats_track_rolling_window(db):
+    rng = random.Random(7)
+    builds = list(range(1, 60))
+    rng.shuffle(builds) # Out-of-order arrival, like backfill after live analyses
+    for n in builds:
+        result = "SUCCESS" if rng.random() > 0.3 else "FAILURE"
+        db.save_analysis("demo", n, result, rng.uniform(30, 300), stages=STAGES)
+        assert_stats_equal(db.get_job_statistics("demo"), legacy_statistics(db, "demo"))
+
+    # Re-analysis of an existing build replaces its contribution
+    db.save_analysis("demo", 59, "FAILURE", 999.0)
+    assert_stats_equal(db.get_job_statistics("demo"), legacy_statistics(db, "demo"))
+    assert_stats_equal(db.get_job_statistics("demo", limit=5), legacy_statistics(db, "demo", limit=5))
+
+def test_job_stats_follow_bulk_backfill(db):
+    builds = [{"build_number": n, "status": "SUCCESS", "duration_seconds": float(n), "stages": []} for n in range(30)]
+    db.save_builds_bulk("demo", builds)
+    assert_stats_equal(db.get_job_statistics("demo"), legacy_statistics(db, "demo"))
+
+def test_job_stats_seeded_for_existing_databases(db):
+    for n in range(5):
+        db.save_analysis("demo", n, "SUCCESS", 10.0 + n)
+    db.get_connection().execute("DELETE FROM job_stats")
+    db.get_connection().commit()
+    db.init_db()
+    assert_stats_equal(db.get_job_statistics("demo"), legacy_statistics(db, "demo"))
+
+def _stages(**durations):
+    return [{"name": name, "status": "SUCCESS", "durationMillis": int(sec * 1000)} for name, sec in durations.items()]
+
+def test_stage_baselines_keep_recent_runs(db):
+    for n in range(1, 16):
+        db.save_analysis("demo", n, "SUCCESS", 10.0, stages=_stages(Build=n, Test=2))
+    baselines = db.get_stage_baselines("demo")
+    recent = list(range(6, 16)) # STAGE_WINDOW newest builds
+    assert baselines["Build"]["count"] == 10
+    assert baselines["Build"]["mean"] == pytest.approx(sum(recent) / 10)
+    assert baselines["Build"]["p50"] == pytest.approx(10.5)
+    assert baselines["Build"]["p90"] == pytest.approx(14.1)
+    assert baselines["Test"]["std_dev"] == pytest.approx(0)
+
+def test_stage_baselines_follow_reanalysis(db):
+    db.save_analysis("demo", 1, "SUCCESS", 10.0, stages=_stages(Build=4, Lint=1))
+    db.save_analysis("demo", 2, "SUCCESS", 10.0, stages=_stages(Build=6))
+    db.save_analysis("demo", 1, "SUCCESS", 10.0, stages=_stages(Build=8))
+    baselines = db.get_stage_baselines("demo")
+    assert baselines["Build"]["mean"] == pytest.approx(7)
+    assert "Lint" not in baselines
+
+def test_stage_baselines_seeded_for_existing_databases(db):
+    db.save_builds_bulk("demo", [{"build_number": n, "status": "SUCCESS", "duration_seconds": 5.0,
+                                  "stages": _stages(Build=n)} for n in range(1, 4)])
+    expected = db.get_stage_baselines("demo")
+    assert expected["Build"]["mean"] == pytest.approx(2)
+    db.get_connection().execute("DELETE FROM stage_baselines")
+    db.get_connection().commit()
+    db.init_db()
+    assert db.get_stage_baselines("demo") == expected
+
+def test_job_sketch_gives_robust_quantiles(db):
+    durations = [100.0 + (n % 10) for n in range(200)] + [5000.0] # One pathological outlier
+    for n, duration in enumerate(durations):
+        db.save_analysis("demo", n, "SUCCESS", duration)
+    db.save_analysis("demo", 0, "SUCCESS", 100.0) # Re-analysis is not double counted
+    stats = db.get_job_statistics("demo")
+    assert stats["history_count"] == len(durations)
+    assert stats["history_p50"] == pytest.approx(104.5, rel=0.02)
+    assert stats["history_p90"] == pytest.approx(109, rel=0.02)
+    assert 3 < stats["robust_sigma"] < 5
+
+def test_sketches_follow_reanalysis_and_count_only_successes(db):
+    for n in range(1, 6):
+        db.save_analysis("demo", n, "SUCCESS", 100.0, stages=[
+            {"name": "Build", "durationMillis": 60000, "status": "SUCCESS"},
+            {"name": "Test", "durationMillis": 1000, "status": "FAILED" if n == 5 else "SUCCESS"}])
+    db.save_analysis("demo", 6, "FAILURE", 900.0)
+    db.save_analysis("demo", 6, "SUCCESS", 40.0) # Rebuilt: the fixed result replaces the failure
+    db.save_analysis("demo", 1, "SUCCESS", 40.0) # Re-analysed with a new duration
+    stats = db.get_job_statistics("demo")
+    assert stats["history_count"] == 6
+    assert stats["history_p50"] == pytest.approx(100, rel=0.02)
+    baselines = db.get_stage_baselines("demo")
+    assert baselines["Test"]["history_count"] == 3 # Failed runs and build 1's dropped stages left the sketch
+    assert baselines["Build"]["history_count"] == 4
+
+def test_summed_durations_are_rebaselined_by_the_first_wall_clock_build(db):
+    c = db.get_connection()
+    c.executemany("INSERT INTO builds (job_name, build_number, result, total_duration) VALUES ('demo', ?, 'SUCCESS', 300)",
+                  [(n,) for n in range(1, 11)]) # Stored before the switch: summed parallel stages
+    c.execute("DELETE FROM job_stats")
+    c.commit()
+    db.init_db()
+    assert db.get_job_statistics("demo")["avg_duration"] == 300
+    db.save_analysis("demo", 11, "SUCCESS", 120.0)
+    stats = db.get_job_statistics("demo")
+    assert stats["avg_duration"] == 120 and stats["total_builds"] == 1 and stats["history_count"] == 1
+    db.get_connection().execute("DELETE FROM job_stats")
+    db.get_connection().commit()
+    db.init_db() # Replaying the history re-baselines the same way
+    assert db.get_job_statistics("demo")["total_builds"] == 1
+
+def test_sketch_columns_added_to_older_tables(db):
+    c = db.get_connection()
+    c.execute("DROP TABLE job_stats")
+    c.execute("""CREATE TABLE job_stats (job_name TEXT PRIMARY KEY, recent_builds TEXT NOT NULL,
+                 total_builds INTEGER NOT NULL, failures INTEGER NOT NULL, success_count INTEGER NOT NULL,
+                 success_sum REAL NOT NULL, success_sum_sq REAL NOT NULL)""")
+    c.executemany("INSERT INTO builds (job_name, build_number, result, total_duration) VALUES ('demo', ?, 'SUCCESS', 10)",
+                  [(n,) for n in range(3)])
+    c.execute("INSERT INTO job_stats VALUES ('demo', '[]', 0, 0, 0, 0, 0)")
+    c.commit()
+    db.init_db()
+    assert db.get_job_statistics("demo")["history_count"] == 3
+
+def test_reads_are_cached_until_the_job_is_written(db):
+    db.save_analysis("job", 1, "SUCCESS", 10.0, stages=STAGES)
+    db.save_analysis("other", 1, "SUCCESS", 10.0)
+    db.get_job_history("job", limit=20)
+    db.get_job_statistics("job")
+    db.get_job_history("other", limit=20)
+    before = db.get_cache_stats()
+
+    assert len(db.get_job_history("job", limit=20)) == 1
+    db.get_job_statistics("job")["total_builds"] = 99 # Callers get their own copy
+    assert db.get_job_statistics("job")["total_builds"] == 1
+    assert db.get_cache_stats()["hits"] - before["hits"] == 3
+
+    db.save_analysis("job", 2, "SUCCESS", 12.0, stages=STAGES)
+    assert len(db.get_job_history("job", limit=20)) == 2
+    assert db.get_job_statistics("job")["total_builds"] == 2
+    assert "Build" in db.get_stage_baselines("job")
+    hits = db.get_cache_stats()["hits"]
+    db.get_job_history("other", limit=20) # Untouched job stays cached
+    assert db.get_cache_stats()["hits"] == hits + 1
+
+def test_bulk_and_stage_writes_invalidate(db):
+    build_id = db.save_build("job", 1, "SUCCESS", 10.0)
+    assert db.get_stage_history("job") == {}
+    db.save_stages(build_id, STAGES)
+    assert len(db.get_stage_history("job")[1]) == 2
+    db.save_builds_bulk("job", [{"build_number": 2, "status": "SUCCESS", "duration_seconds": 5.0, "stages": []}])
+    assert [b["build_number"] for b in db.get_job_history("job")] == [2, 1]
+
+def _failure(fingerprint, hits=1):
+    return {"fingerprint": fingerprint, "type": "NETWORK", "normalized": f"norm {fingerprint}",
+            "sample": f"sample {fingerprint}", "hits": hits}
+
+def test_failure_fingerprints_count_builds_once(db):
+    db.save_analysis("a", 1, "FAILURE", 10.0, failures=[_failure("f1", 3), _failure("f2")])
+    db.save_analysis("b", 1, "FAILURE", 10.0, failures=[_failure("f1")])
+    db.save_analysis("a", 1, "FAILURE", 10.0, failures=[_failure("f1", 5)]) # Re-analysis: f2 gone
+    db.save_analysis("a", 2, "SUCCESS", 10.0) # Unknown failures leave nothing behind
+
+    top = db.get_top_failures()
+    assert [(f["fingerprint"], f["builds"], f["jobs"], f["hits"], f["total_builds"]) for f in top] == \
+        [("f1", 2, 2, 6, 2)]
+    assert top[0]["sample"] == "sample f1" and top[0]["first_seen"] <= top[0]["last_seen"]
+    c = db.get_connection()
+    assert c.execute("SELECT 1 FROM failure_fingerprints WHERE fingerprint='f2'").fetchone() is None
+
+def test_top_failures_respect_the_time_window(db):
+    old = db.save_analysis("a", 1, "FAILURE", 10.0, failures=[_failure("old")])
+    db.save_analysis("a", 2, "FAILURE", 10.0, failures=[_failure("new")])
+    c = db.get_connection()
+    c.execute("UPDATE fingerprint_occurrences SET seen_at = datetime('now', '-30 days') WHERE build_id=?", (old,))
+    c.commit()
+    assert [f["fingerprint"] for f in db.get_top_failures(since_days=7)] == ["new"]
+    assert {f["fingerprint"] for f in db.get_top_failures(since_days=None)} == {"old", "new"}
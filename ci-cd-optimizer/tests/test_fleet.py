@@ -0,0 +1,31 @@
+from fleet import scan_fleet, rank_fleet
+from jenkins_fetch import JenkinsClient
+from test_jenkins_fetch import FakeResponse, FakeSession, JENKINS, WFAPI, CONSOLE
+
+def _row(name, duration, increase, risk, score=50):
+    return {'job_name': name, 'duration': duration, 'increase_percent': increase,
+            'risk_probability': risk, 'efficiency_score': score}
+
+def test_rank_fleet_orders_each_ranking():
+    rows = [_row("a", 100, 0, 10), _row("b", 300, 40, 55), _row("c", 200, 90, 55, score=20)]
+    report = rank_fleet(rows, top=2)
+    assert [r['job_name'] for r in report['slowest']] == ["b", "c"]
+    assert [r['job_name'] for r in report['most_regressed']] == ["c", "b"]
+    assert [r['job_name'] for r in report['riskiest']] == ["c", "b"]
+
+def test_scan_fleet_analyzes_every_job(db):
+    routes = {}
+    for name, number in (("web", 3), ("team/api", 9)):
+        path = "job/" + "/job/".join(name.split("/"))
+        routes[f"{JENKINS}{path}/api/json"] = FakeResponse(json_data={"lastBuild": {"number": number}})
+        routes[f"{JENKINS}{path}/{number}/consoleText"] = FakeResponse(content=CONSOLE)
+        routes[f"{JENKINS}{path}/{number}/wfapi/describe"] = FakeResponse(json_data=WFAPI)
+    client = JenkinsClient(JENKINS, session=FakeSession(routes))
+
+    report = scan_fleet(client, job_names=["web", "team/api", "missing"], max_workers=2)
+
+    assert report['jobs_total'] == 3
+    assert report['jobs_analyzed'] == 2
+    assert [e['job_name'] for e in report['errors']] == ["missing"]
+    assert {r['job_name'] for r in report['slowest']} == {"web", "team/api"}
+    assert report['riskiest'][0]['issues'] == ["DOCKER"]
@@ -0,0 +1,345 @@
+import time
+import threading
+import pytest
+import jenkins_fetch
+from jenkins_fetch import fetch_jenkins_data, JenkinsClient, get_client
+
+JENKINS = "http://jenkins.local/"
+
+WFAPI = {
+    "status": "FAILED",
+    "stages": [
+        {"name": "Build", "status": "SUCCESS", "durationMillis": 4000, "startTimeMillis": 1000},
+        {"name": "Test", "status": "FAILED", "durationMillis": 6000, "startTimeMillis": 5000},
+    ]
+}
+
+CONSOLE = b"Started\n" + b"compiling...\n" * 5000 + b"Cannot connect to the Docker daemon\nFinished: FAILURE\n"
+
+class FakeResponse:
+    encoding = "utf-8"
+
+    def __init__(self, status_code=200, json_data=None, content=b"", headers=None):
+        self.status_code = status_code
+        self._json = json_data
+        self.content = content
+        self.headers = headers or {}
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return self._json
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise jenkins_fetch.requests.exceptions.HTTPError(f"{self.status_code}")
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class FakeSession:
+    """Stands in for requests.Session: routes URLs to canned responses and records calls."""
+    def __init__(self, routes=None, handler=None):
+        self.routes = routes or {}
+        self.handler = handler
+        self.calls = []
+        self.auth = None
+        self.headers = {}
+
+    def get(self, url, **kwargs):
+        self.calls.append((url, kwargs))
+        if self.handler:
+            return self.handler(url, **kwargs)
+        return self.routes.get(url, FakeResponse(status_code=404))
+
+@pytest.fixture
+def fake_jenkins():
+    routes = {
+        f"{JENKINS}job/demo/api/json": FakeResponse(json_data={"lastBuild": {"number": 7}}),
+        f"{JENKINS}job/demo/7/consoleText": FakeResponse(content=CONSOLE),
+        f"{JENKINS}job/demo/7/wfapi/describe": FakeResponse(json_data=WFAPI),
+    }
+    session = FakeSession(routes)
+    return JenkinsClient(JENKINS, "u", "t", session=session), session
+
+def test_fetch_buffers_console_by_default(fake_jenkins):
+    client, session = fake_jenkins
+    data, error = fetch_jenkins_data(JENKINS, "demo", "u", "t", client=client)
+    assert error is None
+    assert data["console_log"] == CONSOLE.decode("utf-8")
+    assert "log_issues" not in data
+
+def test_fetch_streams_console_into_scanner(fake_jenkins, monkeypatch):
+    monkeypatch.setattr(jenkins_fetch, "CONSOLE_CHUNK_SIZE", 1000)
+    client, session = fake_jenkins
+    data, error = fetch_jenkins_data(JENKINS, "demo", "u", "t", stream_console=True, client=client)
+    assert error is None
+    assert data["console_log"] == ""
+    assert [i["type"] for i in data["log_issues"]] == ["DOCKER"]
+    assert data["console_bytes"] == len(CONSOLE)
+    console_call = next(kw for url, kw in session.calls if url.endswith("consoleText"))
+    assert console_call["stream"] is True
+
+def test_tailer_fetches_only_new_bytes(monkeypatch):
+    # Simulates a running build whose console grows between polls
+    log = b"Building\n" * 100 + b"Build timed out (after 5 minutes)\n" + b"Cleanup\n" * 100
+    sizes = [300, 900, len(log)]
+    requested = []
+
+    def fake_get(url, params=None, **kwargs):
+        start = params["start"]
+        requested.append(start)
+        end = sizes[len(requested) - 1]
+        headers = {"X-Text-Size": str(end)}
+        if end < len(log):
+            headers["X-More-Data"] = "true"
+        return FakeResponse(content=log[start:end], headers=headers)
+
+    monkeypatch.setattr(jenkins_fetch.time, "sleep", lambda s: None)
+
+    found = []
+    client = JenkinsClient(JENKINS, session=FakeSession(handler=fake_get))
+    tailer = jenkins_fetch.ProgressiveLogTailer(client, "demo", 8)
+    issues = tailer.follow(interval=0, on_issue=found.append)
+
+    assert requested == [0, 300, 900]
+    assert tailer.bytes_transferred == len(log)
+    assert [i["type"] for i in found] == ["TIMEOUT"]
+    assert issues == found
+
+def test_tail_command_follows_the_last_build(monkeypatch, capsys):
+    import json
+    import cli
+    def handler(url, params=None, **kwargs):
+        if url.endswith("job/demo/api/json"):
+            return FakeResponse(json_data={"lastBuild": {"number": 8}})
+        if url.endswith("job/demo/8/logText/progressiveText"):
+            return FakeResponse(content=b"npm ERR! code E404\n", headers={"X-Text-Size": "19"})
+        return FakeResponse(status_code=404)
+    session = FakeSession(handler=handler)
+    monkeypatch.setattr(cli, "_jenkins_client", lambda args: JenkinsClient(JENKINS, session=session))
+
+    assert cli.main(["tail", "demo", "--interval", "0"]) == 0
+    report = json.loads(capsys.readouterr().out)
+    assert [i["type"] for i in report["issues"]] == ["DEPENDENCY_NODE"]
+    assert [url for url, _ in session.calls] == [f"{JENKINS}job/demo/api/json",
+                                                 f"{JENKINS}job/demo/8/logText/progressiveText"]
+    assert cli.main(["tail", "missing"]) == 1
+
+def test_client_counts_latency_per_label(fake_jenkins):
+    client, session = fake_jenkins
+    fetch_jenkins_data(JENKINS, "demo", "u", "t", client=client)
+    stats = client.stats()
+    assert set(stats) == {"job_info", "console", "wfapi"}
+    assert all(entry["count"] == 1 and entry["errors"] == 0 for entry in stats.values())
+    assert session.auth == ("u", "t")
+
+def test_client_pools_and_retries():
+    client = JenkinsClient(JENKINS, "u", "t", pool_size=4, retries=5)
+    adapter = client.session.get_adapter(JENKINS)
+    assert adapter._pool_maxsize == 4
+    assert adapter.max_retries.total == 5
+    assert set(adapter.max_retries.status_forcelist) == {429, 502, 503}
+
+def test_get_client_is_shared_per_controller():
+    a = get_client("http://shared.local", "u", "t")
+    assert get_client("http://shared.local/", "u", "t") is a
+    assert get_client("http://shared.local", "other", "t") is not a
+
+def test_console_and_wfapi_are_fetched_concurrently(fake_jenkins):
+    client, session = fake_jenkins
+    wfapi_started = threading.Event()
+
+    def handler(url, **kwargs):
+        if url.endswith("wfapi/describe"):
+            wfapi_started.set()
+        elif url.endswith("consoleText"):
+            # Only completes if the WFAPI call is in flight at the same time
+            assert wfapi_started.wait(timeout=5)
+        return session.routes.get(url, FakeResponse(status_code=404))
+
+    session.handler = handler
+    data, error = fetch_jenkins_data(JENKINS, "demo", "u", "t", client=client)
+    assert error is None
+    assert data["console_log"] == CONSOLE.decode("utf-8")
+    assert [s["name"] for s in data["stages"]] == ["Build", "Test"]
+
+def test_falls_back_to_standard_api(fake_jenkins):
+    client, session = fake_jenkins
+    del session.routes[f"{JENKINS}job/demo/7/wfapi/describe"]
+    session.routes[f"{JENKINS}job/demo/7/api/json"] = FakeResponse(
+        json_data={"number": 7, "result": "FAILURE", "duration": 9000, "timestamp": 1000})
+    data, error = fetch_jenkins_data(JENKINS, "demo", "u", "t", stream_console=True, client=client)
+    assert error is None
+    assert data["status"] == "FAILURE"
+    assert data["stages"][0]["name"] == "Full Build"
+    assert [i["type"] for i in data["log_issues"]] == ["DOCKER"]
+
+def test_reports_error_when_both_apis_fail(fake_jenkins):
+    client, session = fake_jenkins
+    del session.routes[f"{JENKINS}job/demo/7/wfapi/describe"]
+    data, error = fetch_jenkins_data(JENKINS, "demo", "u", "t", client=client)
+    assert data is None
+    assert "both failed" in error
+
+class SlowConsole(FakeResponse):
+    """A console that trickles in; counts the chunks actually read. .content reads it all, like requests."""
+    def __init__(self):
+        self.status_code, self.headers, self.chunks = 200, {}, 0
+
+    @property
+    def content(self):
+        return b"".join(self.iter_content())
+
+    def iter_content(self, chunk_size=1):
+        for _ in range(5000):
+            time.sleep(0.001)
+            self.chunks += 1
+            yield b"compiling...\n"
+
+@pytest.mark.parametrize("stream_console", [False, True])
+def test_missing_build_stops_the_console_download(fake_jenkins, stream_console):
+    client, session = fake_jenkins
+    console = session.routes[f"{JENKINS}job/demo/7/consoleText"] = SlowConsole()
+    del session.routes[f"{JENKINS}job/demo/7/wfapi/describe"]
+    started = time.perf_counter()
+    data, error = fetch_jenkins_data(JENKINS, "demo", "u", "t", stream_console=stream_console, client=client)
+    assert data is None and "both failed" in error
+    assert console.chunks < 5000 and time.perf_counter() - started < 3
+
+def test_job_path_handles_folders():
+    assert jenkins_fetch.job_path("demo") == "job/demo"
+    assert jenkins_fetch.job_path("team/api/main") == "job/team/job/api/job/main"
+
+def test_list_jobs_walks_folders():
+    top = {"jobs": [
+        {"_class": "org.jenkinsci.plugins.workflow.job.WorkflowJob", "name": "web"},
+        {"_class": "com.cloudbees.hudson.plugins.folder.Folder", "name": "team", "jobs": [
+            {"_class": "org.jenkinsci.plugins.workflow.job.WorkflowJob", "name": "api"},
+            {"_class": "com.cloudbees.hudson.plugins.folder.Folder", "name": "deep"},
+        ]},
+    ]}
+    deep = {"jobs": [{"_class": "hudson.model.FreeStyleProject", "name": "legacy"}]}
+    session = FakeSession({
+        f"{JENKINS}api/json": FakeResponse(json_data=top),
+        f"{JENKINS}job/team/job/deep/api/json": FakeResponse(json_data=deep),
+    })
+    client = JenkinsClient(JENKINS, session=session)
+    assert jenkins_fetch.list_jobs(client, depth=2) == ["web", "team/api", "team/deep/legacy"]
+    assert session.calls[0][1]["params"]["tree"] == "jobs[name,url,jobs[name,url]]"
+
+def test_rate_limiter_spaces_requests(monkeypatch):
+    clock = [100.0]
+    sleeps = []
+    monkeypatch.setattr(jenkins_fetch.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(jenkins_fetch.time, "sleep", sleeps.append)
+    limiter = jenkins_fetch.RateLimiter(rate=4)
+    for _ in range(3):
+        limiter.acquire()
+    assert sleeps == [0.25, 0.5]
+
+def test_requests_use_tree_projections_and_gzip(fake_jenkins):
+    client, session = fake_jenkins
+    del session.routes[f"{JENKINS}job/demo/7/wfapi/describe"]
+    session.routes[f"{JENKINS}job/demo/7/api/json"] = FakeResponse(
+        json_data={"number": 7, "result": "SUCCESS", "duration": 9000, "timestamp": 1000})
+    fetch_jenkins_data(JENKINS, "demo", "u", "t", client=client)
+
+    params = {url: kw.get("params", {}).get("tree") for url, kw in session.calls}
+    assert params[f"{JENKINS}job/demo/api/json"] == "lastBuild[number]"
+    assert params[f"{JENKINS}job/demo/7/api/json"] == "number,result,duration,timestamp"
+    assert "gzip" in session.headers["Accept-Encoding"]
+
+    stats = client.stats()
+    assert stats["console"]["bytes"] == len(CONSOLE)
+    assert stats["job_info"]["parse_ms"] >= 0
+
+@pytest.mark.parametrize("stream_console", [True, False])
+def test_fetch_archives_full_console(fake_jenkins, db, tmp_path, monkeypatch, stream_console):
+    from log_store import LogStore
+    monkeypatch.setattr(jenkins_fetch, "CONSOLE_CHUNK_SIZE", 10)
+    client, session = fake_jenkins
+    store = LogStore(str(tmp_path / "logs"))
+    data, error = fetch_jenkins_data(JENKINS, "demo", "u", "t", stream_console=stream_console,
+                                     client=client, log_store=store)
+    assert error is None
+    assert data["log_digest"] == db.get_build_log("demo", 7)["digest"]
+    assert store.read("demo", 7) == CONSOLE.decode("utf-8") # Not cut short by the early stop
+
+def _stage_routes(base):
+    """wfapi routes for a build whose stages link to their step logs (hrefs carry the /ci context path)."""
+    wfapi = {"status": "FAILED", "stages": [
+        {"id": "6", "name": "Build", "status": "SUCCESS", "durationMillis": 4000, "startTimeMillis": 1000},
+        {"id": "9", "name": "Test", "status": "FAILED", "durationMillis": 6000, "startTimeMillis": 5000},
+    ]}
+    def stage(node_ids):
+        return {"stageFlowNodes": [{"id": n, "_links": {"log": {"href": f"/ci/job/demo/7/execution/node/{n}/wfapi/log"}}}
+                                   for n in node_ids]}
+    def log(text):
+        return {"text": text, "hasMore": False}
+    return {
+        f"{base}job/demo/api/json": FakeResponse(json_data={"lastBuild": {"number": 7}}),
+        f"{base}job/demo/7/consoleText": FakeResponse(content=CONSOLE),
+        f"{base}job/demo/7/wfapi/describe": FakeResponse(json_data=wfapi),
+        f"{base}job/demo/7/execution/node/6/wfapi/describe": FakeResponse(json_data=stage(["7"])),
+        f"{base}job/demo/7/execution/node/9/wfapi/describe": FakeResponse(json_data=stage(["10", "11"])),
+        f"{base}job/demo/7/execution/node/7/wfapi/log": FakeResponse(json_data=log("<b>compiled</b>\n")),
+        f"{base}job/demo/7/execution/node/10/wfapi/log": FakeResponse(json_data=log("running &amp; tests\n")),
+        f"{base}job/demo/7/execution/node/11/wfapi/log": FakeResponse(
+            json_data=log('<span class="timestamp">12:00</span> Cannot connect to the Docker daemon\n')),
+    }
+
+def test_stage_logs_scope_issues_and_skip_unchanged_healthy_stages(db):
+    from analyzer import analyze_pipeline_v2
+    base = "http://jenkins.local/ci/"
+    session = FakeSession(_stage_routes(base))
+    client = JenkinsClient(base, "u", "t", session=session)
+
+    data, error = fetch_jenkins_data(base, "demo", "u", "t", client=client, stage_logs=True)
+    assert error is None
+    issues = {s["name"]: [i["type"] for i in s["log_issues"]] for s in data["stages"]}
+    assert issues == {"Build": [], "Test": ["DOCKER"]}
+    metrics = analyze_pipeline_v2(data)
+    assert [[i["type"] for i in s["issues"]] for s in metrics["stage_analysis"]] == [[], ["DOCKER"]]
+
+    # Re-fetching the same build: the healthy stage's stored findings are reused without requests
+    session.calls.clear()
+    data, _ = fetch_jenkins_data(base, "demo", "u", "t", client=client, stage_logs=True,
+                                 previous_stage_logs=db.get_stage_log_scans("demo", 7))
+    urls = [url for url, _ in session.calls]
+    assert not any("/node/6/" in url or "/node/7/" in url for url in urls)
+    assert f"{base}job/demo/7/execution/node/11/wfapi/log" in urls
+    assert [s["log_issues"] for s in data["stages"]][1][0]["type"] == "DOCKER"
+    assert db.get_stage_log_scans("demo", 7)["Build"]["issues"] == []
+
+def test_failed_stage_log_does_not_fail_the_build_fetch():
+    base = "http://jenkins.local/ci/"
+    routes = _stage_routes(base)
+    def handler(url, **kwargs):
+        if url.endswith("/node/11/wfapi/log"):
+            raise jenkins_fetch.requests.exceptions.ReadTimeout("slow node log")
+        return routes.get(url, FakeResponse(status_code=404))
+    client = JenkinsClient(base, "u", "t", session=FakeSession(handler=handler))
+
+    data, error = fetch_jenkins_data(base, "demo", "u", "t", stream_console=True, client=client, stage_logs=True)
+    assert error is None
+    assert [i["type"] for i in data["log_issues"]] == ["DOCKER"] # The console scan is kept
+    build, test = data["stages"]
+    assert build["log_issues"] == [] and "log_signature" in build
+    # The failed stage stays unsigned, so the next fetch scans it again
+    assert "log_issues" not in test and "log_signature" not in test
+
+def test_fetch_options_follow_the_environment(monkeypatch):
+    monkeypatch.setenv("JENKINS_STREAM_CONSOLE", "false")
+    monkeypatch.setenv("JENKINS_ARCHIVE_LOGS", "false")
+    monkeypatch.delenv("JENKINS_STAGE_LOGS", raising=False)
+    assert jenkins_fetch.fetch_options_from_env() == {"stream_console": False, "log_store": None, "stage_logs": True}
@@ -0,0 +1,59 @@
+import threading
+import pytest
+from job_queue import AnalysisQueue, QueueFull
+
+def _wait(queue, task_id):
+    for _ in range(200):
+        task = queue.status(task_id)
+        if task["state"] in ("done", "failed"):
+            return task
+        threading.Event().wait(0.01)
+    raise AssertionError("task did not finish")
+
+def test_duplicate_keys_are_coalesced_while_pending():
+    queue, gate, calls = AnalysisQueue(workers=2), threading.Event(), []
+    def work(n):
+        gate.wait(5)
+        calls.append(n)
+        return n * 2
+
+    first, coalesced = queue.submit(("jenkins", "demo", 7), work, 7)
+    assert not coalesced
+    assert queue.submit(("jenkins", "demo", 7), work, 7) == (first, True)
+    other, _ = queue.submit(("jenkins", "demo", 8), work, 8)
+    assert other != first
+    gate.set()
+
+    task = _wait(queue, first)
+    assert task["result"] == 14 and task["coalesced"] == 1 and "key" not in task
+    _wait(queue, other)
+    assert sorted(calls) == [7, 8]
+    # Once finished, the same key starts a fresh analysis
+    assert queue.submit(("jenkins", "demo", 7), work, 7)[0] != first
+    queue.shutdown()
+
+def test_failures_are_reported_and_results_expire():
+    queue = AnalysisQueue(workers=1, result_ttl=0)
+    def boom():
+        raise RuntimeError("Failed to fetch data: 401")
+    task_id, _ = queue.submit("k", boom)
+    queue.shutdown()
+    queue._tasks[task_id]["finished_at"] -= 1
+    assert queue.status(task_id) is None
+    assert queue.status("missing") is None
+
+    queue = AnalysisQueue(workers=1)
+    task = _wait(queue, queue.submit("k", boom)[0])
+    assert task["state"] == "failed" and task["error"] == "Failed to fetch data: 401"
+    queue.shutdown()
+
+def test_backlog_is_capped():
+    queue, gate = AnalysisQueue(workers=1, max_pending=2), threading.Event()
+    queue.submit("a", gate.wait, 5)
+    queue.submit("b", gate.wait, 5)
+    with pytest.raises(QueueFull):
+        queue.submit("c", gate.wait, 5)
+    assert queue.submit("a", gate.wait, 5)[1] # Joining a pending task is always allowed
+    assert queue.stats()["queued"] + queue.stats()["running"] == 2
+    gate.set()
+    queue.shutdown()
@@ -0,0 +1,178 @@
+import re
+import pytest
+from log_parser import LogIntelligenceEngine, LogStreamScanner, _compile_patterns, _fold_literals
+
+def legacy_analyze(console_text):
+    # Reference implementation: one re.search per pattern per category
+    issues = []
+    if not console_text:
+        return issues
+    for issue_type, rules in LogIntelligenceEngine.PATTERNS.items():
+        for pattern in rules["regex"]:
+            if re.search(pattern, console_text, re.IGNORECASE):
+                issues.append({
+                    "type": issue_type,
+                    "cause": rules["cause"],
+                    "suggestion": rules["suggestion"],
+                    "confidence": 1.0
+                })
+                break
+    return issues
+
+SAMPLE_LOGS = [
+    "",
+    "Started by user admin\nFinished: SUCCESS\n",
+    "npm ERR! code E404\nBuild timed out (after 10 minutes)\n",
+    "docker: command not found\ncurl: (6) Could not resolve host: registry.internal\n",
+    "ERROR: No matching distribution found for foo==1.0\nmodule not found\n",
+    "AssertionError: expected 1\nTests failed\n1) Failure\nConnection refused\n",
+    "TIMEOUTEXCEPTION in stage\nCannot connect to the Docker daemon at unix:///var/run/docker.sock\n",
+    "x" * 10000 + "ModuleNotFoundError: No module named 'foo'" + "y" * 10000,
+]
+
+@pytest.mark.parametrize("text", SAMPLE_LOGS)
+def test_matches_legacy_per_pattern_search(text):
+    assert LogIntelligenceEngine().analyze_log(text) == legacy_analyze(text)
+
+def test_stops_once_all_categories_seen():
+    every_category = "\n".join(rules["regex"][0] for rules in LogIntelligenceEngine.PATTERNS.values())
+    engine = LogIntelligenceEngine()
+    issues = engine.analyze_log(every_category + "\n" + "npm ERR!\n" * 1000)
+    assert [i["type"] for i in issues] == list(LogIntelligenceEngine.PATTERNS)
+
+def test_none_log_returns_empty():
+    assert LogIntelligenceEngine().analyze_log(None) == []
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 4096])
+def test_stream_scanner_matches_across_chunk_boundaries(chunk_size):
+    text = "".join(SAMPLE_LOGS).encode("utf-8")
+    scanner = LogIntelligenceEngine().stream()
+    for i in range(0, len(text), chunk_size):
+        scanner.feed(text[i:i + chunk_size])
+    assert scanner.finish() == legacy_analyze(text.decode("utf-8"))
+
+def test_stream_scanner_reports_new_issues_per_chunk():
+    scanner = LogIntelligenceEngine().stream()
+    assert scanner.feed("step 1\nnpm ER") == []
+    assert [i["type"] for i in scanner.feed("R! code 1\n")] == ["DEPENDENCY_NODE"]
+    assert scanner.feed("npm ERR! again\n") == []
+
+def test_stream_scanner_bounds_carry_on_long_lines():
+    scanner = LogIntelligenceEngine().stream()
+    for _ in range(50):
+        scanner.feed("x" * 10000)
+    scanner.feed("Connection refused")
+    assert len(scanner._carry) <= LogStreamScanner.MAX_CARRY
+    assert [i["type"] for i in scanner.finish()] == ["NETWORK"]
+
+def test_find_failures_reports_each_line_once_per_category():
+    text = "AssertionError: Tests failed\nnpm ERR! Module not found\nAssertionError\n"
+    assert sorted(LogIntelligenceEngine().find_failures(text)) == [
+        ("DEPENDENCY_NODE", "npm ERR! Module not found"),
+        ("TEST_FAILURE", "AssertionError"),
+        ("TEST_FAILURE", "AssertionError: Tests failed"),
+    ]
+    assert len(LogIntelligenceEngine().find_failures("npm ERR!\n" * 50, limit=3)) == 3
+
+def test_literal_rules_use_case_folded_search():
+    assert LogIntelligenceEngine.FOLDED_LITERALS is not None
+    text = "DOCKER: COMMAND NOT FOUND\nnpm err! x\n1) FAILURE\nbuild TIMED out\n"
+    folded = LogIntelligenceEngine().find_categories(text)
+    exact = {m.lastgroup for m in LogIntelligenceEngine.MATCHER.finditer(text)}
+    assert folded == exact == {"DOCKER", "DEPENDENCY_NODE", "TEST_FAILURE", "TIMEOUT"}
+
+@pytest.mark.parametrize("text", SAMPLE_LOGS + [
+    "npm ERR! Module not found: 'x'\nDOCKER: COMMAND NOT FOUND\nbuild TIMED out\n" * 30,
+    "\n".join(rules["regex"][0] for rules in LogIntelligenceEngine.PATTERNS.values()),
+])
+def test_literal_and_regex_paths_agree(text, monkeypatch):
+    folded = LogIntelligenceEngine()
+    monkeypatch.setattr(folded, "FOLD_BLOCK", 16)
+    regex = LogIntelligenceEngine()
+    monkeypatch.setattr(regex, "FOLDED_LITERALS", None)
+    assert folded.find_categories(text) == regex.find_categories(text)
+    assert sorted(folded.find_failures(text)) == sorted(regex.find_failures(text))
+
+def test_literal_path_stops_once_all_categories_seen(monkeypatch):
+    import log_parser
+    blocks, folded_blocks = [], log_parser._folded_blocks
+    def counting(text, size):
+        for block in folded_blocks(text, size):
+            blocks.append(block)
+            yield block
+    monkeypatch.setattr(log_parser, "_folded_blocks", counting)
+    engine = LogIntelligenceEngine()
+    monkeypatch.setattr(engine, "FOLD_BLOCK", 64)
+    every_category = "\n".join(rules["regex"][0] for rules in LogIntelligenceEngine.PATTERNS.values())
+    engine.find_categories(every_category + "\n" + "npm ERR!\n" * 1000)
+    assert len(blocks) <= 4
+    blocks.clear()
+    assert engine.find_categories("npm ERR!\n", set(LogIntelligenceEngine.PATTERNS)) == set(LogIntelligenceEngine.PATTERNS)
+    assert blocks == []
+
+def test_regex_rules_fall_back_to_full_matcher():
+    assert _fold_literals({"X": {"regex": [r"exit code \d+"]}}) is None
+    assert _fold_literals({"X": {"regex": [r"1\) Failure"]}}) == {"X": ["1) failure"]}
+
+class ExitCodeEngine(LogIntelligenceEngine):
+    # One real regex makes the whole rule set go through MATCHER
+    PATTERNS = dict(LogIntelligenceEngine.PATTERNS, EXIT_CODE={
+        "regex": [r"exit code [1-9]\d*"], "cause": "Script Failure", "suggestion": "Check the failing step."})
+    MATCHER = _compile_patterns(PATTERNS)
+    FOLDED_LITERALS = _fold_literals(PATTERNS)
+
+def test_rule_sets_with_regexes_run_through_matcher():
+    assert ExitCodeEngine.FOLDED_LITERALS is None
+    text = "script returned exit code 0\nnpm ERR! x\nscript returned EXIT CODE 137\n"
+    scanner = ExitCodeEngine().stream()
+    for i in range(0, len(text), 5):
+        scanner.feed(text[i:i + 5])
+    assert [i["type"] for i in scanner.finish()] == ["DEPENDENCY_NODE", "EXIT_CODE"]
+    assert ExitCodeEngine().find_failures(text) == [
+        ("DEPENDENCY_NODE", "npm ERR! x"), ("EXIT_CODE", "script returned EXIT CODE 137")]
+
+def test_normalize_failure_strips_run_specific_tokens():
+    from log_parser import normalize_failure
+    a = normalize_failure("2024-05-01T10:22:03Z npm ERR! 404 GET https://registry.npmjs.org/@acme/pkg-1.2.3.tgz "
+                          "in /home/jenkins/ws/build-42/node_modules (sha 3f2a9c1d7e)")
+    b = normalize_failure("2024-06-11 08:01:59 NPM ERR!  404 GET https://registry.npmjs.org/@acme/pkg-9.0.0.tgz "
+                          "in /var/lib/agent/ws/build-7/node_modules (sha 0bd77e41aa)")
+    assert a == b == "<ts> npm err! <n> get https://registry.npmjs.org/<path> in <path> (sha <hash>)"
+    # Different failures stay apart, and words that merely look like hex are kept
+    assert normalize_failure("Connection refused to db") != normalize_failure("Connection refused to cache")
+    assert normalize_failure("deadbeef failed") == "deadbeef failed"
+
+def test_scanner_fingerprints_failing_lines_across_chunks():
+    log = "".join(f"npm ERR! code E404 at /tmp/run-{i}/pkg\n    at registry.fetch (/usr/lib/npm/{i}.js:12:5)\n"
+                  f"\nstep {i}\n" for i in range(30))
+    log += "Connection refused: db-1:5432\n"
+    scanner = LogStreamScanner()
+    for i in range(0, len(log), 17):
+        scanner.feed(log[i:i + 17])
+    scanner.finish()
+    failures = scanner.failures
+    assert [(f["type"], f["hits"]) for f in failures] == [("DEPENDENCY_NODE", 30), ("NETWORK", 1)]
+    assert failures[0]["normalized"] == "npm err! code e<n> at <path>\nat registry.fetch (<path>:<n>:<n>)\nstep <n>"
+    assert failures[0]["sample"] == "npm ERR! code E404 at /tmp/run-0/pkg"
+    assert failures[1]["normalized"] == "connection refused: db-<n>:<n>" # The log ended before any context
+    assert len({f["fingerprint"] for f in failures}) == 2
+
+@pytest.mark.parametrize("chunk_size", [5, 4096])
+def test_same_headline_with_different_context_stays_distinct(chunk_size):
+    log = ("Could not resolve host: registry.internal\n  while fetching dependencies\n  step install\n"
+           "Could not resolve host: registry.internal\n\n  while uploading artifacts\n  step publish\n"
+           "Could not resolve host: registry.internal\n  while fetching dependencies\n  step install\n")
+    scanner = LogStreamScanner()
+    for i in range(0, len(log), chunk_size):
+        scanner.feed(log[i:i + chunk_size])
+    scanner.finish()
+    assert [(f["sample"], f["hits"]) for f in scanner.failures] == [
+        ("Could not resolve host: registry.internal", 2), ("Could not resolve host: registry.internal", 1)]
+    assert scanner.failures[1]["normalized"].endswith("while uploading artifacts\nstep publish")
+
+def test_failure_window_is_capped():
+    from log_parser import MAX_FAILURE_WINDOW
+    scanner = LogStreamScanner()
+    scanner.feed("Connection refused\n" + ("x" * 1000 + "\n") * 5)
+    scanner.finish()
+    assert len(scanner.failures[0]["normalized"]) == MAX_FAILURE_WINDOW
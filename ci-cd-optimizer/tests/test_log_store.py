@@ -0,0 +1,73 @@
+import os
+import zlib
+import pytest
+from log_store import LogStore, MAX_OUTPUT_CHUNK
+from analyzer import analyze_pipeline_v2
+
+LOG = b"Started by user admin\n" + b"compiling module\n" * 50000 + b"Connection refused\n"
+
+@pytest.fixture
+def store(db, tmp_path):
+    return LogStore(str(tmp_path / "logs"), keep_builds=3, max_bytes=10 * 1024 * 1024)
+
+def _blobs(store):
+    return sorted(name for _, _, names in os.walk(store.root) for name in names)
+
+def test_round_trip_streams_bounded_chunks(store):
+    digest = store.archive("demo", 1, [LOG[:1000], LOG[1000:].decode()])
+    chunks = list(store.open("demo", 1))
+    assert b"".join(chunks) == LOG
+    assert max(len(c) for c in chunks) <= MAX_OUTPUT_CHUNK
+    assert os.path.getsize(store.path(digest)) < len(LOG) / 20
+    assert store.read("demo", 1) == LOG.decode()
+    assert store.open("demo", 2) is None
+
+def test_identical_logs_are_stored_once(store, db):
+    first = store.archive("demo", 1, LOG)
+    second = store.archive("other", 9, LOG)
+    assert first == second and _blobs(store) == [f"{first}.zz"]
+    assert db.get_build_log("other", 9)["raw_size"] == len(LOG)
+
+def test_rearchiving_a_build_drops_its_unshared_old_blob(store):
+    old = store.archive("demo", 1, b"first attempt\n")
+    new = store.archive("demo", 1, b"second attempt\n")
+    assert _blobs(store) == [f"{new}.zz"] and old != new
+
+def test_retention_keeps_newest_builds_per_job(store, db):
+    for n in range(1, 6):
+        store.archive("demo", n, f"build {n}\n".encode())
+    store.archive("other", 1, b"build 1\n") # Shares its blob with demo #1
+    assert [n for n in range(1, 6) if db.get_build_log("demo", n)] == [3, 4, 5]
+    assert len(_blobs(store)) == 4 # demo #3-5 plus the blob still used by other #1
+    assert store.read("other", 1) == "build 1\n"
+
+def test_size_cap_drops_oldest_archives(db, tmp_path):
+    store = LogStore(str(tmp_path / "logs"), keep_builds=100, max_bytes=2500)
+    logs = [os.urandom(1000) for _ in range(4)] # Incompressible, ~1 KB stored each
+    for n, log in enumerate(logs, start=1):
+        store.archive("demo", n, log)
+    assert [n for n in range(1, 5) if db.get_build_log("demo", n)] == [3, 4]
+    assert len(_blobs(store)) == 2
+
+def test_truncated_blob_is_reported(store):
+    digest = store.archive("demo", 1, LOG)
+    with open(store.path(digest), "r+b") as f:
+        f.truncate(100)
+    with pytest.raises((ValueError, zlib.error)):
+        store.read("demo", 1)
+
+def test_analyzer_reuses_archived_log(store, monkeypatch):
+    monkeypatch.setattr("analyzer.get_log_store", lambda: store)
+    store.archive("demo", 4, LOG)
+    metrics = analyze_pipeline_v2({"job_name": "demo", "build_number": 4, "status": "FAILURE",
+                                   "duration_seconds": 10, "stages": []})
+    assert [i["type"] for i in metrics["issues"]] == ["NETWORK"]
+
+def test_full_retention_pass_covers_every_job(db, tmp_path):
+    store = LogStore(str(tmp_path / "logs"), keep_builds=100, max_bytes=10 ** 9)
+    for job in ("a", "b"):
+        for n in range(1, 4):
+            store.archive(job, n, f"{job} {n}\n".encode())
+    store.keep_builds = 1
+    assert store.enforce_retention() == 4
+    assert [(job, n) for job in "ab" for n in range(1, 4) if db.get_build_log(job, n)] == [("a", 3), ("b", 3)]
@@ -0,0 +1,98 @@
+import requests
+from jenkins_fetch import JenkinsClient
+from poller import JenkinsPoller
+from test_jenkins_fetch import FakeResponse, FakeSession, JENKINS, WFAPI, CONSOLE
+
+class FakeJenkins:
+    """Answers probes conditionally (ETag = last completed build) and serves every build's data."""
+    def __init__(self, last_build):
+        self.last_build = last_build
+        self.broken = set() # Connection errors
+        self.missing = set() # Deleted builds: 404 everywhere
+        self.running = set()
+
+    def __call__(self, url, **kwargs):
+        if url == f"{JENKINS}job/demo/api/json":
+            etag = f'"{self.last_build}"'
+            if kwargs.get("headers", {}).get("If-None-Match") == etag:
+                return FakeResponse(status_code=304)
+            return FakeResponse(json_data={"lastCompletedBuild": {"number": self.last_build}}, headers={"ETag": etag})
+        build = int(url[len(f"{JENKINS}job/demo/"):].split("/")[0])
+        if build in self.broken:
+            raise requests.exceptions.ConnectionError("connection reset")
+        if build in self.missing:
+            return FakeResponse(status_code=404)
+        if url.endswith("consoleText"):
+            return FakeResponse(content=CONSOLE)
+        return FakeResponse(json_data=dict(WFAPI, status="IN_PROGRESS") if build in self.running else WFAPI)
+
+def _poller(jenkins, **kwargs):
+    session = FakeSession(handler=jenkins)
+    poller = JenkinsPoller(JenkinsClient(JENKINS, session=session), job_names=["demo"], interval=10,
+                           max_interval=80, jitter=0, seed=1, **kwargs)
+    return poller, session
+
+def _fetches(session):
+    return [url for url, _ in session.calls if url != f"{JENKINS}job/demo/api/json"]
+
+def test_only_new_builds_are_analyzed_and_quiet_jobs_back_off(db):
+    jenkins = FakeJenkins(last_build=3)
+    poller, session = _poller(jenkins, max_catchup=2)
+    assert poller.poll_once(now=float("inf"))["analyzed"] == 2 # First sight: the newest max_catchup builds
+    assert [b["build_number"] for b in db.get_job_history("demo")] == [3, 2]
+
+    session.calls.clear()
+    summary = poller.poll_once(now=float("inf"))
+    assert summary == {**summary, "due": 1, "changed": 0, "analyzed": 0}
+    assert len(session.calls) == 1 and session.calls[0][1]["headers"] == {"If-None-Match": '"3"'}
+    assert poller._states["demo"]["interval"] == 20
+    for _ in range(5):
+        poller.poll_once(now=float("inf"))
+    assert poller._states["demo"]["interval"] == 80
+
+    jenkins.last_build = 5
+    session.calls.clear()
+    assert poller.poll_once(now=float("inf"))["analyzed"] == 2
+    assert len(_fetches(session)) == 4 and poller._states["demo"]["interval"] == 10
+    # Not due yet: no requests at all
+    session.calls.clear()
+    assert poller.poll_once()["due"] == 0 and session.calls == []
+
+def test_state_survives_restarts_and_failed_builds_are_retried(db):
+    db.save_analysis("demo", 4, "SUCCESS", 10)
+    jenkins = FakeJenkins(last_build=7)
+    jenkins.broken.add(6)
+    poller, _ = _poller(jenkins)
+    summary = poller.poll_once(now=float("inf"))
+    assert summary["analyzed"] == 1 and summary["errors"] == 1 # 5 done, 6 failed, 7 not attempted
+    state = db.get_poller_states(JENKINS.rstrip("/"))["demo"]
+    assert state["last_build"] == 5 and state["errors"] == 1 and state["failed_build"] == 6
+    assert state["etag"] is None
+
+    jenkins.broken.clear()
+    poller, session = _poller(jenkins) # A fresh process resumes from poller_state
+    assert poller.poll_once(now=float("inf"))["analyzed"] == 2
+    assert not any("/5/" in url for url in _fetches(session))
+    assert [b["build_number"] for b in db.get_job_history("demo")] == [7, 6, 5, 4]
+    assert db.get_poller_states(JENKINS.rstrip("/"))["demo"]["etag"] == '"7"'
+
+def test_missing_running_and_persistently_failing_builds_do_not_stall_the_job(db):
+    db.save_analysis("demo", 4, "SUCCESS", 10)
+    jenkins = FakeJenkins(last_build=8)
+    jenkins.missing.add(5)
+    jenkins.running.add(7)
+    poller, _ = _poller(jenkins, max_retries=3)
+    assert poller.poll_once(now=float("inf"))["analyzed"] == 1 # 5 skipped, 6 analyzed, 7 still running
+    assert poller._states["demo"]["last_build"] == 6 and poller._states["demo"]["etag"] is None
+    assert [b["build_number"] for b in db.get_job_history("demo")] == [6, 4]
+
+    jenkins.running.clear()
+    jenkins.broken.add(9)
+    jenkins.last_build = 10
+    poller.poll_once(now=float("inf")) # 7 and 8 analyzed, then 9 fails
+    assert poller._states["demo"]["last_build"] == 8
+    for _ in range(2):
+        poller.poll_once(now=float("inf"))
+    assert poller._states["demo"]["last_build"] == 9 # Given up after three attempts
+    assert poller.poll_once(now=float("inf"))["analyzed"] == 1
+    assert [b["build_number"] for b in db.get_job_history("demo", limit=10)] == [10, 8, 7, 6, 4]
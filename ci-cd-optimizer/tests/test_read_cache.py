@@ -0,0 +1,52 @@
+import time
+from read_cache import ReadCache, cached_by_job
+
+def _counting_reader(cache):
+    calls = []
+
+    @cached_by_job(cache, lambda: "db")
+    def read(job_name, limit=10):
+        calls.append((job_name, limit))
+        return {"job": job_name, "rows": list(range(limit))}
+    return read, calls
+
+def test_hits_after_first_read_and_normalizes_default_args():
+    cache = ReadCache()
+    read, calls = _counting_reader(cache)
+    read("a")
+    read("a", 10)
+    read("a", limit=10)
+    assert calls == [("a", 10)]
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1
+
+def test_returns_copies():
+    read, _ = _counting_reader(ReadCache())
+    read("a")["rows"].clear()
+    assert read("a")["rows"] == list(range(10))
+
+def test_invalidate_drops_only_that_job():
+    cache = ReadCache()
+    read, calls = _counting_reader(cache)
+    read("a"); read("b")
+    cache.invalidate(("db", "a"))
+    read("a"); read("b")
+    assert calls == [("a", 10), ("b", 10), ("a", 10)]
+
+def test_read_started_before_invalidation_is_not_cached():
+    cache = ReadCache()
+    hit, generation = cache.get(("db", "a"), ("db", "a", "read", ()))
+    assert not hit
+    cache.invalidate(("db", "a")) # A write commits while the read is in flight
+    cache.put(("db", "a"), ("db", "a", "read", ()), "stale", generation)
+    assert cache.stats()["entries"] == 0
+
+def test_lru_and_ttl_bounds():
+    cache = ReadCache(max_entries=2, ttl=0.05)
+    read, calls = _counting_reader(cache)
+    read("a"); read("b"); read("a"); read("c") # "b" is least recently used
+    assert cache.stats()["entries"] == 2
+    read("a")
+    assert calls.count(("b", 10)) == 1 and calls.count(("a", 10)) == 1
+    time.sleep(0.06)
+    read("a")
+    assert calls.count(("a", 10)) == 2
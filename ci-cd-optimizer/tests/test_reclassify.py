@@ -0,0 +1,69 @@
+import pytest
+from log_parser import LogIntelligenceEngine
+from log_store import LogStore
+from reclassify import reclassify
+
+def _issue_types(db, build_id):
+    c = db.get_connection().cursor()
+    c.execute("SELECT issue_type FROM log_analysis WHERE build_id=? ORDER BY id", (build_id,))
+    return [row[0] for row in c.fetchall()]
+
+def _ruleset(db, build_id):
+    c = db.get_connection().cursor()
+    c.execute("SELECT ruleset_version FROM builds WHERE id=?", (build_id,))
+    return c.fetchone()[0]
+
+@pytest.fixture
+def store(db, tmp_path):
+    return LogStore(str(tmp_path / "logs"))
+
+def test_ruleset_version_tracks_pattern_changes(monkeypatch):
+    from log_parser import _ruleset_version
+    patterns = {k: dict(v) for k, v in LogIntelligenceEngine.PATTERNS.items()}
+    assert _ruleset_version(patterns) == LogIntelligenceEngine.RULESET_VERSION
+    patterns["NETWORK"]["regex"] = patterns["NETWORK"]["regex"] + [r"ECONNRESET"]
+    assert _ruleset_version(patterns) != LogIntelligenceEngine.RULESET_VERSION
+
+def test_only_stale_builds_are_rescanned_in_pages(db, store):
+    ids = []
+    for n in range(1, 6):
+        ids.append(db.save_analysis("demo", n, "FAILURE", 10.0, issues=[], ruleset="old-rules"))
+        store.archive("demo", n, b"step\nConnection refused\n" if n % 2 else b"step\nnpm ERR! x\n")
+    current = db.save_analysis("demo", 6, "FAILURE", 10.0, issues=[], ruleset=LogIntelligenceEngine.RULESET_VERSION)
+    store.archive("demo", 6, b"Connection refused\n")
+    no_log = db.save_analysis("demo", 7, "FAILURE", 10.0, issues=[])
+
+    summary = reclassify(workers=2, batch_size=2, store=store)
+    assert summary["builds_updated"] == 5 and summary["logs_scanned"] == 5 and not summary["errors"]
+    assert [_issue_types(db, i) for i in ids] == [["NETWORK"], ["DEPENDENCY_NODE"]] * 2 + [["NETWORK"]]
+    assert all(_ruleset(db, i) == LogIntelligenceEngine.RULESET_VERSION for i in ids)
+    assert _issue_types(db, current) == [] # Already current: not rescanned
+    assert [(f["sample"], f["builds"]) for f in db.get_top_failures()] == \
+        [("Connection refused", 3), ("npm ERR! x", 2)]
+    assert _ruleset(db, no_log) is None
+
+    assert reclassify(workers=1, store=store)["builds_updated"] == 0 # Nothing left to do
+
+def test_unreadable_blob_is_left_for_the_next_run(db, store):
+    build_id = db.save_analysis("demo", 1, "FAILURE", 10.0)
+    digest = store.archive("demo", 1, b"Connection refused\n" * 1000)
+    with open(store.path(digest), "r+b") as f:
+        f.truncate(10)
+
+    summary = reclassify(workers=1, store=store)
+    assert summary["builds_updated"] == 0 and summary["errors"][0]["digest"] == digest
+    assert _ruleset(db, build_id) is None
+    assert db.get_stale_log_builds(LogIntelligenceEngine.RULESET_VERSION)[0]["id"] == build_id
+
+def test_analysis_stamps_ruleset_only_when_a_log_was_scanned(db):
+    from analyzer import analyze_pipeline_v2
+    base = {"job_name": "demo", "status": "SUCCESS", "duration_seconds": 5, "stages": []}
+    with_log = analyze_pipeline_v2(dict(base, build_number=1, console_log="Connection refused"))
+    without_log = analyze_pipeline_v2(dict(base, build_number=2))
+    assert with_log["ruleset_version"] == LogIntelligenceEngine.RULESET_VERSION
+    assert without_log["ruleset_version"] is None
+
+def test_resaving_without_a_log_clears_the_ruleset_stamp(db):
+    build_id = db.save_analysis("demo", 1, "FAILURE", 10.0, issues=[], ruleset=LogIntelligenceEngine.RULESET_VERSION)
+    assert db.save_analysis("demo", 1, "FAILURE", 10.0, issues=[]) == build_id
+    assert _ruleset(db, build_id) is None
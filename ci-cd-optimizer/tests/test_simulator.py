@@ -0,0 +1,66 @@
+import pytest
+from simulator import PipelineSimulator
+from optimizer import optimize_pipeline_v2
+
+def _stage(name, start, seconds):
+    return {"name": name, "status": "SUCCESS", "startTimeMillis": 1_700_000_000_000 + start * 1000,
+            "durationMillis": seconds * 1000, "pauseDurationMillis": 0}
+
+# Checkout -> (Test | Lint) -> Deploy
+STAGES = [_stage("Checkout", 0, 5), _stage("Test", 5, 120), _stage("Lint", 5, 20), _stage("Deploy", 125, 10)]
+
+def test_dag_and_executors_come_from_the_build():
+    sim = PipelineSimulator.from_stages(STAGES)
+    assert sim.deps["Deploy"] == {"Checkout", "Test", "Lint"} and sim.deps["Lint"] == {"Checkout"}
+    assert sim.executors == 2
+    assert sim.simulate(trials=10)["p50"] == 135.0
+
+def test_layout_changes_replay_the_dag():
+    sim = PipelineSimulator.from_stages(STAGES)
+    split = sim.compare([("split", "Test", 4), ("executors", 6)], trials=10)
+    assert split["scenario"]["p50"] == 5 + 30 + 10 and split["saving_seconds"]["p50"] == 90.0
+    # Four branches on two executors run in two waves, and Lint queues behind them
+    assert sim.simulate([("split", "Test", 4)], trials=10)["p50"] == 5 + 30 + 30 + 20 + 10
+    assert sim.simulate([("executors", 1)], trials=10)["p50"] == 155.0
+    # Making an off-critical-path stage faster buys nothing
+    assert sim.compare([("speedup", "Lint", 0.5)], trials=10)["saving_seconds"]["p50"] == 0
+    with pytest.raises(ValueError):
+        sim.simulate([("speedup", "Nope", 0.5)], trials=1)
+
+def test_parallel_groups_keep_inherited_dependencies():
+    sequential = [_stage("Checkout", 0, 5), _stage("Unit", 5, 30), _stage("Lint", 35, 20), _stage("Deploy", 55, 10)]
+    sim = PipelineSimulator.from_stages(sequential)
+    result = sim.compare([("parallel", ["Unit", "Lint"]), ("executors", 2)], trials=10)
+    assert result["scenario"]["p50"] == 5 + 30 + 10
+    assert sim.simulate([("parallel", ["Unit", "Lint"])], trials=10)["p50"] == 65.0 # Still one executor
+
+def test_history_gives_a_distribution(db):
+    for n in range(1, 41):
+        db.save_analysis("sim", n, "SUCCESS", 0, stages=[
+            {"name": "Checkout", "status": "SUCCESS", "durationMillis": 5000},
+            {"name": "Test", "status": "SUCCESS", "durationMillis": (100 + n) * 1000},
+            {"name": "Lint", "status": "SUCCESS", "durationMillis": 20000},
+            {"name": "Deploy", "status": "SUCCESS", "durationMillis": 10000}])
+    db.save_analysis("sim", 41, "FAILURE", 0, stages=[{"name": "Test", "status": "FAILED", "durationMillis": 1}])
+
+    sim = PipelineSimulator.for_job("sim", STAGES, seed=7)
+    assert len(sim.samples) == 40 # Failed builds are not replayed
+    dist = sim.simulate(trials=400)
+    assert 116 <= dist["p10"] < dist["p50"] < dist["p90"] <= 155
+    assert dist["min"] >= 116 and dist["max"] <= 155
+
+    # Without a layout, the latest successful build's stages run back to back
+    assert PipelineSimulator.for_job("sim", seed=7).simulate(trials=10)["min"] >= 5 + 101 + 20 + 10
+    assert PipelineSimulator.for_job("unknown") is None
+
+def test_bottleneck_impact_is_simulated(db):
+    metrics = {"job_name": "sim", "stages": STAGES, "issues": [],
+               "timeline": {"critical_path": ["Checkout", "Test", "Deploy"], "gaps": []},
+               "stage_analysis": [{"name": "Test", "duration": 120.0, "baseline": 120.0, "impact_pct": 88,
+                                   "critical": True, "slack_seconds": 0, "regression_pct": 0, "status": "HEALTHY"},
+                                  {"name": "Lint", "duration": 20.0, "baseline": 20.0, "impact_pct": 7,
+                                   "critical": False, "slack_seconds": 100, "regression_pct": 0, "status": "HEALTHY"}]}
+    assert "simulated" not in next(s for s in optimize_pipeline_v2(metrics) if "Bottleneck" in s["title"])["impact"]
+    plan = optimize_pipeline_v2(metrics, PipelineSimulator.for_job("sim", STAGES))
+    bottleneck = next(s for s in plan if s["title"].endswith("Bottleneck Stage: Test"))
+    assert bottleneck["impact"] == "~60 seconds (p90 60s, simulated)"
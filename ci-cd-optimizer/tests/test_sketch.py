@@ -0,0 +1,63 @@
+import random
+import pytest
+from sketch import QuantileSketch, WindowedSketch
+
+def exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+@pytest.mark.parametrize("q", [0.1, 0.5, 0.9, 0.99])
+def test_quantiles_within_relative_accuracy(q):
+    rng = random.Random(3)
+    values = [rng.lognormvariate(4, 0.8) for _ in range(20000)]
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    for v in values:
+        sketch.add(v)
+    assert sketch.quantile(q) == pytest.approx(exact_quantile(values, q), rel=0.02)
+
+def test_memory_is_bounded():
+    sketch = QuantileSketch(max_buckets=64)
+    for n in range(1, 100000):
+        sketch.add(n * 0.37)
+    assert len(sketch.bins) <= 64
+    assert sketch.quantile(0.99) == pytest.approx(0.99 * 99999 * 0.37, rel=0.02)
+
+def test_merge_matches_single_sketch():
+    rng = random.Random(5)
+    values = [rng.uniform(1, 600) for _ in range(5000)]
+    whole, left, right = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for i, v in enumerate(values):
+        whole.add(v)
+        (left if i % 2 else right).add(v)
+    left.merge(right)
+    assert left.count == whole.count
+    for q in (0.25, 0.5, 0.9):
+        assert left.quantile(q) == pytest.approx(whole.quantile(q))
+
+def test_json_round_trip():
+    sketch = QuantileSketch()
+    for v in (0, 1.5, 30, 30, 120):
+        sketch.add(v)
+    restored = QuantileSketch.from_json(sketch.to_json())
+    assert restored.count == 5 and restored.zero_count == 1
+    assert restored.quantile(0.5) == sketch.quantile(0.5)
+    assert QuantileSketch.from_json(None).quantile(0.5) == 0
+
+def test_remove_takes_a_value_back():
+    sketch = QuantileSketch()
+    for v in (10, 20, 30):
+        sketch.add(v)
+    assert sketch.remove(30) and sketch.count == 2
+    assert sketch.quantile(1.0) == pytest.approx(20, rel=0.02)
+    assert not sketch.remove(500)
+
+def test_windowed_sketch_forgets_old_values():
+    sketch = WindowedSketch(window=50)
+    for _ in range(200):
+        sketch.add(100.0)
+    for _ in range(100):
+        sketch.add(300.0) # The job got slower for good
+    assert 50 <= sketch.count <= 100
+    assert sketch.quantile(0.5) == pytest.approx(300, rel=0.02)
+    restored = WindowedSketch.from_json(sketch.to_json(), 50)
+    assert restored.count == sketch.count and restored.quantile(0.5) == sketch.quantile(0.5)
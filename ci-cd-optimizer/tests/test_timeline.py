@@ -0,0 +1,63 @@
+from timeline import TimelineEngine, wall_clock_seconds
+from optimizer import DecisionEngine
+
+def _stage(name, start, seconds, pause=0, status="SUCCESS"):
+    return {"name": name, "status": status, "startTimeMillis": start * 1000 + 1_700_000_000_000,
+            "durationMillis": seconds * 1000, "pauseDurationMillis": pause * 1000}
+
+# Checkout -> (Unit | Lint | Integration in parallel) -> 10s idle -> Deploy (12s input wait)
+PIPELINE = [_stage("Checkout", 0, 5), _stage("Unit", 5, 30), _stage("Lint", 5, 10),
+            _stage("Integration", 5, 60), _stage("Deploy", 75, 20, pause=12)]
+
+def test_wall_clock_is_not_the_sum_of_parallel_stages():
+    timeline = TimelineEngine().build(PIPELINE)
+    assert wall_clock_seconds(PIPELINE) == timeline["wall_seconds"] == 95.0
+    assert timeline["stage_seconds"] == 125.0 and timeline["parallelism"] == 1.32
+    by_name = {s["name"]: s for s in timeline["stages"]}
+    # The 30s Unit branch shared its whole run with Integration (and Lint for 10s)
+    assert by_name["Unit"]["wall_share_seconds"] == 13.33 and by_name["Unit"]["exclusive_seconds"] == 0
+    assert by_name["Integration"]["wall_share_seconds"] == 43.33
+    assert round(sum(s["wall_share_seconds"] for s in timeline["stages"]) + timeline["idle_seconds"]) == 95
+
+def test_critical_path_gaps_and_slack():
+    timeline = TimelineEngine().build(PIPELINE)
+    assert timeline["critical_path"] == ["Checkout", "Integration", "Deploy"]
+    assert timeline["idle_seconds"] == 10.0 and timeline["wait_seconds"] == 12.0
+    assert [(g["kind"], g["seconds"], g["critical"]) for g in timeline["gaps"]] == [("idle", 10.0, True),
+                                                                                   ("wait", 12.0, True)]
+    assert timeline["gaps"][0]["after"] == "Integration" and timeline["gaps"][0]["before"] == "Deploy"
+    by_name = {s["name"]: s for s in timeline["stages"]}
+    assert by_name["Lint"]["slack_seconds"] == 60.0 and not by_name["Lint"]["critical"]
+
+def test_stages_without_start_times_run_back_to_back():
+    stages = [{"name": "A", "status": "SUCCESS", "durationMillis": 4000, "startTimeMillis": 0},
+              {"name": "B", "status": "SUCCESS", "durationMillis": 6000}]
+    timeline = TimelineEngine().build(stages)
+    assert timeline["wall_seconds"] == 10.0 and timeline["critical_path"] == ["A", "B"]
+    assert [s["wall_share_pct"] for s in timeline["stages"]] == [40.0, 60.0]
+    assert TimelineEngine().build([]) is None
+
+def test_stage_without_start_time_keeps_the_others_in_place():
+    stages = PIPELINE[:4] + [{"name": "Skipped", "status": "NOT_EXECUTED", "durationMillis": 0, "startTimeMillis": 0},
+                             PIPELINE[4]]
+    timeline = TimelineEngine().build(stages)
+    assert timeline["wall_seconds"] == 95.0 # Parallel branches are still overlapped
+    assert timeline["critical_path"] == ["Checkout", "Integration", "Deploy"]
+    assert TimelineEngine().intervals(stages)[4] == (65000, 65000) # Right after the stage before it
+
+def test_suggestions_target_the_critical_path():
+    timeline = TimelineEngine().build(PIPELINE)
+    stage_analysis = [{"name": s["name"], "duration": s["end_offset"] - s["start_offset"], "baseline": 10.0,
+                       "regression_pct": 0, "impact_pct": int(s["wall_share_pct"]), "critical": s["critical"],
+                       "slack_seconds": s["slack_seconds"], "status": "HEALTHY"} for s in timeline["stages"]]
+    for stage in stage_analysis:
+        if stage["name"] in ("Lint", "Integration"):
+            stage.update(status="REGRESSION", regression_pct=50)
+
+    plan = DecisionEngine().generate_plan({"issues": [], "timeline": timeline, "stage_analysis": stage_analysis})
+    by_title = {s["title"]: s for s in plan}
+    assert by_title["⏱️ Critical-Path Regression: Integration"]["severity"] == "HIGH"
+    assert by_title["Off-Path Regression: Lint"]["severity"] == "LOW"
+    assert "🚧 Bottleneck Stage: Integration" in by_title
+    assert "Idle Time Before Deploy" in by_title and "Input Wait in Deploy" in by_title
+    assert not any("Unit" in title for title in by_title)
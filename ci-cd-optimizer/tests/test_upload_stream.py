@@ -0,0 +1,88 @@
+import io
+import json
+import pytest
+from log_parser import LogIntelligenceEngine
+from upload_stream import PipelineJSONStream, parse_stream, parse_multipart_stream
+
+CONSOLE = ("Started \"build\" \\ tab\there\n" + "npm ERR! code E404\n" + "café \U0001f680 done\n") * 50
+DOC = {
+    "job_name": "demo", "build_number": 7, "status": "FAILURE", "duration_seconds": 12.5,
+    "stages": [{"name": "Build, \"quoted\" [x]", "status": "SUCCESS", "durationMillis": 4000, "extra": {"a": [1, {}]}}],
+    "console_log": CONSOLE, "flag": None, "nested": {"console_log": "not streamed"}
+}
+
+def _parse(payload, chunk_size):
+    parser = PipelineJSONStream()
+    for i in range(0, len(payload), chunk_size):
+        parser.feed(payload[i:i + chunk_size])
+    return parser.finish()
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 64, 1 << 20])
+def test_matches_json_loads_and_streams_console_log(ensure_ascii, chunk_size):
+    payload = json.dumps(DOC, ensure_ascii=ensure_ascii, indent=1).encode("utf-8")
+    data = _parse(payload, chunk_size)
+
+    expected = {k: v for k, v in DOC.items() if k != "console_log"}
+    assert {k: v for k, v in data.items() if k not in ("log_issues", "log_failures")} == expected
+    assert data["log_issues"] == LogIntelligenceEngine().analyze_log(CONSOLE)
+    # The last repeat is followed by one line only, so its fingerprint differs
+    assert [(f["sample"], f["hits"]) for f in data["log_failures"]] == [("npm ERR! code E404", 49),
+                                                                          ("npm ERR! code E404", 1)]
+
+def test_surrogate_pair_escape_split_at_every_offset():
+    console = "npm ERR! \U0001f600 broke\n"
+    raw = json.dumps({"job_name": "demo", "console_log": console}).encode("utf-8")
+    start = raw.index(b"\\ud83d")
+    for cut in range(start, start + 13):
+        parser = PipelineJSONStream()
+        parser.feed(raw[:cut])
+        parser.feed(raw[cut:])
+        data = parser.finish()
+        assert data["log_failures"][0]["sample"] == console.strip(), cut
+
+def test_non_string_console_log_is_kept():
+    data = _parse(b'{"console_log": null, "job_name": "x"}', 4)
+    assert data["console_log"] is None and data["log_issues"] == []
+
+@pytest.mark.parametrize("payload", [
+    b'', b'[1, 2]', b'{"a": 1', b'{"a": 1,}', b'{"a" 1}', b'{"a": }', b'{"a": 1} x',
+    b'{"console_log": "bad \\x escape"}', b'{"console_log": "unterminated', b'{"a": tru}', b'\xff{}'
+])
+def test_malformed_documents_raise_json_errors(payload):
+    with pytest.raises(json.JSONDecodeError):
+        _parse(payload, 2)
+
+def _multipart(parts, boundary="XyZ"):
+    body = b""
+    for name, filename, content in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename is not None else "")
+        body += f"--{boundary}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + content + b"\r\n"
+    body += f"--{boundary}--\r\n".encode()
+    return io.BytesIO(body), f"multipart/form-data; boundary={boundary}"
+
+def test_multipart_streams_file_part_and_tees_raw_bytes():
+    payload = json.dumps(DOC).encode()
+    stream, content_type = _multipart([("note", None, b"hello"), ("file", "build.json", payload)])
+    archived = {}
+
+    class Sink(io.BytesIO):
+        def close(self):
+            archived["bytes"] = self.getvalue()
+            super().close()
+
+    data, filename = parse_multipart_stream(stream.read, content_type, tee_factory=lambda name: Sink())
+    assert filename == "build.json" and data["build_number"] == 7
+    assert archived["bytes"] == payload
+
+def test_multipart_skips_missing_empty_and_rejected_files():
+    stream, content_type = _multipart([("note", None, b"hello")])
+    assert parse_multipart_stream(stream.read, content_type) == (None, None)
+    stream, content_type = _multipart([("file", "", b"")])
+    assert parse_multipart_stream(stream.read, content_type) == (None, "")
+    stream, content_type = _multipart([("file", "build.txt", b"not json")])
+    assert parse_multipart_stream(stream.read, content_type, accept=lambda f: f.endswith(".json")) == (None, "build.txt")
+
+def test_parse_stream_reads_in_chunks():
+    payload = json.dumps(DOC).encode()
+    assert parse_stream(io.BytesIO(payload).read)["job_name"] == "demo"
@@ -0,0 +1,102 @@
+import pytest
+import log_store
+import webhook
+import app as webapp
+from jenkins_fetch import JenkinsClient
+from webhook import WebhookBatcher, parse_notification, verify_secret
+from test_jenkins_fetch import FakeResponse, FakeSession, JENKINS, WFAPI, CONSOLE
+
+def _jenkins(url, **kwargs):
+    if url.endswith("consoleText"):
+        return FakeResponse(content=CONSOLE)
+    if url.endswith("wfapi/describe"):
+        return FakeResponse(json_data=WFAPI)
+    return FakeResponse(status_code=404)
+
+def _batcher(**kwargs):
+    session = FakeSession(handler=_jenkins)
+    return WebhookBatcher(client=JenkinsClient(JENKINS, session=session), **kwargs), session
+
+def _notification(job, number, phase="COMPLETED"):
+    return {"name": job.split("/")[-1], "url": "".join(f"job/{p}/" for p in job.split("/")),
+            "build": {"number": number, "phase": phase, "status": "FAILURE", "url": f"job/{job}/{number}/"}}
+
+@pytest.fixture
+def client_app(db, monkeypatch):
+    monkeypatch.setitem(webapp.app.config, "TESTING", True)
+    return webapp.app.test_client()
+
+def test_payloads_and_secret():
+    assert parse_notification(_notification("team/app", 7, "FINALIZED")) == (("team/app", 7), None)
+    assert parse_notification(_notification("app", 7, "STARTED")) == (None, None)
+    assert parse_notification({"job_name": "app", "build_number": "12"}) == (("app", 12), None)
+    assert parse_notification({"job_name": "app"})[1] and parse_notification([1])[1]
+    assert verify_secret("s3cret", "s3cret") and not verify_secret("nope", "s3cret")
+    assert not verify_secret("", "") and not verify_secret(None, "s3cret")
+
+def test_storm_is_deduped_and_saved_in_a_few_batches(db, monkeypatch):
+    transactions = []
+    def save(records):
+        transactions.append(len(records))
+        return db.save_analyses_bulk(records)
+    monkeypatch.setattr(webhook, "save_analyses_bulk", save)
+    db.save_analysis("job-0", 1, "SUCCESS", 10)
+
+    batcher, session = _batcher(batch_size=50, max_delay=60, fetch_workers=8)
+    for n in range(1, 101):
+        for job in ("job-0", "job-1"):
+            assert batcher.submit(job, n)
+            assert not batcher.submit(job, n) # The FINALIZED event that follows COMPLETED
+    batcher.shutdown()
+
+    stats = batcher.stats()
+    assert stats["received"] == 400 and stats["duplicates"] == 200 and stats["batches"] == 4
+    assert stats["skipped_stored"] == 1 and stats["saved"] == 199 and stats["errors"] == 0
+    assert len(transactions) == 4 and sum(transactions) == 199
+    assert not any("job-0/1/" in url for url, _ in session.calls)
+    assert len(db.get_job_history("job-1", limit=200)) == 100
+    assert not batcher.submit("job-1", 5) # Still remembered after processing
+
+def test_builds_stored_while_running_are_fetched_again(db):
+    db.save_analysis("app", 7, "IN_PROGRESS", 5) # A dashboard fetch of lastBuild mid-run
+    db.save_analysis("app", 8, "SUCCESS", 5)
+    batcher, session = _batcher()
+    assert batcher.process([("app", 7), ("app", 8)]) == 1
+    assert db.get_job_history("app")[1]["result"] == "FAILED"
+    assert not any("/8/" in url for url, _ in session.calls)
+
+def test_batch_archives_logs_in_its_transaction(db, monkeypatch, tmp_path):
+    store = log_store.LogStore(str(tmp_path / "logs"), keep_builds=2)
+    pruned = []
+    def prune(keep_builds, max_bytes, job_name=None):
+        pruned.append(job_name)
+        return db.prune_build_logs(keep_builds, max_bytes, job_name)
+    monkeypatch.setattr(log_store, "prune_build_logs", prune)
+    monkeypatch.setattr(log_store, "save_build_log", lambda *args: pytest.fail("saved outside the batch"))
+
+    batcher, _ = _batcher(fetch_options={"stream_console": True, "log_store": store})
+    batch = [("app", n) for n in range(1, 5)] + [("lib", 1), ("lib", 2)]
+    assert batcher.process(batch) == 6
+    assert pruned == ["app", "lib"] # Retention once per job, not once per build
+    assert [n for n in range(1, 5) if db.get_build_log("app", n)] == [3, 4]
+    assert db.get_build_log("lib", 2)["digest"] == db.get_build_log("app", 4)["digest"]
+    assert store.read("app", 4) == CONSOLE.decode() and not store._placed
+
+def test_webhook_route(client_app, monkeypatch):
+    batcher, _ = _batcher(batch_size=1, max_delay=0)
+    monkeypatch.setattr(webapp, "get_webhook_batcher", lambda: batcher)
+    monkeypatch.setenv("WEBHOOK_SECRET", "s3cret")
+
+    assert client_app.post("/webhook/jenkins", json=_notification("app", 3)).status_code == 403
+    assert client_app.post("/webhook/jenkins?token=bad", json=_notification("app", 3)).status_code == 403
+    headers = {"X-Webhook-Token": "s3cret"}
+    resp = client_app.post("/webhook/jenkins", json=_notification("app", 3), headers=headers)
+    assert resp.status_code == 202 and resp.get_json()["status"] == "queued"
+    resp = client_app.post("/webhook/jenkins", json=_notification("app", 3, "FINALIZED"), headers=headers)
+    assert resp.get_json()["status"] == "duplicate"
+    assert client_app.post("/webhook/jenkins", json=_notification("app", 4, "STARTED"),
+                           headers=headers).get_json() == {"status": "ignored"}
+    assert client_app.post("/webhook/jenkins", json={"job_name": "app"}, headers=headers).status_code == 400
+
+    batcher.shutdown()
+    assert client_app.get("/webhook/jenkins/stats").get_json()["saved"] == 1
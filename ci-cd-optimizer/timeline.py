@@ -0,0 +1,136 @@
+class TimelineEngine:
+    """
+    Engine 9: Wall-Clock Timeline & Critical Path
+    Rebuilds each stage's real [start, end) interval from startTimeMillis / durationMillis, so
+    parallel branches are not double counted. From the intervals it derives the wall time,
+    the share of it each stage really occupies (a slice run by k stages counts 1/k to each),
+    idle gaps where nothing ran, input waits (pauseDurationMillis) and the critical path:
+    the chain of stages that gated the build finish.
+    """
+    OVERLAP_TOLERANCE_MS = 100 # Jenkins start/end stamps jitter; closer than this counts as back to back
+    MIN_GAP_SECONDS = 1.0 # Shorter idle slices are scheduling noise, not gaps
+
+    def intervals(self, stages):
+        """
+        Stages without a real start time (standard API, hand-made exports, stages that never
+        started) are placed right after the stage before them in the list.
+        Returns: [(start_ms, end_ms)] per stage, relative to the first real stage start
+        """
+        origin = min((s['startTimeMillis'] for s in stages if s.get('startTimeMillis', 0) > 0), default=0)
+        spans, cursor = [], 0
+        for s in stages:
+            start = s['startTimeMillis'] - origin if s.get('startTimeMillis', 0) > 0 else cursor
+            spans.append((start, start + max(0, s['durationMillis'])))
+            cursor = spans[-1][1]
+        return spans
+
+    def wall_seconds(self, stages):
+        spans = self.intervals(stages)
+        return max((end for _, end in spans), default=0) / 1000.0
+
+    def build(self, stages):
+        """
+        Returns: {'wall_seconds', 'stage_seconds', 'parallelism', 'idle_seconds', 'wait_seconds',
+                  'critical_path', 'critical_seconds', 'gaps', 'stages'}, or None without stages.
+                 'stages' follows the input order; 'gaps' lists idle runs and input waits.
+        """
+        if not stages:
+            return None
+        spans = self.intervals(stages)
+        n = len(spans)
+        wall_ms = max(end for _, end in spans)
+
+        # 1. Sweep the wall clock slice by slice between consecutive stage boundaries
+        share, exclusive = [0.0] * n, [0.0] * n
+        idle = [] # [start_ms, end_ms] runs with no stage running
+        bounds = sorted({t for span in spans for t in span})
+        for lo, hi in zip(bounds, bounds[1:]):
+            running = [i for i, (start, end) in enumerate(spans) if start <= lo and end >= hi]
+            if not running:
+                if idle and idle[-1][1] == lo:
+                    idle[-1][1] = hi
+                else:
+                    idle.append([lo, hi])
+                continue
+            for i in running:
+                share[i] += (hi - lo) / len(running)
+            if len(running) == 1:
+                exclusive[running[0]] += hi - lo
+
+        # 2. Critical path: from the last stage to finish, repeatedly step to the latest-finishing
+        #    stage that ended before it started (the one that gated its start)
+        current = max(range(n), key=lambda i: (spans[i][1], spans[i][0]))
+        path = [current]
+        while True:
+            start = spans[current][0]
+            gating = [i for i in range(n) if spans[i][0] < start and spans[i][1] <= start + self.OVERLAP_TOLERANCE_MS]
+            if not gating:
+                break
+            current = max(gating, key=lambda i: (spans[i][1], spans[i][1] - spans[i][0]))
+            path.append(current)
+        path.reverse()
+        on_path = set(path)
+
+        # 3. Slack: how long a stage could grow before it delays whatever starts after it
+        #    (any later stage is conservatively assumed to depend on it)
+        slack = []
+        for i, (start, end) in enumerate(spans):
+            if i in on_path:
+                slack.append(0)
+                continue
+            later = [s for j, (s, _) in enumerate(spans) if j != i and s > start and s >= end - self.OVERLAP_TOLERANCE_MS]
+            slack.append(max(0, min(later, default=wall_ms) - end))
+
+        gaps = []
+        for lo, hi in idle:
+            if (hi - lo) / 1000.0 < self.MIN_GAP_SECONDS:
+                continue
+            before = min((i for i in range(n) if spans[i][0] >= hi), key=lambda i: spans[i][0])
+            after = max((i for i in range(n) if spans[i][1] <= lo), key=lambda i: spans[i][1])
+            gaps.append({
+                'kind': 'idle',
+                'after': stages[after]['name'],
+                'before': stages[before]['name'],
+                'start_offset': round(lo / 1000.0, 2),
+                'seconds': round((hi - lo) / 1000.0, 2),
+                'critical': before in on_path
+            })
+        for i, s in enumerate(stages):
+            pause = s.get('pauseDurationMillis', 0) / 1000.0
+            if pause >= self.MIN_GAP_SECONDS:
+                gaps.append({
+                    'kind': 'wait',
+                    'stage': s['name'],
+                    'start_offset': round(spans[i][0] / 1000.0, 2),
+                    'seconds': round(pause, 2),
+                    'critical': i in on_path
+                })
+
+        wall_seconds = wall_ms / 1000.0
+        stage_seconds = sum(end - start for start, end in spans) / 1000.0
+        return {
+            'wall_seconds': round(wall_seconds, 2),
+            'stage_seconds': round(stage_seconds, 2), # Sum of stage durations (what the old total reported)
+            'parallelism': round(stage_seconds / wall_seconds, 2) if wall_seconds else 1.0,
+            'idle_seconds': round(sum(hi - lo for lo, hi in idle) / 1000.0, 2),
+            'wait_seconds': round(sum(s.get('pauseDurationMillis', 0) for s in stages) / 1000.0, 2),
+            'critical_path': [stages[i]['name'] for i in path],
+            'critical_seconds': round(sum(spans[i][1] - spans[i][0] for i in path) / 1000.0, 2),
+            'gaps': gaps,
+            'stages': [{
+                'name': s['name'],
+                'start_offset': round(spans[i][0] / 1000.0, 2),
+                'end_offset': round(spans[i][1] / 1000.0, 2),
+                'wall_share_seconds': round(share[i] / 1000.0, 2),
+                'wall_share_pct': round(share[i] / wall_ms * 100, 1) if wall_ms else 0.0,
+                'exclusive_seconds': round(exclusive[i] / 1000.0, 2),
+                'slack_seconds': round(slack[i] / 1000.0, 2),
+                'critical': i in on_path
+            } for i, s in enumerate(stages)]
+        }
+
+def wall_clock_seconds(stages):
+    """
+    Build duration from stage intervals: first start to last end, not the sum of stage durations.
+    """
+    return TimelineEngine().wall_seconds(stages)
@@ -0,0 +1,281 @@
+import re
+import json
+import codecs
+from werkzeug.sansio.multipart import MultipartDecoder, File, Data, Epilogue, NeedData
+from werkzeug.http import parse_options_header
+from log_parser import LogIntelligenceEngine
+
+# Member whose value is streamed into the log scanner instead of being kept
+STREAMED_FIELD = 'console_log'
+
+READ_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = ' \t\r\n'
+_STRING_SPECIAL = re.compile(r'["\\]')
+_VALUE_SPECIAL = re.compile(r'["\\{}\[\],]')
+# Longest run of a JSON string body made of complete escapes only
+_STRING_RUN = re.compile(r'(?:[^"\\]+|\\["\\/bfnrt]|\\u[0-9a-fA-F]{4})*')
+_PARTIAL_ESCAPE = re.compile(r'\\(?:u[0-9a-fA-F]{0,3})?\Z')
+_HIGH_SURROGATE = re.compile(r'\\u[dD][89abAB][0-9a-fA-F]{2}\Z')
+
+class PipelineJSONStream:
+    """
+    Incremental parser for one pipeline JSON document (a top-level object) fed in chunks.
+    Every member except `console_log` is buffered and decoded with json.loads; the console
+    log is unescaped run by run and fed to a LogStreamScanner, so memory stays bounded by
+    the chunk size however large the log is. Malformed input raises json.JSONDecodeError.
+    """
+
+    def __init__(self, scanner=None):
+        self.scanner = scanner or LogIntelligenceEngine().stream()
+        self.data = {}
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._state = 'start'
+        self._key = None
+        self._buf = ''
+        self._carry = ''
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._offset = 0
+        self._console_parts = []
+
+    def _error(self, message, index=0):
+        return json.JSONDecodeError(message, '', self._offset + index)
+
+    def feed(self, chunk):
+        """
+        Parses one chunk (bytes or str) of the document.
+        """
+        if isinstance(chunk, bytes):
+            try:
+                chunk = self._decoder.decode(chunk)
+            except UnicodeDecodeError as e:
+                raise self._error(f"Invalid UTF-8: {e.reason}")
+        text = self._carry + chunk
+        self._carry = ''
+        self._parse(text)
+        self._offset += len(text) - len(self._carry)
+        if self._console_parts:
+            self.scanner.feed(''.join(self._console_parts))
+            self._console_parts = []
+
+    def finish(self):
+        """
+        Returns: the parsed document, with `log_issues` and `log_failures` in place of `console_log`
+        """
+        self.feed(self._decoder.decode(b'', final=True))
+        if self._state != 'done' or self._carry:
+            raise self._error("Unexpected end of document")
+        self.data['log_issues'] = self.scanner.finish()
+        self.data['log_failures'] = self.scanner.failures
+        return self.data
+
+    def _parse(self, text):
+        i, n = 0, len(text)
+        while i < n:
+            state = self._state
+            if state == 'console':
+                i = self._console(text, i)
+                continue
+            if state in ('key', 'value'):
+                i = self._raw(text, i)
+                continue
+
+            ch = text[i]
+            if ch in _WHITESPACE:
+                i += 1
+                continue
+            if state == 'start' and ch == '{':
+                self._state = 'first_key'
+            elif state in ('first_key', 'key_start') and ch == '"':
+                self._state, self._buf, self._in_string = 'key', '"', True
+            elif state == 'first_key' and ch == '}':
+                self._state = 'done'
+            elif state == 'colon' and ch == ':':
+                self._state = 'value_start'
+            elif state == 'value_start':
+                if self._key == STREAMED_FIELD and ch == '"':
+                    self._state = 'console'
+                else:
+                    self._state, self._buf, self._depth = 'value', '', 0
+                    continue # Re-read this character as part of the value
+            elif state == 'after_value' and ch == ',':
+                self._state = 'key_start'
+            elif state == 'after_value' and ch == '}':
+                self._state = 'done'
+            elif state == 'done':
+                raise self._error("Extra data", i)
+            else:
+                raise self._error(f"Unexpected character {ch!r}", i)
+            i += 1
+
+    def _raw(self, text, i):
+        """
+        Buffers a key or a non-streamed value until it ends; returns the next index.
+        """
+        start, n = i, len(text)
+        while i < n:
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    i += 1
+                    continue
+                m = _STRING_SPECIAL.search(text, i)
+                if not m:
+                    i = n
+                    break
+                i = m.end()
+                if m.group() == '\\':
+                    self._escape = True
+                    continue
+                self._in_string = False
+                if self._state == 'key':
+                    self._buf += text[start:i]
+                    self._key = self._decode(self._buf, start)
+                    self._state = 'colon'
+                    return i
+            else:
+                m = _VALUE_SPECIAL.search(text, i)
+                if not m:
+                    i = n
+                    break
+                ch, i = m.group(), m.end()
+                if ch == '"':
+                    self._in_string = True
+                elif ch in '{[':
+                    self._depth += 1
+                elif ch in '}]' and self._depth > 0:
+                    self._depth -= 1
+                elif self._depth == 0 and ch in ',}]':
+                    # End of a top-level member; the separator is handled by 'after_value'
+                    self._buf += text[start:m.start()]
+                    self._end_value(start)
+                    return m.start()
+        self._buf += text[start:i]
+        return i
+
+    def _decode(self, raw, index):
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise self._error(e.msg, index)
+
+    def _end_value(self, index):
+        raw = self._buf.strip()
+        if not raw:
+            raise self._error("Expecting value", index)
+        value = self._decode(raw, index)
+        self._buf = ''
+        if self._key == STREAMED_FIELD and isinstance(value, str):
+            self._console_parts.append(value)
+        else:
+            self.data[self._key] = value
+        self._state = 'after_value'
+
+    def _console(self, text, i):
+        """
+        Unescapes the console log string run by run; returns the next index.
+        """
+        n = len(text)
+        j = _STRING_RUN.match(text, i).end()
+        if j < n and text[j] == '"':
+            self._emit(text, i, j)
+            self._state = 'after_value'
+            return j + 1
+        if j < n:
+            # Stopped at a backslash: only an escape split across chunks may follow
+            if not _PARTIAL_ESCAPE.match(text, j):
+                raise self._error("Invalid \\escape", j)
+        # A high surrogate may be followed by its low half (complete or partial) in the next chunk
+        m = _HIGH_SURROGATE.search(text, i, j)
+        cut = m.start() if m and _starts_escape(text, m.start()) else j
+        self._emit(text, i, cut)
+        self._carry = text[cut:]
+        return n
+
+    def _emit(self, text, start, end):
+        if end > start:
+            try:
+                self._console_parts.append(json.loads('"' + text[start:end] + '"'))
+            except json.JSONDecodeError as e:
+                raise self._error(e.msg, start)
+
+def _starts_escape(text, index):
+    """
+    True if the backslash at `index` starts an escape (i.e. is not itself escaped).
+    """
+    run = 0
+    while index - run - 1 >= 0 and text[index - run - 1] == '\\':
+        run += 1
+    return run % 2 == 0
+
+def parse_stream(read, scanner=None, tee=None):
+    """
+    Parses a pipeline document from a `read(size)` callable without materializing it.
+    `tee`: optional writable that receives the raw bytes (opt-in upload archiving); closed when done.
+    Returns: parsed data dict (see PipelineJSONStream.finish)
+    """
+    parser = PipelineJSONStream(scanner)
+    try:
+        while True:
+            chunk = read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            if tee is not None:
+                tee.write(chunk)
+            parser.feed(chunk)
+    finally:
+        if tee is not None:
+            tee.close()
+    return parser.finish()
+
+def parse_multipart_stream(read, content_type, field='file', scanner=None, tee_factory=None, accept=None):
+    """
+    Parses the `field` file part of a multipart/form-data body straight from the request stream;
+    other parts are discarded and nothing touches disk.
+    `tee_factory(filename)`: optional, returns a writable for the raw file bytes.
+    `accept(filename)`: optional filter; rejected or unnamed files are skipped unparsed.
+    Returns: (data, filename) - data is None when no file was parsed, filename is None
+             when the part is missing
+    """
+    _, options = parse_options_header(content_type)
+    boundary = options.get('boundary')
+    if not boundary:
+        raise ValueError("Missing multipart boundary")
+
+    decoder = MultipartDecoder(boundary.encode('latin-1'))
+    parser, filename, tee, current, eof = None, None, None, None, False
+    try:
+        while True:
+            event = decoder.next_event()
+            if isinstance(event, NeedData):
+                if eof:
+                    raise ValueError("Unexpected end of multipart body")
+                chunk = read(READ_CHUNK_SIZE)
+                eof = not chunk
+                decoder.receive_data(chunk or None)
+            elif isinstance(event, Epilogue):
+                break
+            elif isinstance(event, File) and event.name == field and filename is None:
+                filename = event.filename
+                if filename and (accept is None or accept(filename)):
+                    parser, current = PipelineJSONStream(scanner), field
+                    tee = tee_factory(filename) if tee_factory else None
+                else:
+                    current = None
+            elif isinstance(event, Data):
+                if current == field:
+                    if tee is not None:
+                        tee.write(event.data)
+                    parser.feed(event.data)
+                    if not event.more_data:
+                        current = None
+            else:
+                current = None # Other fields and files are skipped
+    finally:
+        if tee is not None:
+            tee.close()
+    if parser is None:
+        return None, filename
+    return parser.finish(), filename
@@ -0,0 +1,245 @@
+import os
+import hmac
+import atexit
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from jenkins_fetch import fetch_jenkins_data, fetch_options_from_env, get_client, is_build_finished
+from analyzer import analyze_pipeline_v2
+from database import save_analyses_bulk, analysis_record, get_stored_results, get_stage_log_scans
+
+# Builds per batch (one DB transaction), and the longest a notification waits for its batch to fill
+WEBHOOK_BATCH_SIZE = int(os.environ.get('WEBHOOK_BATCH_SIZE', 50))
+WEBHOOK_BATCH_DELAY = float(os.environ.get('WEBHOOK_BATCH_DELAY', 2.0))
+# Concurrent Jenkins fetches per batch, over the controller's pooled client
+WEBHOOK_FETCH_WORKERS = int(os.environ.get('WEBHOOK_FETCH_WORKERS', 8))
+# Recently handled (job, build) pairs remembered for dedup
+WEBHOOK_DEDUP_SIZE = int(os.environ.get('WEBHOOK_DEDUP_SIZE', 10000))
+
+# Notification plugin phases sent once a build has its result
+FINISHED_PHASES = ('COMPLETED', 'FINALIZED')
+
+def verify_secret(provided, secret):
+    """
+    Constant-time shared secret check. Fails closed when no secret is configured.
+    """
+    return bool(secret) and bool(provided) and hmac.compare_digest(provided.encode(), secret.encode())
+
+def _job_from_url(url):
+    """
+    Full job name from a job or build URL path ("job/team/job/app/7/" -> "team/app").
+    """
+    parts = [p for p in url.split('/') if p]
+    return '/'.join(parts[i + 1] for i, p in enumerate(parts[:-1]) if p == 'job')
+
+def parse_notification(payload):
+    """
+    Normalizes a Jenkins Notification plugin payload ({'name', 'url', 'build': {'number', 'phase', ...}})
+    or a generic webhook body ({'job_name', 'build_number'}).
+    Returns: ((job_name, build_number), error_message); (None, None) for events that are not a finished build
+    """
+    if not isinstance(payload, dict):
+        return None, "Expected a JSON object"
+    build = payload.get('build')
+    if isinstance(build, dict):
+        if str(build.get('phase', '')).upper() not in FINISHED_PHASES:
+            return None, None
+        job_name = _job_from_url(payload.get('url') or '') or payload.get('name')
+        number = build.get('number')
+    else:
+        job_name = payload.get('job_name') or payload.get('job')
+        number = payload.get('build_number', payload.get('number'))
+    try:
+        number = int(number)
+    except (TypeError, ValueError):
+        return None, "Missing or invalid build number"
+    if not job_name or number < 1:
+        return None, "Missing job name or build number"
+    return (job_name, number), None
+
+class WebhookBatcher:
+    """
+    Collects build-completion notifications and processes them in batches on a background
+    thread. A notification for a (job, build) that is pending or was handled recently is
+    dropped, so redeliveries and COMPLETED + FINALIZED pairs cost nothing.
+    A batch is flushed once it holds `batch_size` builds or its oldest build has waited
+    `max_delay` seconds: builds already stored with a final result are skipped with one query
+    (a build stored by a dashboard fetch while still running is fetched again), the rest are
+    fetched concurrently over the controller's pooled client, analyzed, and saved in one transaction
+    (archived console logs included; log retention then runs once per job in the batch).
+    Pending builds live only in memory. shutdown() (registered with atexit for the process-wide
+    batcher) flushes them on a clean exit, but builds already answered with 202 are lost if the
+    process is killed; the poller (see poller.py) picks such builds up if it runs alongside.
+    """
+    def __init__(self, client=None, fetch_options=None, batch_size=None, max_delay=None,
+                 fetch_workers=None, dedup_size=None):
+        self._client = client
+        self.fetch_options = fetch_options or {'stream_console': True}
+        self.batch_size = batch_size or WEBHOOK_BATCH_SIZE
+        self.max_delay = WEBHOOK_BATCH_DELAY if max_delay is None else max_delay
+        self.fetch_workers = fetch_workers or WEBHOOK_FETCH_WORKERS
+        self.dedup_size = dedup_size or WEBHOOK_DEDUP_SIZE
+        self._cond = threading.Condition()
+        self._pending = OrderedDict() # (job, build) -> time received
+        self._seen = OrderedDict() # recently handled (job, build), LRU
+        self._inflight = set()
+        self._stats = {'received': 0, 'duplicates': 0, 'batches': 0, 'skipped_stored': 0,
+                       'analyzed': 0, 'saved': 0, 'errors': 0}
+        self._thread = None
+        self._stopping = False
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_client(os.environ.get('JENKINS_URL', 'http://localhost:8080'),
+                                      os.environ.get('JENKINS_USER', 'admin'),
+                                      os.environ.get('JENKINS_TOKEN', ''))
+        return self._client
+
+    def submit(self, job_name, build_number):
+        """
+        Returns: True if queued, False if it duplicates a pending or recently handled build
+        """
+        key = (job_name, build_number)
+        with self._cond:
+            self._stats['received'] += 1
+            if key in self._pending or key in self._inflight or key in self._seen:
+                self._stats['duplicates'] += 1
+                return False
+            self._pending[key] = time.monotonic()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='webhook-batcher', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+            return True
+
+    def _next_batch(self):
+        """
+        Blocks until a batch is due. Returns: list of keys (empty when stopping with nothing left)
+        """
+        with self._cond:
+            while True:
+                if self._pending:
+                    wait = next(iter(self._pending.values())) + self.max_delay - time.monotonic()
+                    if len(self._pending) >= self.batch_size or wait <= 0 or self._stopping:
+                        batch = list(self._pending)[:self.batch_size]
+                        for key in batch:
+                            del self._pending[key]
+                        self._inflight.update(batch)
+                        return batch
+                    self._cond.wait(wait)
+                elif self._stopping:
+                    return []
+                else:
+                    self._cond.wait()
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            try:
+                self.process(batch)
+            except Exception as e:
+                logging.error(f"Webhook batch of {len(batch)} failed: {e}")
+                with self._cond:
+                    self._inflight.difference_update(batch)
+                    self._stats['errors'] += len(batch)
+
+    def _fetch_and_analyze(self, key):
+        job_name, build_number = key
+        previous = get_stage_log_scans(job_name, build_number) if self.fetch_options.get('stage_logs') else None
+        data, error_msg = fetch_jenkins_data(self.client.base_url, job_name, None, None, client=self.client,
+                                             build_number=build_number, previous_stage_logs=previous,
+                                             defer_archive=True, **self.fetch_options)
+        if error_msg or not data:
+            raise RuntimeError(error_msg or "No data returned")
+        log = data.get('log_archive')
+        try:
+            if not is_build_finished(data.get('status')):
+                # Not remembered as handled, so the FINALIZED notification (or a redelivery) retries it
+                raise RuntimeError(f"Build is still running ({data.get('status')})")
+            metrics = analyze_pipeline_v2(data, persist=False)
+            if metrics is None:
+                raise RuntimeError("Analysis failed")
+        except Exception:
+            if log:
+                self.fetch_options['log_store'].settle([(job_name, log)])
+            raise
+        # The archived log's row is written with the analysis, in the batch's transaction
+        return dict(analysis_record(metrics), log=log)
+
+    def process(self, batch):
+        """
+        Fetches, analyzes and saves one batch of (job_name, build_number).
+        Returns: number of builds saved
+        """
+        stored = {key for key, result in get_stored_results(batch).items() if is_build_finished(result)}
+        todo = [key for key in batch if key not in stored]
+        records, failed = [], []
+        if todo:
+            with ThreadPoolExecutor(max_workers=min(self.fetch_workers, len(todo)), thread_name_prefix='webhook') as pool:
+                futures = [(key, pool.submit(self._fetch_and_analyze, key)) for key in todo]
+                for key, future in futures:
+                    try:
+                        records.append(future.result())
+                    except Exception as e:
+                        logging.error(f"Webhook: {key[0]} #{key[1]} failed: {e}")
+                        failed.append(key)
+        saved = len(save_analyses_bulk(records)) if records else 0
+        if records and not saved:
+            failed.extend((r['job_name'], r['build_number']) for r in records)
+        logs = [(r['job_name'], r['log']) for r in records if r.get('log')]
+        if logs:
+            # Replaced blobs are collected and retention runs once per job, not once per build
+            self.fetch_options['log_store'].settle(logs)
+
+        with self._cond:
+            self._inflight.difference_update(batch)
+            # Failed builds are forgotten, so a redelivered notification retries them
+            for key in batch:
+                if key not in failed:
+                    self._seen[key] = True
+                    self._seen.move_to_end(key)
+            while len(self._seen) > self.dedup_size:
+                self._seen.popitem(last=False)
+            self._stats['batches'] += 1
+            self._stats['skipped_stored'] += len(stored)
+            self._stats['analyzed'] += len(records)
+            self._stats['saved'] += saved
+            self._stats['errors'] += len(failed)
+        logging.info(f"Webhook batch: {len(batch)} builds, {len(stored)} already stored, "
+                     f"{saved} saved, {len(failed)} failed")
+        return saved
+
+    def stats(self):
+        with self._cond:
+            return dict(self._stats, pending=len(self._pending), inflight=len(self._inflight))
+
+    def shutdown(self, wait=True):
+        """
+        Flushes what is pending and stops the background thread.
+        """
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+            thread = self._thread
+        if thread and wait:
+            thread.join()
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+def get_webhook_batcher():
+    """
+    Returns the process-wide WebhookBatcher, configured like the dashboard's Jenkins fetches.
+    """
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = WebhookBatcher(fetch_options=fetch_options_from_env())
+            # Flush accepted notifications on a clean interpreter exit (daemon threads are not joined)
+            atexit.register(_batcher.shutdown)
+        return _batcher